@@ -0,0 +1,63 @@
+import threading
+from typing import Iterable, Set
+from storage import Storage
+
+# Các loại update có người gửi (from_user) cần lọc khi người đó bị cấm
+UPDATE_TYPES = (
+    'message',
+    'edited_message',
+    'callback_query',
+    'inline_query',
+    'chosen_inline_result',
+    'shipping_query',
+    'pre_checkout_query'
+)
+
+
+class BannedUsers:
+    """Tập ID người dùng bị cấm, giữ trong bộ nhớ.
+
+    Được nạp một lần khi khởi động và cập nhật cùng lúc với Database mỗi khi
+    admin cấm/bỏ cấm, nên việc kiểm tra không cần đọc bản ghi người dùng.
+    """
+
+    def __init__(self, user_ids: Iterable[int] = ()):
+        self._lock = threading.Lock()
+        self._ids: Set[int] = set(user_ids)
+
+    def load(self, db: Storage) -> None:
+        """Nạp lại tập từ Database"""
+        user_ids = set(db.get_banned_user_ids())
+        with self._lock:
+            self._ids = user_ids
+
+    def add(self, user_id: int) -> None:
+        with self._lock:
+            self._ids.add(user_id)
+
+    def discard(self, user_id: int) -> None:
+        with self._lock:
+            self._ids.discard(user_id)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+banned_users = BannedUsers()
+
+
+def drop_banned(update) -> bool:
+    """Bỏ phần nội dung của update nếu người gửi bị cấm, trả về True nếu đã bỏ"""
+    dropped = False
+    for update_type in UPDATE_TYPES:
+        obj = getattr(update, update_type, None)
+        if obj is None:
+            continue
+        from_user = getattr(obj, 'from_user', None)
+        if from_user is not None and from_user.id in banned_users:
+            setattr(update, update_type, None)
+            dropped = True
+    return dropped
@@ -0,0 +1 @@
+# Khởi tạo package benchmarks
@@ -0,0 +1,170 @@
+"""Tạo bộ dữ liệu giả lập (users/products/accounts/purchases) để đo hiệu năng Database.
+
+Ví dụ::
+
+    python -m benchmarks.generate 1k 100k 1M --out bench_data
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import string
+from typing import Dict, List, Any, Iterable, Tuple
+import config
+
+# Các dịch vụ và gói dùng để đặt tên sản phẩm
+SERVICES = ['Netflix', 'Spotify', 'ChatGPT', 'Canva', 'Kling AI', 'Monica', 'Semrush', 'Envato',
+            'Freepik', 'CapCut', 'Grammarly', 'Midjourney', 'YouTube', 'Duolingo']
+TIERS = ['Basic', 'Standard', 'Premium', 'Pro', 'Unlimited', 'Trial']
+
+# Số sản phẩm trong mỗi bộ dữ liệu (bất kể quy mô) và số sản phẩm miễn phí trong đó
+PRODUCT_COUNT = 40
+FREE_PRODUCT_COUNT = 5
+
+# Tỉ lệ tài khoản đã bán (mỗi tài khoản đã bán có một bản ghi lịch sử mua hàng)
+SOLD_RATIO = 0.2
+BANNED_RATIO = 0.01
+
+
+def parse_scale(value: str) -> int:
+    """Đổi quy mô dạng ``1k``, ``100k``, ``1M`` hoặc số nguyên thành số người dùng"""
+    multipliers = {'k': 1000, 'm': 1000 * 1000}
+    suffix = value[-1:].lower()
+    try:
+        if suffix in multipliers:
+            return int(float(value[:-1]) * multipliers[suffix])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Quy mô không hợp lệ: {value}")
+
+
+def _write_json_list(file_path: str, records: Iterable[Dict]) -> int:
+    """Ghi danh sách JSON từng bản ghi một để không phải giữ cả file trong bộ nhớ"""
+    count = 0
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write("[")
+        for record in records:
+            f.write(",\n    " if count else "\n    ")
+            f.write(json.dumps(record, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n" if count else "]\n")
+    return count
+
+
+def _random_moment(rng: random.Random, now: datetime.datetime, days: int) -> datetime.datetime:
+    return now - datetime.timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+
+def generate_products(rng: random.Random) -> List[Dict[str, Any]]:
+    products = []
+    names = [f"{service} {tier}" for service in SERVICES for tier in TIERS]
+    for index, name in enumerate(rng.sample(names, PRODUCT_COUNT), start=1):
+        price = 0 if index <= FREE_PRODUCT_COUNT else rng.randrange(20, 300) * 1000
+        products.append({
+            'id': index,
+            'name': name,
+            'price': float(price),
+            'description': f"Tài khoản {name}, dùng cho mục đích đo hiệu năng",
+            'is_free': price <= 0
+        })
+    return products
+
+
+def generate_users(rng: random.Random, user_ids: List[int], now: datetime.datetime) -> Iterable[Dict[str, Any]]:
+    for user_id in user_ids:
+        if rng.random() < 0.7:
+            handle = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+            username = handle + (str(rng.randrange(1000)) if rng.random() < 0.4 else '')
+        else:
+            username = f"user_{user_id}"
+        yield {
+            'id': user_id,
+            'username': username,
+            'balance': rng.choice([0, 0, 10000, 50000, 100000, 200000, 500000, 1000000]),
+            'banned': rng.random() < BANNED_RATIO,
+            'created_at': _random_moment(rng, now, 365).isoformat()
+        }
+
+
+def generate_accounts(rng: random.Random, count: int, products: List[Dict]) -> Iterable[Dict[str, Any]]:
+    """Tài khoản phân bố lệch về các sản phẩm đầu danh sách (giống phân bố Zipf)"""
+    product_ids = [product['id'] for product in products]
+    weights = [1.0 / (rank + 1) for rank in range(len(product_ids))]
+    for index in range(count):
+        product_id = rng.choices(product_ids, weights)[0]
+        token = ''.join(rng.choices(string.ascii_letters + string.digits, k=12))
+        yield {
+            'product_id': product_id,
+            'data': f"bench_{product_id}_{index}@example.com:{token}",
+            'sold': rng.random() < SOLD_RATIO
+        }
+
+
+def generate(out_dir: str, user_count: int, seed: int = 42) -> Dict[str, int]:
+    """Tạo một bộ dữ liệu trong ``out_dir`` theo đúng bố cục thư mục data của bot"""
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    data_dir = os.path.join(out_dir, os.path.dirname(config.USERS_FILE))
+    os.makedirs(data_dir, exist_ok=True)
+
+    products = generate_products(rng)
+    products_by_id = {product['id']: product for product in products}
+    _write_json_list(os.path.join(out_dir, config.PRODUCTS_FILE), products)
+
+    # Chỉ giữ ID người dùng trong bộ nhớ, bản ghi được ghi thẳng ra file
+    user_ids = rng.sample(range(100_000_000, 8_000_000_000), user_count)
+    _write_json_list(os.path.join(out_dir, config.USERS_FILE), generate_users(rng, user_ids, now))
+
+    # Tài khoản đã bán được ghi lại để tạo lịch sử mua hàng tương ứng
+    sold: List[Tuple[int, str]] = []
+
+    def accounts():
+        for account in generate_accounts(rng, user_count, products):
+            if account['sold']:
+                sold.append((account['product_id'], account['data']))
+            yield account
+
+    account_count = _write_json_list(os.path.join(out_dir, config.ACCOUNTS_FILE), accounts())
+
+    # Lịch sử mua hàng dạng cũ (không có balance_after) nên không ảnh hưởng tới số dư khi khởi động
+    moments = sorted(_random_moment(rng, now, 180) for _ in sold)
+    with open(os.path.join(out_dir, config.PURCHASES_FILE), 'w', encoding='utf-8') as f:
+        for purchase_id, ((product_id, account_data), moment) in enumerate(zip(sold, moments), start=1):
+            product = products_by_id[product_id]
+            f.write(json.dumps({
+                'id': purchase_id,
+                'user_id': rng.choice(user_ids),
+                'product_id': product_id,
+                'product_name': product['name'],
+                'price': product['price'],
+                'account_data': account_data,
+                'timestamp': moment.isoformat()
+            }, ensure_ascii=False) + "\n")
+
+    with open(os.path.join(out_dir, config.SETTINGS_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'show_premium': True, 'show_free': True}, f, ensure_ascii=False, indent=4)
+
+    return {'users': len(user_ids), 'products': len(products), 'accounts': account_count, 'purchases': len(sold)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tạo dữ liệu giả lập để đo hiệu năng Database")
+    parser.add_argument('scales', nargs='+', type=str, help="Quy mô theo số người dùng, ví dụ 1k 100k 1M")
+    parser.add_argument('--out', default='bench_data', help="Thư mục gốc chứa các bộ dữ liệu")
+    parser.add_argument('--seed', type=int, default=42, help="Hạt giống ngẫu nhiên")
+    args = parser.parse_args()
+
+    try:
+        user_counts = [parse_scale(scale) for scale in args.scales]
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    for scale, user_count in zip(args.scales, user_counts):
+        out_dir = os.path.join(args.out, scale)
+        counts = generate(out_dir, user_count, args.seed)
+        print(f"{out_dir}: " + ", ".join(f"{count:,} {name}" for name, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Đo độ trễ (p50/p99) và thông lượng các thao tác Database trên một bộ dữ liệu giả lập.
+
+Bộ dữ liệu được sao chép sang thư mục tạm trước khi chạy nên có thể dùng lại
+nhiều lần. Kết quả được in ra dạng JSON để so sánh giữa các backend và chế độ
+bộ nhớ đệm. Ví dụ::
+
+    python -m benchmarks.run bench_data/100k --backend memory --output memory-100k.json
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Any, Callable, Optional
+import config
+import database
+from storage import Storage
+
+# Các kịch bản đo, theo thứ tự chạy
+SCENARIOS = ['get_user', 'count_available_accounts', 'update_user', 'get_available_account', 'purchase']
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Phân vị theo thứ hạng gần nhất của danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(fraction * len(sorted_values) + 0.999999) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies_ns: List[int], elapsed: float, succeeded: int) -> Dict[str, Any]:
+    """Tổng hợp độ trễ (mili giây) và thông lượng của một kịch bản"""
+    latencies = sorted(value / 1e6 for value in latencies_ns)
+    ops = len(latencies)
+    return {
+        'ops': ops,
+        'succeeded': succeeded,
+        'seconds': round(elapsed, 6),
+        'throughput_ops': round(ops / elapsed, 2) if elapsed > 0 else 0.0,
+        'mean_ms': round(sum(latencies) / ops, 6) if ops else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 6),
+        'p99_ms': round(percentile(latencies, 0.99), 6),
+        'max_ms': round(latencies[-1], 6) if ops else 0.0
+    }
+
+
+def run_scenario(operation: Callable[[Any], Any], arguments: List[Any], max_seconds: float) -> Dict[str, Any]:
+    """Gọi ``operation`` với từng tham số, dừng sớm nếu vượt quá ``max_seconds``"""
+    latencies: List[int] = []
+    succeeded = 0
+    started = time.perf_counter()
+    for argument in arguments:
+        begin = time.perf_counter_ns()
+        result = operation(argument)
+        latencies.append(time.perf_counter_ns() - begin)
+        if result:
+            succeeded += 1
+        if time.perf_counter() - started > max_seconds:
+            break
+    return summarize(latencies, time.perf_counter() - started, succeeded)
+
+
+def build_scenarios(db: Storage, user_ids: List[int], product_ids: List[int],
+                    iterations: int, rng: random.Random) -> Dict[str, tuple]:
+    """Thao tác và danh sách tham số (tạo trước, không tính vào thời gian đo) của từng kịch bản"""
+    def users():
+        return [rng.choice(user_ids) for _ in range(iterations)]
+
+    def products():
+        return [rng.choice(product_ids) for _ in range(iterations)]
+
+    return {
+        'get_user': (db.get_user, users()),
+        'count_available_accounts': (db.count_available_accounts, products()),
+        'update_user': (
+            lambda args: db.update_user(args[0], {'username': args[1]}),
+            [(user_id, f"bench_{i}") for i, user_id in enumerate(users())]
+        ),
+        'get_available_account': (db.get_available_account, products()),
+        'purchase': (lambda args: db.purchase(*args), list(zip(users(), products())))
+    }
+
+
+def _read_user_ids(file_path: str) -> List[int]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [user.get('id') for user in json.load(f)]
+
+
+def run(data_dir: str, backend: str, cache_reads: bool = True, iterations: int = 1000,
+        scenarios: Optional[List[str]] = None, max_seconds: float = 30.0, seed: int = 1) -> Dict[str, Any]:
+    """Chạy các kịch bản trên bản sao của bộ dữ liệu ``data_dir``, trả về kết quả dạng dict"""
+    scenarios = scenarios or SCENARIOS
+    rng = random.Random(seed)
+    user_ids = _read_user_ids(os.path.join(data_dir, config.USERS_FILE))
+
+    work_dir = tempfile.mkdtemp(prefix="db-bench-")
+    previous_dir = os.getcwd()
+    previous_backend = config.DATABASE_BACKEND
+    db = None
+    try:
+        shutil.copytree(os.path.join(data_dir, os.path.dirname(config.USERS_FILE)),
+                        os.path.join(work_dir, os.path.dirname(config.USERS_FILE)))
+        # Các đường dẫn trong config là tương đối so với thư mục làm việc
+        os.chdir(work_dir)
+        config.DATABASE_BACKEND = backend
+        database._parsed_cache.clear()
+
+        started = time.perf_counter()
+        db = database.create_database()
+        if not cache_reads:
+            db.cache_reads = False
+            database._parsed_cache.clear()
+        load_seconds = time.perf_counter() - started
+
+        product_ids = [product.get('id') for product in db.get_all_products()]
+        operations = build_scenarios(db, user_ids, product_ids, iterations, rng)
+        results = {}
+        for name in scenarios:
+            operation, arguments = operations[name]
+            results[name] = run_scenario(operation, arguments, max_seconds)
+
+        return {
+            'backend': backend,
+            'cache_reads': cache_reads,
+            'dataset': os.path.abspath(data_dir),
+            'users': len(user_ids),
+            'products': len(product_ids),
+            'iterations': iterations,
+            'load_seconds': round(load_seconds, 6),
+            'scenarios': results,
+            'python': platform.python_version(),
+            'timestamp': datetime.datetime.now().isoformat()
+        }
+    finally:
+        if db is not None:
+            db.close()
+        config.DATABASE_BACKEND = previous_backend
+        database._parsed_cache.clear()
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo hiệu năng Database trên dữ liệu giả lập")
+    parser.add_argument('data_dir', help="Thư mục bộ dữ liệu tạo bởi benchmarks.generate")
+    parser.add_argument('--backend', default=config.DATABASE_BACKEND, choices=database.available_backends(),
+                        help="Backend cơ sở dữ liệu cần đo")
+    parser.add_argument('--no-cache', action='store_true', help="Tắt bộ nhớ đệm dữ liệu JSON đã phân tích")
+    parser.add_argument('--iterations', type=int, default=1000, help="Số lần gọi mỗi kịch bản")
+    parser.add_argument('--max-seconds', type=float, default=30.0, help="Thời gian tối đa cho mỗi kịch bản")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, help="Chỉ chạy các kịch bản này")
+    parser.add_argument('--seed', type=int, default=1, help="Hạt giống ngẫu nhiên")
+    parser.add_argument('--output', help="Ghi kết quả JSON vào file (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    # Thông báo của Database được chuyển sang stderr để stdout chỉ chứa kết quả JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        result = run(args.data_dir, args.backend, not args.no_cache, args.iterations,
+                     args.scenarios, args.max_seconds, args.seed)
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
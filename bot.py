@@ -4,7 +4,11 @@ import config
 import handlers
 import os
 import logging
-from database import Database
+from database import get_database
+import request_context
+import bans
+import dispatcher
+import webhook
 import importlib
 
 # Thiết lập logging
@@ -17,11 +21,11 @@ logger = logging.getLogger(__name__)
 # Bật middleware
 apihelper.ENABLE_MIDDLEWARE = True
 
-# Khởi tạo bot
-bot = telebot.TeleBot(config.TOKEN)
+# Khởi tạo bot (khi dùng UpdateDispatcher, handler chạy trong các luồng của dispatcher)
+bot = telebot.TeleBot(config.TOKEN, threaded=config.UPDATE_WORKERS <= 0)
 
 # Khởi tạo cơ sở dữ liệu
-db = Database()
+db = get_database()
 
 # Khởi tạo các module
 try:
@@ -44,12 +48,29 @@ def main():
     # Đảm bảo thư mục downloads tồn tại
     os.makedirs("downloads", exist_ok=True)
     
-    # Đăng ký các handler
-    handlers.register_handlers(bot)
+    # Đọc trước dữ liệu một lần ở lúc khởi động
+    db.warm_up()
+    
+    # Đăng ký các handler (dùng chung db và file_manager)
+    handlers.register_handlers(bot, db, file_manager)
     
     # Khởi động bot
     logger.info("Bot đã khởi động!")
     
+    # Bỏ update của người dùng bị cấm trước khi tới handler (tra tập ID trong bộ nhớ, không đọc đĩa).
+    # Middleware không có update_types chạy sau các middleware theo loại, nhưng các middleware đó
+    # chỉ ghi log và gắn ngữ cảnh (chưa đọc bản ghi) nên không có thao tác đĩa nào xảy ra trước.
+    @bot.middleware_handler()
+    def drop_banned_updates(bot_instance, update):
+        """Bỏ message/callback/... của người dùng bị cấm"""
+        bans.drop_banned(update)
+
+    # Gắn ngữ cảnh cho mỗi update: bản ghi người gửi chỉ được đọc (một lần) khi handler cần
+    @bot.middleware_handler(update_types=['message', 'callback_query'])
+    def attach_request_context(bot_instance, update):
+        """Tạo RequestContext dùng chung cho các handler của update"""
+        request_context.attach(db, update)
+    
     # Thêm handler cho tin nhắn
     @bot.middleware_handler(update_types=['message'])
     def log_messages(bot_instance, message):
@@ -64,8 +85,21 @@ def main():
         logger.info(f"Received callback from {callback.from_user.username or 'Unknown'} (ID: {callback.from_user.id}): {callback.data}")
         return callback
     
-    # Bắt đầu polling
-    bot.polling(none_stop=True, interval=0)
+    # Chia update theo chat cho các luồng xử lý
+    update_dispatcher = None
+    if config.UPDATE_WORKERS > 0:
+        update_dispatcher = dispatcher.install(bot, config.UPDATE_WORKERS, config.UPDATE_QUEUE_SIZE)
+        logger.info(f"Xử lý update bằng {config.UPDATE_WORKERS} luồng")
+    
+    # Bắt đầu nhận update (polling hoặc webhook theo config.UPDATE_MODE)
+    try:
+        if config.UPDATE_MODE == "webhook":
+            webhook.run(bot)
+        else:
+            bot.polling(none_stop=True, interval=0)
+    finally:
+        if update_dispatcher is not None:
+            dispatcher.uninstall(bot, update_dispatcher)
 
 if __name__ == "__main__":
     try:
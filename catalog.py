@@ -0,0 +1,56 @@
+import itertools
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Mapping, Tuple
+
+# Số sản phẩm trên mỗi trang danh sách sản phẩm
+PRODUCTS_PER_PAGE = 10
+
+# Số phiên bản tăng dần cho mỗi lần dựng lại danh mục trong tiến trình
+_versions = itertools.count(1)
+
+
+def _paginate(products: Tuple[Mapping, ...], per_page: int) -> Tuple[Tuple[Mapping, ...], ...]:
+    return tuple(products[i:i + per_page] for i in range(0, len(products), per_page))
+
+
+class CatalogSnapshot:
+    """Ảnh chụp bất biến của danh mục sản phẩm kèm tồn kho.
+
+    Sản phẩm được chia sẵn thành nhóm trả phí/miễn phí còn hàng và cắt sẵn thành
+    từng trang theo thứ tự trong kho dữ liệu. Một ảnh chụp không bao giờ thay đổi
+    sau khi tạo nên có thể đọc từ nhiều luồng mà không cần khóa; khi sản phẩm hoặc
+    tồn kho thay đổi, Database tạo ảnh chụp mới với ``version`` lớn hơn.
+    """
+
+    __slots__ = ('version', 'stock', '_sections', '_pages')
+
+    def __init__(self, products: Iterable[Dict], stock: Dict[int, int], per_page: int = PRODUCTS_PER_PAGE):
+        self.version = next(_versions)
+        self.stock: Mapping[int, int] = MappingProxyType({pid: count for pid, count in stock.items() if count > 0})
+
+        frozen = tuple(MappingProxyType(dict(product)) for product in products)
+
+        in_stock = [product for product in frozen if self.stock.get(product.get('id', 0), 0) > 0]
+        self._sections: Dict[str, Tuple[Mapping, ...]] = {
+            'all': frozen,
+            'premium': tuple(product for product in in_stock if not product.get('is_free', False)),
+            'free': tuple(product for product in in_stock if product.get('is_free', False))
+        }
+        self._pages = {section: _paginate(items, per_page) for section, items in self._sections.items()}
+
+    def products(self, section: str = 'all') -> Tuple[Mapping, ...]:
+        """Các sản phẩm của một nhóm (``'all'``, ``'premium'`` hoặc ``'free'``)"""
+        return self._sections[section]
+
+    def page(self, section: str, page: int) -> Tuple[Mapping, ...]:
+        """Sản phẩm của một trang trong nhóm (trang ngoài khoảng trả về rỗng)"""
+        pages = self._pages[section]
+        return pages[page] if 0 <= page < len(pages) else ()
+
+    def page_count(self, section: str) -> int:
+        """Số trang của nhóm"""
+        return len(self._pages[section])
+
+    def available(self, product_id: Any) -> int:
+        """Số tài khoản còn lại của sản phẩm"""
+        return self.stock.get(product_id, 0)
@@ -12,6 +12,74 @@ USERS_FILE = "data/users.json"
 PRODUCTS_FILE = "data/products.json"
 ACCOUNTS_FILE = "data/accounts.json"
 
+# Lịch sử mua hàng (mỗi dòng một lần mua), tách riêng khỏi users.json
+PURCHASES_FILE = "data/purchases.jsonl"
+
+# Số liệu thống kê cộng dồn cho bảng điều khiển (có thể tính lại từ dữ liệu gốc)
+STATS_FILE = "data/stats.json"
+
+# Chế độ lưu trữ dữ liệu:
+# - "json": đọc/ghi trực tiếp file JSON ở mỗi thao tác
+# - "memory": giữ dữ liệu trong bộ nhớ, ghi xuống đĩa bằng luồng nền
+# - "sqlite": lưu trong file SQLite (tự nhập dữ liệu từ các file JSON ở lần chạy đầu,
+#   kể cả nhật ký người dùng của chế độ "memory")
+# Backend khác có thể được thêm bằng database.register_backend (giao diện storage.Storage)
+DATABASE_BACKEND = "json"
+
+# File khóa dùng chung khi nhiều tiến trình (bot, công cụ quản trị) cùng ghi thư mục data
+DB_LOCK_FILE = "data/database.lock"
+
+# Đường dẫn file SQLite (chế độ "sqlite")
+SQLITE_DB_FILE = "data/database.sqlite3"
+
+# Thời gian chờ (giây) để gom các thay đổi trước khi ghi xuống đĩa (chế độ "memory")
+DB_WRITE_BEHIND_DELAY = 1.0
+
+# Nhật ký thay đổi người dùng (chế độ "memory"): mỗi thay đổi là một dòng ghi thêm
+# thay vì ghi lại toàn bộ users.json
+DB_JOURNAL_ENABLED = True
+USERS_JOURNAL_FILE = "data/users.journal"
+
+# Gộp nhật ký vào users.json khi nhật ký vượt quá kích thước này (byte)
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+# Bộ mã hóa JSON cho các file dữ liệu: "auto" (orjson hoặc msgspec nếu đã cài, nếu không
+# thì thư viện chuẩn), "orjson", "msgspec" hoặc "json"
+JSON_CODEC = "auto"
+
+# Ghi file dữ liệu dạng thụt lề dễ đọc (chậm và lớn hơn nhiều). Mặc định ghi dạng gọn;
+# dùng "python export_data.py" để xuất bản dễ đọc khi cần kiểm tra dữ liệu
+DATA_FILES_PRETTY = False
+
+# Số luồng xử lý update (bật khi > 0). Update được chia theo chat_id: cùng một chat luôn vào
+# cùng một luồng (giữ thứ tự), các chat khác nhau chạy song song. 0 = dùng cách xử lý mặc định của telebot
+UPDATE_WORKERS = 0
+
+# Số update tối đa chờ trong hàng đợi của mỗi luồng; khi đầy, luồng nhận update sẽ chờ
+UPDATE_QUEUE_SIZE = 100
+
+# Cách nhận update từ Telegram:
+# - "polling": bot gọi getUpdates liên tục
+# - "webhook": Telegram gửi update tới máy chủ HTTP của bot (webhook.py)
+UPDATE_MODE = "polling"
+
+# Địa chỉ công khai (HTTPS) đăng ký với Telegram bằng setWebhook, ví dụ
+# "https://example.com/telegram". Để trống nếu webhook được đăng ký bằng cách khác
+WEBHOOK_URL = ""
+
+# Địa chỉ, cổng và đường dẫn máy chủ HTTP lắng nghe (thường đứng sau reverse proxy HTTPS)
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/telegram"
+
+# Chuỗi bí mật Telegram gửi kèm trong header X-Telegram-Bot-Api-Secret-Token;
+# request không có đúng chuỗi này bị từ chối. Để trống để tắt kiểm tra (không khuyến khích)
+WEBHOOK_SECRET_TOKEN = ""
+
+# Chứng chỉ để máy chủ tự phục vụ HTTPS (để trống nếu TLS do reverse proxy xử lý)
+WEBHOOK_SSL_CERT = ""
+WEBHOOK_SSL_KEY = ""
+
 # Cấu hình khác
 CURRENCY = "VND"
 
@@ -1,9 +1,75 @@
+import functools
 import json
+import logging
 import os
-from typing import Dict, List, Any, Optional
+import tempfile
+import threading
+import time
+from typing import Dict, List, Any, Callable, Optional, Tuple
 import config
+import jsoncodec
+from locking import FileLock
+from stats import StatsAggregate
+from rollups import RevenueRollup
+from user_index import UserIndex
+from catalog import CatalogSnapshot
+from storage import Storage
+from purchases import (PurchaseResult, check_purchase, extract_embedded_purchases, new_purchase_user,
+                       page, purchase_key, purchase_record, read_purchase_file, recover_purchases,
+                       scan_purchase_file)
 
-class Database:
+logger = logging.getLogger(__name__)
+
+
+def split_duplicate_accounts(accounts: List[str], exists: Callable[[str], bool]) -> Tuple[List[str], List[str]]:
+    """Tách danh sách tài khoản thành (tài khoản mới, tài khoản trùng).
+    
+    Tài khoản bị coi là trùng nếu đã có trong kho (``exists``) hoặc lặp lại trong cùng danh sách.
+    """
+    new_accounts = []
+    duplicates = []
+    seen = set()
+    for account in accounts:
+        if account in seen or exists(account):
+            duplicates.append(account)
+        else:
+            seen.add(account)
+            new_accounts.append(account)
+    return new_accounts, duplicates
+
+
+# Khóa file dùng chung cho mọi thao tác đọc-sửa-ghi trên thư mục data
+data_lock = FileLock(config.DB_LOCK_FILE)
+
+# Dữ liệu đã phân tích của các file JSON: {đường dẫn: ((inode, mtime, kích thước), dữ liệu)}
+_parsed_cache: Dict[str, Tuple[Tuple, Any]] = {}
+_parsed_cache_lock = threading.Lock()
+
+
+def _copy_records(data: Any) -> Any:
+    """Sao chép danh sách bản ghi để người gọi có thể sửa mà không ảnh hưởng bộ nhớ đệm"""
+    if isinstance(data, list):
+        return [dict(item) if isinstance(item, dict) else item for item in data]
+    if isinstance(data, dict):
+        return dict(data)
+    return data
+
+
+def locked(method):
+    """Giữ khóa data_lock trong suốt một thao tác đọc-sửa-ghi"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with data_lock:
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class Database(Storage):
+    """Backend lưu trữ mặc định: mỗi thao tác đọc/ghi trực tiếp các file JSON trong thư mục data"""
+    
+    # Giữ dữ liệu đã phân tích của các file JSON, chỉ đọc lại khi file thay đổi
+    cache_reads = True
+    
     def __init__(self):
         # Đảm bảo thư mục data tồn tại
         os.makedirs("data", exist_ok=True)
@@ -13,46 +79,103 @@ class Database:
         self._init_file(config.PRODUCTS_FILE, [])
         self._init_file(config.ACCOUNTS_FILE, [])
         
+        # (vị trí đã đọc tới trong file lịch sử mua hàng, id lần mua cuối cùng), đọc/ghi khi giữ data_lock
+        self._purchase_tail = (0, 0)
+
+        # Chuyển lịch sử mua hàng cũ nằm trong users.json sang file riêng
+        self._migrate_embedded_purchases()
+        # Hoàn tất các lần mua bị gián đoạn trước khi kịp cập nhật số dư/tài khoản
+        self._recover_purchases()
+        # Tính lại thống kê nếu chưa có hoặc không khớp với dữ liệu
+        self._ensure_statistics()
+        
         # Make sure users is initialized as a list, not a dict
         self.users = []  # Changed from dict to list
         self.load_data()
     
     def _init_file(self, file_path: str, default_data: Any) -> None:
         """Khởi tạo file nếu chưa tồn tại"""
-        if not os.path.exists(file_path):
-            # Đảm bảo thư mục tồn tại
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, ensure_ascii=False, indent=4)
+        with data_lock:
+            if not os.path.exists(file_path):
+                self._write_data(file_path, default_data)
     
-    def _read_data(self, file_path: str) -> Any:
-        """Đọc dữ liệu từ file JSON"""
+    def _load_file(self, file_path: str) -> Any:
+        """Đọc file JSON, dùng lại dữ liệu đã phân tích nếu file chưa bị thay đổi"""
+        with open(file_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            cached = _parsed_cache.get(file_path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            
+            data = jsoncodec.decode(f.read())
+        
+        if self.cache_reads:
+            with _parsed_cache_lock:
+                _parsed_cache[file_path] = (key, data)
+        return data
+    
+    def _read_shared(self, file_path: str) -> Any:
+        """Đọc dữ liệu từ file JSON (dùng chung với bộ nhớ đệm, không được sửa kết quả)"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            return self._load_file(file_path)
+        except FileNotFoundError:
             # Luôn khởi tạo là list trống cho tất cả các file
             default_data = []
             self._write_data(file_path, default_data)
             return default_data
+        except ValueError as e:
+            # Không ghi đè file hỏng, đổi tên để có thể khôi phục thủ công
+            with data_lock:
+                backup_path = f"{file_path}.corrupt-{int(time.time())}"
+                print(f"Error reading {file_path}: {e}. Moved to {backup_path}")
+                os.replace(file_path, backup_path)
+                default_data = []
+                self._write_data(file_path, default_data)
+            return default_data
+    
+    def _read_data(self, file_path: str) -> Any:
+        """Đọc dữ liệu từ file JSON"""
+        return _copy_records(self._read_shared(file_path))
     
     def _write_data(self, file_path: str, data: Any) -> None:
-        """Ghi dữ liệu vào file JSON"""
+        """Ghi dữ liệu vào file JSON (ghi ra file tạm rồi đổi tên để không để lại file ghi dở)"""
         try:
-            # Đảm bảo thư mục tồn tại
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Kiểm tra quyền ghi
-            if os.path.exists(file_path):
-                if not os.access(file_path, os.W_OK):
-                    print(f"Warning: No write permission for file {file_path}")
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            self._replace_file(file_path, data)
         except Exception as e:
             print(f"Error writing to file {file_path}: {e}")
             import traceback
             traceback.print_exc()
+
+    def _replace_file(self, file_path: str, data: Any) -> None:
+        """Ghi dữ liệu ra file tạm rồi thay thế file JSON khi đang giữ data_lock (báo lỗi nếu không ghi được)"""
+        # Đảm bảo thư mục tồn tại
+        directory = os.path.dirname(file_path) or "."
+        os.makedirs(directory, exist_ok=True)
+
+        with data_lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + ".", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(jsoncodec.encode_file(data))
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Giữ quyền truy cập của file cũ
+                mode = os.stat(file_path).st_mode & 0o777 if os.path.exists(file_path) else 0o644
+                os.chmod(tmp_path, mode)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            with _parsed_cache_lock:
+                if self.cache_reads:
+                    stat = os.stat(file_path)
+                    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+                    _parsed_cache[file_path] = (key, _copy_records(data))
+                else:
+                    _parsed_cache.pop(file_path, None)
     
     def load_data(self):
         """Load user data from the configured users file"""
@@ -70,15 +193,16 @@ class Database:
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Lấy thông tin người dùng theo ID"""
         try:
-            users = self._read_data(config.USERS_FILE)
+            users = self._read_shared(config.USERS_FILE)
             for user in users:
                 if user.get('id') == user_id:
-                    return user
+                    return dict(user)
             return None  # Trả về None nếu không tìm thấy người dùng
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
     
+    @locked
     def add_user(self, user_data: Dict) -> bool:
         """Thêm người dùng mới"""
         try:
@@ -104,6 +228,7 @@ class Database:
             # Thêm người dùng mới
             users.append(user_data)
             self._write_data(config.USERS_FILE, users)
+            self._update_stats(lambda stats: stats.add_user(user_data))
             print(f"User added successfully, now {len(users)} users")
             return True
         except Exception as e:
@@ -112,6 +237,7 @@ class Database:
             traceback.print_exc()
             return False
     
+    @locked
     def update_user(self, user_id: int, update_data: Dict) -> bool:
         """Cập nhật thông tin người dùng"""
         try:
@@ -154,6 +280,25 @@ class Database:
         """Lấy danh sách tất cả người dùng"""
         return self._read_data(config.USERS_FILE)
     
+    @locked
+    def _user_index(self) -> Tuple[UserIndex, Dict[Any, Dict]]:
+        """Chỉ mục người dùng theo username, chỉ xây dựng lại khi users.json thay đổi"""
+        users = self._read_shared(config.USERS_FILE)
+        cached = self.__dict__.get('_user_index_cache')
+        if cached is None or cached[0] is not users:
+            cached = self._user_index_cache = (users, UserIndex(users), {user.get('id'): user for user in users})
+        return cached[1], cached[2]
+    
+    def get_users_page(self, offset: int = 0, limit: int = 10, search: str = '') -> Tuple[List[Dict], int]:
+        """Lấy một trang người dùng theo thứ tự username (có thể lọc theo từ khóa), trả về (người dùng, tổng số)"""
+        index, users_by_id = self._user_index()
+        if search:
+            user_ids, total = index.search(search, offset, limit)
+        else:
+            user_ids, total = index.page(offset, limit), len(index)
+        return [dict(users_by_id[user_id]) for user_id in user_ids], total
+    
+    @locked
     def ban_user(self, user_id: int) -> bool:
         """Cấm người dùng"""
         try:
@@ -181,6 +326,7 @@ class Database:
             traceback.print_exc()
             return False
     
+    @locked
     def unban_user(self, user_id: int) -> bool:
         """Bỏ cấm người dùng"""
         try:
@@ -208,6 +354,7 @@ class Database:
             traceback.print_exc()
             return False
     
+    @locked
     def add_money(self, user_id: int, amount: float) -> bool:
         """Thêm tiền cho người dùng"""
         user = self.get_user(user_id)
@@ -220,16 +367,17 @@ class Database:
     # === Product methods ===
     def get_product(self, product_id: int) -> Optional[Dict]:
         """Lấy thông tin sản phẩm theo ID"""
-        products = self._read_data(config.PRODUCTS_FILE)
+        products = self._read_shared(config.PRODUCTS_FILE)
         for product in products:
             if product.get('id') == product_id:
-                return product
+                return dict(product)
         return None
     
     def get_all_products(self) -> List[Dict]:
         """Lấy danh sách tất cả sản phẩm"""
         return self._read_data(config.PRODUCTS_FILE)
     
+    @locked
     def create_product(self, product_data: Dict) -> int:
         """Tạo sản phẩm mới hoặc cập nhật sản phẩm hiện có"""
         products = self._read_data(config.PRODUCTS_FILE)
@@ -269,6 +417,7 @@ class Database:
         self._write_data(config.PRODUCTS_FILE, products)
         return product_data['id']
     
+    @locked
     def delete_product(self, product_id: int) -> bool:
         """Xóa sản phẩm"""
         products = self._read_data(config.PRODUCTS_FILE)
@@ -279,18 +428,54 @@ class Database:
                 return True
         return False
     
+    # === Catalog methods ===
+    def _catalog_source(self) -> Any:
+        """Giá trị thay đổi mỗi khi sản phẩm hoặc tồn kho thay đổi (trạng thái của products.json và accounts.json)"""
+        source = []
+        for file_path in (config.PRODUCTS_FILE, config.ACCOUNTS_FILE):
+            try:
+                stat = os.stat(file_path)
+                source.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                source.append(None)
+        return tuple(source)
+    
+    def catalog(self) -> CatalogSnapshot:
+        """Ảnh chụp danh mục sản phẩm hiện tại, chỉ dựng lại khi sản phẩm hoặc tồn kho thay đổi"""
+        # Đọc trạng thái trước dữ liệu: nếu dữ liệu đổi giữa chừng, lần gọi sau sẽ dựng lại
+        source = self._catalog_source()
+        cached = self.__dict__.get('_catalog')
+        if cached is not None and cached[0] == source:
+            return cached[1]
+        
+        snapshot = CatalogSnapshot(self.get_all_products(), self.stock_snapshot())
+        # Thay cả cặp trong một phép gán để luồng khác luôn thấy một ảnh chụp hoàn chỉnh
+        self._catalog = (source, snapshot)
+        return snapshot
+    
     # === Account methods ===
     def get_accounts(self) -> List[Dict[str, Any]]:
         """Lấy tất cả tài khoản"""
         return self._read_data(config.ACCOUNTS_FILE)
     
+    @locked
     def save_accounts(self, accounts: List[Dict[str, Any]]) -> None:
         """Lưu danh sách tài khoản"""
         self._write_data(config.ACCOUNTS_FILE, accounts)
     
     def add_accounts(self, product_id: int, accounts: List[str]) -> int:
-        """Thêm tài khoản cho sản phẩm"""
+        """Thêm tài khoản cho sản phẩm, trả về số tài khoản đã thêm"""
+        return self.import_accounts(product_id, accounts)['added']
+    
+    @locked
+    def import_accounts(self, product_id: int, accounts: List[str]) -> Dict[str, Any]:
+        """Thêm tài khoản cho sản phẩm, bỏ qua tài khoản trùng.
+        
+        Trả về ``{'added': số tài khoản đã thêm, 'duplicates': danh sách tài khoản trùng}``.
+        """
         all_accounts = self._read_data(config.ACCOUNTS_FILE)
+        existing = {account.get('data') for account in all_accounts}
+        accounts, duplicates = split_duplicate_accounts(accounts, existing.__contains__)
         
         # Tạo danh sách tài khoản mới
         new_accounts = []
@@ -301,10 +486,12 @@ class Database:
                 'sold': False
             })
         
-        all_accounts.extend(new_accounts)
-        self._write_data(config.ACCOUNTS_FILE, all_accounts)
-        return len(new_accounts)
+        if new_accounts:
+            all_accounts.extend(new_accounts)
+            self._write_data(config.ACCOUNTS_FILE, all_accounts)
+        return {'added': len(new_accounts), 'duplicates': duplicates}
     
+    @locked
     def get_available_account(self, product_id: int) -> Optional[Dict]:
         """Lấy một tài khoản chưa bán của sản phẩm"""
         accounts = self._read_data(config.ACCOUNTS_FILE)
@@ -318,13 +505,29 @@ class Database:
     
     def count_available_accounts(self, product_id: int) -> int:
         """Đếm số lượng tài khoản còn lại của sản phẩm"""
-        accounts = self._read_data(config.ACCOUNTS_FILE)
+        accounts = self._read_shared(config.ACCOUNTS_FILE)
         count = 0
         for account in accounts:
             if account.get('product_id') == product_id and not account.get('sold', False):
                 count += 1
         return count
     
+    def count_available_accounts_many(self, product_ids: List[int]) -> Dict[int, int]:
+        """Đếm số tài khoản còn lại của nhiều sản phẩm chỉ với một lần đọc file"""
+        stock = self.stock_snapshot()
+        return {product_id: stock.get(product_id, 0) for product_id in product_ids}
+    
+    def stock_snapshot(self) -> Dict[int, int]:
+        """Lấy số lượng tài khoản còn lại của tất cả sản phẩm"""
+        accounts = self._read_shared(config.ACCOUNTS_FILE)
+        stock = {}
+        for account in accounts:
+            if not account.get('sold', False):
+                product_id = account.get('product_id')
+                stock[product_id] = stock.get(product_id, 0) + 1
+        return stock
+    
+    @locked
     def mark_account_sold(self, account_data: str) -> bool:
         """Đánh dấu tài khoản đã bán"""
         accounts = self._read_data(config.ACCOUNTS_FILE)
@@ -335,6 +538,228 @@ class Database:
                 return True
         return False
     
+    # === Purchase methods ===
+    @locked
+    def _last_purchase_id(self) -> int:
+        """ID của lần mua cuối cùng, chỉ đọc phần file lịch sử được ghi thêm từ lần gọi trước"""
+        offset, last_id = self._purchase_tail
+        size = os.path.getsize(config.PURCHASES_FILE) if os.path.exists(config.PURCHASES_FILE) else 0
+        if size < offset:
+            # File đã bị thay thế: đọc lại từ đầu
+            offset, last_id = 0, 0
+        if size > offset:
+            records, offset = scan_purchase_file(config.PURCHASES_FILE, offset)
+            last_id = max([last_id] + [p.get('id', 0) for p in records])
+            if offset < size:
+                # Dòng cuối bị ghi dở (các lần ghi đều giữ data_lock): cắt bỏ để bản ghi mới nối tiếp đúng chỗ
+                with open(config.PURCHASES_FILE, 'r+b') as f:
+                    f.truncate(offset)
+        self._purchase_tail = (offset, last_id)
+        return last_id
+
+    @locked
+    def _append_purchases(self, records: List[Dict]) -> None:
+        """Ghi thêm các bản ghi mua hàng vào cuối file lịch sử"""
+        os.makedirs(os.path.dirname(config.PURCHASES_FILE), exist_ok=True)
+        last_id = self._last_purchase_id()
+        with open(config.PURCHASES_FILE, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self._purchase_tail = (f.tell(), max([last_id] + [record['id'] for record in records]))
+
+    @locked
+    def _append_purchase(self, user_id: int, purchase_data: Dict) -> Dict:
+        """Ghi thêm một lần mua với id kế tiếp, trả về bản ghi đã lưu"""
+        record = {'id': self._last_purchase_id() + 1, 'user_id': user_id}
+        record.update((k, v) for k, v in purchase_data.items() if k not in ('id', 'user_id'))
+        self._append_purchases([record])
+        return record
+    
+    @locked
+    def _migrate_embedded_purchases(self) -> None:
+        """Chuyển trường purchases trong bản ghi người dùng sang file lịch sử mua hàng"""
+        users = self._read_data(config.USERS_FILE)
+        if not any('purchases' in user for user in users):
+            return
+        
+        existing_keys = {purchase_key(p) for p in read_purchase_file(config.PURCHASES_FILE)}
+        last_id = self._last_purchase_id()
+        
+        new_records = []
+        for purchase in extract_embedded_purchases(users):
+            if purchase_key(purchase) in existing_keys:
+                continue
+            purchase['id'] = last_id + len(new_records) + 1
+            new_records.append(purchase)
+        
+        # Ghi lịch sử trước, sau đó mới xóa khỏi users.json
+        if new_records:
+            self._append_purchases(new_records)
+        self._write_data(config.USERS_FILE, users)
+        logger.info(f"Migrated {len(new_records)} purchases to {config.PURCHASES_FILE}")
+    
+    @locked
+    def _recover_purchases(self) -> None:
+        """Đồng bộ số dư và tài khoản đã bán theo lịch sử mua hàng"""
+        purchases = read_purchase_file(config.PURCHASES_FILE)
+        if not purchases:
+            return
+        
+        users = self._read_data(config.USERS_FILE)
+        accounts = self._read_data(config.ACCOUNTS_FILE)
+        users_by_id = {user.get('id'): user for user in users}
+        users_changed, accounts_changed = recover_purchases(users_by_id, accounts, purchases)
+        
+        if accounts_changed:
+            self._write_data(config.ACCOUNTS_FILE, accounts)
+        if users_changed:
+            self._write_data(config.USERS_FILE, list(users_by_id.values()))
+    
+    @locked
+    def purchase(self, user_id: int, product_id: int) -> PurchaseResult:
+        """Mua một tài khoản: kiểm tra điều kiện, lấy tài khoản, trừ tiền và lưu lịch sử trong một bước.
+        
+        Với file JSON, mỗi file bị thay đổi phải được ghi lại toàn bộ: dòng lịch sử, accounts.json,
+        users.json và stats.json (mỗi file một lần). Chỉ dòng lịch sử là bản ghi bền vững của lần
+        mua; các file còn lại được _recover_purchases/_ensure_statistics hoàn tất nếu bị gián đoạn.
+        """
+        users = self._read_data(config.USERS_FILE)
+        user = next((u for u in users if u.get('id') == user_id), None)
+        is_new_user = user is None
+        if is_new_user:
+            # Tạo user mới nếu không tồn tại
+            user = new_purchase_user(user_id)
+            users.append(user)
+        
+        product = self.get_product(product_id)
+        accounts = self._read_data(config.ACCOUNTS_FILE)
+        account = next(
+            (a for a in accounts if a.get('product_id') == product_id and not a.get('sold', False)), None
+        )
+        
+        error = check_purchase(
+            user, product, 1 if account else 0,
+            bool(product and product.get('is_free', False)) and self.has_purchased(user_id, product_id)
+        )
+        if error:
+            return PurchaseResult.failed(error)
+        
+        # Lịch sử mua hàng được ghi (fsync) trước; nếu bị gián đoạn sau bước này,
+        # _recover_purchases sẽ hoàn tất phần còn lại khi khởi động
+        record = self._append_purchase(user_id, purchase_record(user, product, account))
+        
+        account['sold'] = True
+        self._write_data(config.ACCOUNTS_FILE, accounts)
+        
+        user['balance'] = record['balance_after']
+        user['last_purchase_id'] = record['id']
+        self._write_data(config.USERS_FILE, users)
+        
+        def update_stats(stats: StatsAggregate) -> None:
+            stats.add_purchase(record)
+            if is_new_user:
+                stats.add_user(user)
+        self._update_stats(update_stats)
+        
+        return PurchaseResult(True, purchase=record, new_balance=record['balance_after'])
+    
+    @locked
+    def add_purchase(self, user_id: int, purchase_data: Dict) -> Dict:
+        """Lưu một lần mua hàng, trả về bản ghi đã lưu (có id)"""
+        record = self._append_purchase(user_id, purchase_data)
+        self._update_stats(lambda stats: stats.add_purchase(record))
+        return record
+    
+    def get_user_purchases(self, user_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy lịch sử mua hàng của người dùng theo thứ tự thời gian (có phân trang)"""
+        purchases = [p for p in read_purchase_file(config.PURCHASES_FILE) if p.get('user_id') == user_id]
+        return page(purchases, offset, limit)
+    
+    def count_user_purchases(self, user_id: int) -> int:
+        """Đếm số lần mua của người dùng"""
+        return len(self.get_user_purchases(user_id))
+    
+    def get_user_purchase(self, user_id: int, index: int) -> Optional[Dict]:
+        """Lấy lần mua thứ index (tính từ 0) của người dùng"""
+        if index < 0:
+            return None
+        purchases = self.get_user_purchases(user_id, index, 1)
+        return purchases[0] if purchases else None
+    
+    def get_product_purchases(self, product_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy các lần mua của một sản phẩm (có phân trang)"""
+        purchases = [p for p in read_purchase_file(config.PURCHASES_FILE) if p.get('product_id') == product_id]
+        return page(purchases, offset, limit)
+    
+    def has_purchased(self, user_id: int, product_id: int) -> bool:
+        """Kiểm tra người dùng đã từng mua/nhận sản phẩm chưa"""
+        return any(
+            p.get('user_id') == user_id and p.get('product_id') == product_id
+            for p in read_purchase_file(config.PURCHASES_FILE)
+        )
+    
+    def get_all_purchases(self) -> List[Dict]:
+        """Lấy toàn bộ lịch sử mua hàng"""
+        return read_purchase_file(config.PURCHASES_FILE)
+    
+    # === Statistics methods ===
+    def _read_stats(self) -> Optional[StatsAggregate]:
+        """Đọc thống kê đã lưu, None nếu chưa có"""
+        if not os.path.exists(config.STATS_FILE):
+            return None
+        data = self._read_data(config.STATS_FILE)
+        return StatsAggregate(data) if isinstance(data, dict) else None
+    
+    @locked
+    def _update_stats(self, update) -> None:
+        """Cập nhật thống kê đã lưu (kể cả doanh thu theo thời gian) bằng hàm ``update(stats)``"""
+        stats = self._read_stats()
+        if stats is None:
+            self._rebuild_stats()
+            return
+        update(stats)
+        self._write_data(config.STATS_FILE, stats.to_dict())
+    
+    @locked
+    def _ensure_statistics(self) -> None:
+        """Tính lại thống kê nếu chưa có hoặc không khớp với dữ liệu hiện tại"""
+        stats = self._read_stats()
+        if stats is None or not stats.is_current(len(self._read_shared(config.USERS_FILE)), self._last_purchase_id()):
+            self._rebuild_stats()
+    
+    @locked
+    def _rebuild_stats(self) -> StatsAggregate:
+        """Tính lại và lưu toàn bộ thống kê từ người dùng và lịch sử mua hàng"""
+        stats = StatsAggregate.rebuild(self._read_shared(config.USERS_FILE), read_purchase_file(config.PURCHASES_FILE))
+        self._write_data(config.STATS_FILE, stats.to_dict())
+        return stats
+    
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """Tính lại toàn bộ thống kê từ người dùng và lịch sử mua hàng"""
+        return self._rebuild_stats().summary()
+    
+    def get_statistics(self) -> Dict[str, Any]:
+        """Lấy thống kê hệ thống (tổng người dùng, người dùng mới hôm nay, đơn hàng, doanh thu)"""
+        stats = self._read_stats() or self._rebuild_stats()
+        return stats.summary()
+    
+    # === Revenue rollup methods ===
+    def _revenue_rollup(self) -> RevenueRollup:
+        """Bảng tổng hợp doanh thu theo thời gian (lưu cùng thống kê, cộng thêm ở mỗi lần mua)"""
+        stats = self._read_stats() or self._rebuild_stats()
+        return stats.rollup
+    
+    def get_revenue_by_product(self, granularity: str = 'day', periods: int = 30) -> Dict[int, Dict[str, float]]:
+        """Số đơn và doanh thu của từng sản phẩm trong ``periods`` giờ/ngày/tháng gần nhất"""
+        return self._revenue_rollup().by_product(granularity, periods)
+    
+    def get_revenue_series(self, product_id: Optional[int] = None, granularity: str = 'day',
+                           periods: int = 30) -> List[Dict[str, Any]]:
+        """Số đơn và doanh thu theo từng giờ/ngày/tháng (``product_id=None``: tất cả sản phẩm)"""
+        return self._revenue_rollup().series(product_id, granularity, periods)
+    
     def get_visibility_settings(self) -> dict:
         """Lấy cài đặt hiển thị từ cơ sở dữ liệu"""
         # Đây là ví dụ, bạn cần triển khai theo cơ sở dữ liệu của mình
@@ -346,6 +771,7 @@ class Database:
         # Đây là ví dụ, bạn cần triển khai theo cơ sở dữ liệu của mình
         self.update_setting(key, value)
     
+    @locked
     def get_settings(self) -> Dict:
         """Lấy tất cả cài đặt"""
         if not os.path.exists(config.SETTINGS_FILE):
@@ -359,6 +785,7 @@ class Database:
         
         return self._read_data(config.SETTINGS_FILE)
     
+    @locked
     def update_setting(self, key: str, value: Any) -> None:
         """Cập nhật một cài đặt"""
         settings = self.get_settings()
@@ -370,4 +797,61 @@ class Database:
         user = self.get_user(user_id)
         if user:
             return user.get('banned', False)
-        return False 
\ No newline at end of file
+        return False 
+    
+    def warm_up(self) -> None:
+        """Đọc trước dữ liệu hay dùng để các lần truy cập đầu tiên không phải chờ"""
+        self.get_settings()
+        self.catalog()
+
+
+# Các backend lưu trữ có thể chọn bằng config.DATABASE_BACKEND: {tên: hàm tạo}
+_backends: Dict[str, Callable[[], Storage]] = {}
+
+def register_backend(name: str, factory: Callable[[], Storage]) -> None:
+    """Đăng ký một backend lưu trữ để có thể chọn qua DATABASE_BACKEND"""
+    _backends[name] = factory
+
+def available_backends() -> List[str]:
+    """Tên các backend đã đăng ký"""
+    return sorted(_backends)
+
+def _memory_backend() -> Storage:
+    from memory_database import MemoryDatabase
+    return MemoryDatabase(write_delay=config.DB_WRITE_BEHIND_DELAY)
+
+def _sqlite_backend() -> Storage:
+    from sqlite_database import SQLiteDatabase
+    return SQLiteDatabase(config.SQLITE_DB_FILE)
+
+register_backend('json', Database)
+register_backend('memory', _memory_backend)
+register_backend('sqlite', _sqlite_backend)
+
+
+# Đối tượng Database dùng chung trong tiến trình
+_shared_db: Optional[Storage] = None
+_shared_db_lock = threading.Lock()
+
+def create_database() -> Storage:
+    """Tạo đối tượng Database theo cấu hình DATABASE_BACKEND"""
+    backend = config.DATABASE_BACKEND
+    factory = _backends.get(backend)
+    if factory is None:
+        raise ValueError(f"Backend cơ sở dữ liệu không hợp lệ: {backend}")
+    return factory()
+
+def set_database(db: Storage) -> None:
+    """Đăng ký đối tượng Database dùng chung (ví dụ đối tượng do bot.py tạo)"""
+    global _shared_db
+    with _shared_db_lock:
+        _shared_db = db
+
+def get_database() -> Storage:
+    """Lấy đối tượng Database dùng chung, tạo mới ở lần gọi đầu tiên"""
+    global _shared_db
+    if _shared_db is None:
+        with _shared_db_lock:
+            if _shared_db is None:
+                _shared_db = create_database()
+    return _shared_db
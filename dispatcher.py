@@ -0,0 +1,137 @@
+import logging
+import queue
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Các loại update dùng để xác định chat (theo thứ tự kiểm tra)
+UPDATE_TYPES = (
+    'message',
+    'edited_message',
+    'callback_query',
+    'channel_post',
+    'edited_channel_post',
+    'inline_query',
+    'chosen_inline_result',
+    'shipping_query',
+    'pre_checkout_query',
+    'my_chat_member',
+    'chat_member',
+    'chat_join_request'
+)
+
+# Giá trị đưa vào hàng đợi để báo luồng dừng
+_STOP = None
+
+
+def chat_key(update) -> int:
+    """Khóa phân luồng của update: chat_id, hoặc ID người gửi nếu update không gắn với chat"""
+    for update_type in UPDATE_TYPES:
+        obj = getattr(update, update_type, None)
+        if obj is None:
+            continue
+        chat = getattr(obj, 'chat', None)
+        if chat is None and getattr(obj, 'message', None) is not None:
+            chat = obj.message.chat
+        if chat is not None:
+            return chat.id
+        from_user = getattr(obj, 'from_user', None)
+        if from_user is not None:
+            return from_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """Chia update cho N luồng xử lý theo chat_id.
+
+    Mỗi luồng có một hàng đợi riêng (tối đa ``queue_size`` update); update của
+    cùng một chat luôn vào cùng một luồng nên được xử lý đúng thứ tự, còn các
+    chat khác nhau chạy song song: một lần tải file Pikbest hay broadcast chậm
+    chỉ làm chờ chat đang thực hiện nó. Khi hàng đợi đầy, ``dispatch`` chờ cho
+    tới khi luồng đó xử lý bớt.
+
+    ``process`` nhận một danh sách update và xử lý ngay trong luồng gọi nó
+    (TeleBot.process_new_updates của bot tạo với ``threaded=False``).
+    """
+
+    def __init__(self, process: Callable[[List], None], workers: int = 4, queue_size: int = 100):
+        if workers < 1:
+            raise ValueError("Số luồng xử lý update phải lớn hơn 0")
+        self.process = process
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(update_queue,), name=f"update-worker-{index}", daemon=True)
+            for index, update_queue in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def workers(self) -> int:
+        return len(self._queues)
+
+    def dispatch(self, updates: List) -> None:
+        """Đưa các update vào hàng đợi của luồng phụ trách chat của chúng"""
+        for update in updates:
+            update_queue = self._queues[chat_key(update) % len(self._queues)]
+            try:
+                update_queue.put_nowait(update)
+            except queue.Full:
+                logger.warning(f"Update queue is full, waiting to enqueue update {update.update_id}")
+                update_queue.put(update)
+
+    def pending(self) -> int:
+        """Số update đang chờ trong các hàng đợi"""
+        return sum(update_queue.qsize() for update_queue in self._queues)
+
+    def join(self) -> None:
+        """Chờ cho tới khi mọi update đã nhận được xử lý xong"""
+        for update_queue in self._queues:
+            update_queue.join()
+
+    def _run(self, update_queue: queue.Queue) -> None:
+        while True:
+            update = update_queue.get()
+            try:
+                if update is _STOP:
+                    return
+                self.process([update])
+            except Exception as e:
+                logger.error(f"Error while processing update {update.update_id}: {e}", exc_info=True)
+            finally:
+                update_queue.task_done()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Xử lý nốt các update đã nhận rồi dừng các luồng"""
+        for update_queue in self._queues:
+            update_queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+def install(bot, workers: int, queue_size: int) -> UpdateDispatcher:
+    """Cho update mà ``bot`` nhận được (polling hoặc webhook) đi qua UpdateDispatcher.
+
+    ``bot`` phải được tạo với ``threaded=False`` để handler chạy ngay trong luồng
+    của dispatcher thay vì trong thread pool của telebot (không giữ thứ tự).
+    """
+    if bot.threaded:
+        raise ValueError("UpdateDispatcher cần TeleBot(threaded=False)")
+    dispatcher = UpdateDispatcher(bot.process_new_updates, workers, queue_size)
+
+    def process_new_updates(updates: List) -> None:
+        # Ghi nhận update_id ngay để lần getUpdates tiếp theo không nhận lại các update đang chờ
+        for update in updates:
+            if update.update_id > bot.last_update_id:
+                bot.last_update_id = update.update_id
+        dispatcher.dispatch(updates)
+
+    bot.process_new_updates = process_new_updates
+    return dispatcher
+
+
+def uninstall(bot, dispatcher: UpdateDispatcher, timeout: Optional[float] = None) -> None:
+    """Trả ``bot`` về cách xử lý update mặc định và dừng dispatcher"""
+    bot.__dict__.pop('process_new_updates', None)
+    dispatcher.stop(timeout)
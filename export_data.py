@@ -0,0 +1,60 @@
+"""Xuất dữ liệu của bot ra các file JSON thụt lề dễ đọc để kiểm tra/gỡ lỗi.
+
+File trong thư mục data được ghi dạng gọn (config.DATA_FILES_PRETTY = False) và
+có thể nằm trong SQLite hoặc nhật ký, nên công cụ này đọc qua backend đang cấu
+hình rồi ghi bản dễ đọc ra thư mục riêng, không sửa thư mục data. Ví dụ::
+
+    python export_data.py --out export
+"""
+import argparse
+import os
+from typing import Dict, Any, Callable
+import config
+import database
+import jsoncodec
+from storage import Storage
+
+# {tên file xuất: hàm lấy dữ liệu từ backend}
+EXPORTS: Dict[str, Callable[[Storage], Any]] = {
+    'users': lambda db: db.get_all_users(),
+    'products': lambda db: db.get_all_products(),
+    'accounts': lambda db: db.get_accounts(),
+    'purchases': lambda db: db.get_all_purchases(),
+    'settings': lambda db: db.get_settings(),
+    'stats': lambda db: db.get_statistics()
+}
+
+
+def export(db: Storage, out_dir: str, names=None) -> Dict[str, str]:
+    """Ghi dữ liệu dạng thụt lề vào ``out_dir``, trả về {tên: đường dẫn file}"""
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    for name in names or EXPORTS:
+        file_path = os.path.join(out_dir, f"{name}.json")
+        with open(file_path, 'wb') as f:
+            f.write(jsoncodec.encode(EXPORTS[name](db), pretty=True))
+            f.write(b"\n")
+        written[name] = file_path
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xuất dữ liệu của bot ra JSON dễ đọc")
+    parser.add_argument('--out', default='export', help="Thư mục chứa các file xuất")
+    parser.add_argument('--backend', default=config.DATABASE_BACKEND, choices=database.available_backends(),
+                        help="Backend cơ sở dữ liệu cần đọc")
+    parser.add_argument('--only', nargs='+', choices=list(EXPORTS), help="Chỉ xuất các phần này")
+    args = parser.parse_args()
+
+    config.DATABASE_BACKEND = args.backend
+    db = database.create_database()
+    try:
+        written = export(db, args.out, args.only)
+    finally:
+        db.close()
+    for name, file_path in written.items():
+        print(f"Đã xuất {name}: {file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 from telebot import TeleBot
 from telebot.types import Message, CallbackQuery, InputMediaPhoto
 import config
-from database import Database
+from database import get_database, set_database
+from storage import Storage
+from purchases import PurchaseResult
 import keyboards
 import re
 import datetime
@@ -15,6 +17,10 @@ import base64
 from io import BytesIO
 import telebot.apihelper
 from modules.files import FileManager
+from router import CallbackRouter, admin_only
+from request_context import RequestContext, get_context
+from bans import banned_users
+from states import UserStates
 
 # Thiết lập logging
 logging.basicConfig(
@@ -23,10 +29,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-db = Database()
+# Đối tượng Database dùng chung, được truyền vào qua register_handlers
+db: Optional[Storage] = None
 
-# Lưu trạng thái của người dùng
-user_states = {}
+# Lưu trạng thái của người dùng (handler giữ user_states.lock(user_id) khi xử lý, xem _per_user)
+user_states = UserStates()
 
 # Khởi tạo file_manager
 file_manager = None
@@ -35,37 +42,58 @@ def is_admin(user_id: int) -> bool:
     """Kiểm tra xem người dùng có phải là admin không"""
     return user_id in config.ADMIN_IDS
 
-def register_handlers(bot: TeleBot) -> None:
-    """Đăng ký tất cả các handler cho bot"""
-    global file_manager
-    file_manager = FileManager(bot, db)
+def _per_user(handler):
+    """Chạy handler khi giữ khóa trạng thái của người gửi, để các update của cùng một người
+    trên các luồng khác nhau không sửa user_states cùng lúc"""
+    def wrapper(update):
+        with user_states.lock(update.from_user.id):
+            handler(update)
+    return wrapper
+
+# Bảng định tuyến callback_data, các callback handler bên dưới tự đăng ký bằng decorator
+callback_router = CallbackRouter(is_admin)
+
+def register_handlers(bot: TeleBot, database: Optional[Storage] = None, manager: Optional[FileManager] = None) -> None:
+    """Đăng ký tất cả các handler cho bot
+    
+    ``database`` và ``manager`` là các đối tượng dùng chung do bot.py tạo ở lúc khởi động.
+    """
+    global db, file_manager
+    db = database or get_database()
+    # keyboards và các module khác dùng cùng đối tượng qua get_database()
+    set_database(db)
+    file_manager = manager or FileManager(bot, db)
+    # Tập ID bị cấm dùng cho middleware và các lệnh kiểm tra
+    banned_users.load(db)
+    # Các nút của module tải file
+    file_manager.register_callbacks(callback_router)
     
     # Command handlers
-    bot.register_message_handler(lambda msg: start_command(bot, msg), commands=['start'])
-    bot.register_message_handler(lambda msg: help_command(bot, msg), commands=['help'])
-    bot.register_message_handler(lambda msg: dashboard_command(bot, msg), commands=['dashboard'])
+    bot.register_message_handler(_per_user(lambda msg: start_command(bot, msg)), commands=['start'])
+    bot.register_message_handler(_per_user(lambda msg: help_command(bot, msg)), commands=['help'])
+    bot.register_message_handler(_per_user(lambda msg: dashboard_command(bot, msg)), commands=['dashboard'])
     
     # Admin command handlers
-    bot.register_message_handler(lambda msg: create_product_command(bot, msg), commands=['create_product'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: product_list_command(bot, msg), commands=['product_list'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: upload_product_command(bot, msg), commands=['upload_product'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: add_money_command(bot, msg), commands=['add_money'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: user_list_command(bot, msg), commands=['user_list'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: ban_user_command(bot, msg), commands=['ban_user'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: unban_user_command(bot, msg), commands=['unban_user'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: broadcast_command(bot, msg), commands=['broadcast'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: add_admin_command(bot, msg), commands=['add_admin'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: create_product_command(bot, msg)), commands=['create_product'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: product_list_command(bot, msg)), commands=['product_list'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: upload_product_command(bot, msg)), commands=['upload_product'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: add_money_command(bot, msg)), commands=['add_money'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: user_list_command(bot, msg)), commands=['user_list'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: ban_user_command(bot, msg)), commands=['ban_user'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: unban_user_command(bot, msg)), commands=['unban_user'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: broadcast_command(bot, msg)), commands=['broadcast'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: add_admin_command(bot, msg)), commands=['add_admin'], func=lambda msg: is_admin(msg.from_user.id))
     
     # Debug commands
-    bot.register_message_handler(lambda msg: debug_user_command(bot, msg), commands=['debug_user'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: check_ban_command(bot, msg), commands=['check_ban'], func=lambda msg: is_admin(msg.from_user.id))
-    bot.register_message_handler(lambda msg: force_ban_command(bot, msg), commands=['force_ban'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: debug_user_command(bot, msg)), commands=['debug_user'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: check_ban_command(bot, msg)), commands=['check_ban'], func=lambda msg: is_admin(msg.from_user.id))
+    bot.register_message_handler(_per_user(lambda msg: force_ban_command(bot, msg)), commands=['force_ban'], func=lambda msg: is_admin(msg.from_user.id))
     
     # Callback query handlers
-    bot.register_callback_query_handler(lambda call: handle_callback_query(bot, call), func=lambda call: True)
+    bot.register_callback_query_handler(_per_user(lambda call: handle_callback_query(bot, call)), func=lambda call: True)
     
     # State handlers
-    bot.register_message_handler(lambda msg: handle_state(bot, msg), content_types=['text'], func=lambda msg: msg.from_user.id in user_states)
+    bot.register_message_handler(_per_user(lambda msg: handle_state(bot, msg)), content_types=['text'], func=lambda msg: msg.from_user.id in user_states)
 
 def start_command(bot: TeleBot, message: Message) -> None:
     """Xử lý lệnh /start"""
@@ -78,7 +106,8 @@ def start_command(bot: TeleBot, message: Message) -> None:
     import datetime
     
     # Kiểm tra xem người dùng đã tồn tại chưa
-    user = db.get_user(user_id)
+    ctx = get_context(db, message)
+    user = ctx.user
     if not user:
         # Tạo người dùng mới
         user_data = {
@@ -86,11 +115,11 @@ def start_command(bot: TeleBot, message: Message) -> None:
             'username': username,
             'balance': 0,
             'banned': False,
-            'purchases': [],
             'created_at': datetime.datetime.now().isoformat()
         }
         # Thêm người dùng vào database
         success = db.add_user(user_data)
+        ctx.invalidate()
         
         if success:
             # Sử dụng user_data thay vì gọi lại get_user
@@ -106,7 +135,7 @@ def start_command(bot: TeleBot, message: Message) -> None:
             notify_admins(bot, admin_notification, parse_mode="Markdown")
         else:
             # Thử lấy lại thông tin người dùng
-            user = db.get_user(user_id)
+            user = ctx.user
             if not user:
                 # Nếu vẫn không tìm thấy, đây là lỗi thực sự
                 logger.error(f"Failed to add new user {username} (ID: {user_id}) to database")
@@ -142,8 +171,7 @@ def help_command(bot: TeleBot, message: Message) -> None:
     logger.info(f"User {username} (ID: {user_id}) requested help")
     
     # Kiểm tra xem người dùng có bị cấm không
-    user = db.get_user(user_id)
-    if user and user.get('banned', False):
+    if is_user_banned(user_id):
         bot.send_message(user_id, "⛔ Tài khoản của bạn đã bị cấm. Vui lòng liên hệ quản trị viên.")
         return
     
@@ -194,8 +222,7 @@ def dashboard_command(bot: TeleBot, message: Message) -> None:
     user_id = message.from_user.id
     
     # Kiểm tra xem người dùng có bị cấm không
-    user = db.get_user(user_id)
-    if user and user.get('banned', False):
+    if is_user_banned(user_id):
         bot.send_message(user_id, "⛔ Tài khoản của bạn đã bị cấm. Vui lòng liên hệ quản trị viên.")
         return
     
@@ -251,9 +278,9 @@ def product_list_command(bot: TeleBot, message: Message) -> None:
     """Xử lý lệnh /product_list"""
     user_id = message.from_user.id
     
-    products = db.get_all_products()
+    catalog = db.catalog()
     
-    if not products:
+    if not catalog.products('all'):
         bot.send_message(user_id, "📦 Chưa có sản phẩm nào.")
         return
     
@@ -261,7 +288,7 @@ def product_list_command(bot: TeleBot, message: Message) -> None:
         user_id,
         "📋 *Danh sách sản phẩm*\n\nChọn một sản phẩm để xem chi tiết:",
         parse_mode="Markdown",
-        reply_markup=keyboards.product_list_keyboard(products, admin=True)
+        reply_markup=keyboards.product_list_keyboard('all', admin=True, catalog=catalog)
     )
 
 def upload_product_command(bot: TeleBot, message: Message) -> None:
@@ -362,21 +389,16 @@ def user_list_command(bot: TeleBot, message: Message) -> None:
     """Xử lý lệnh /user_list"""
     user_id = message.from_user.id
     
-    users = db.get_all_users()
+    _, total = db.get_users_page(0, 1)
     
-    if not users:
+    if not total:
         bot.send_message(user_id, "👥 Chưa có người dùng nào.")
         return
     
-    # Sắp xếp người dùng theo username (a-z)
-    # Đảm bảo sắp xếp không phân biệt chữ hoa/thường và xử lý trường hợp username là None
-    users = sorted(users, key=lambda x: str(x.get('username', '')).lower() if x.get('username') is not None else '')
-    
-    # Lưu trạng thái để xử lý phân trang
+    # Lưu trạng thái để xử lý phân trang (danh sách đã được sắp xếp theo username trong database)
     user_states[user_id] = {
         'state': 'viewing_user_list',
         'page': 0,
-        'users': users,
         'search_query': ''
     }
     
@@ -387,46 +409,25 @@ def display_user_list_page(bot: TeleBot, user_id: int, message_id: int = None) -
     """Hiển thị một trang danh sách người dùng"""
     try:
         state = user_states.get(user_id, {})
-        users = state.get('users', [])
-        page = state.get('page', 0)
+        page = max(state.get('page', 0), 0)
         search_query = state.get('search_query', '').lower()
         
-        # Sắp xếp người dùng theo username (a-z)
-        # Đảm bảo sắp xếp không phân biệt chữ hoa/thường và xử lý trường hợp username là None
-        users = sorted(users, key=lambda x: str(x.get('username', '')).lower() if x.get('username') is not None else '')
-        
-        # Cập nhật users đã sắp xếp vào state
-        if user_id in user_states:
-            user_states[user_id]['users'] = users
-        
-        # Lọc người dùng theo từ khóa tìm kiếm nếu có
-        if search_query:
-            filtered_users = []
-            for user in users:
-                username = str(user.get('username', '')).lower()
-                user_id_str = str(user.get('id', ''))
-                if search_query in username or search_query in user_id_str:
-                    filtered_users.append(user)
-            users = filtered_users
-        
         # Số người dùng mỗi trang - tăng lên 10
         per_page = 10
-        total_pages = max(1, (len(users) + per_page - 1) // per_page)
+        
+        # Chỉ lấy người dùng của trang hiện tại (đã sắp xếp theo username và lọc theo từ khóa)
+        current_users, total = db.get_users_page(page * per_page, per_page, search_query)
+        total_pages = max(1, (total + per_page - 1) // per_page)
         
         # Đảm bảo page không vượt quá total_pages
-        page = min(page, total_pages - 1)
-        if page < 0:
-            page = 0
+        if page > total_pages - 1:
+            page = total_pages - 1
+            current_users, total = db.get_users_page(page * per_page, per_page, search_query)
         
-        if len(users) == 0:
+        if total == 0:
             text = "🔍 Không tìm thấy người dùng nào phù hợp."
             markup = keyboards.user_list_navigation_keyboard(0, 0, search_query)
         else:
-            # Lấy người dùng cho trang hiện tại
-            start_idx = page * per_page
-            end_idx = min(start_idx + per_page, len(users))
-            current_users = users[start_idx:end_idx]
-            
             # Tạo nội dung tin nhắn
             text = f"👥 *Danh sách người dùng* (Trang {page+1}/{total_pages})\n\n"
             
@@ -550,7 +551,7 @@ def ban_user_command(bot: TeleBot, message: Message) -> None:
     
     # Sử dụng hàm ban_user từ database
     logger.info(f"Admin {message.from_user.username} (ID: {user_id}) is banning user {target_user_id}")
-    success = db.ban_user(target_user_id)
+    success = ban_user(target_user_id)
     
     if success:
         # Gửi thông báo thành công
@@ -609,7 +610,7 @@ def unban_user_command(bot: TeleBot, message: Message) -> None:
     
     # Sử dụng hàm unban_user từ database
     logger.info(f"Admin {message.from_user.username} (ID: {user_id}) is unbanning user {target_user_id}")
-    success = db.unban_user(target_user_id)
+    success = unban_user(target_user_id)
     
     if success:
         # Gửi thông báo thành công
@@ -667,7 +668,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
     
     # Kiểm tra lệnh hủy
     if text == '/cancel':
-        del user_states[user_id]
+        user_states.pop(user_id, None)
         bot.send_message(user_id, "❌ Đã hủy thao tác.")
         return
     
@@ -718,7 +719,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
         new_id = db.create_product(product_data)
         
         # Xóa trạng thái
-        del user_states[user_id]
+        user_states.pop(user_id, None)
         
         bot.send_message(
             user_id,
@@ -787,7 +788,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
             db.create_product(product_data)
             
             # Xóa trạng thái
-            del user_states[user_id]
+            user_states.pop(user_id, None)
             
             bot.send_message(
                 user_id,
@@ -812,7 +813,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
         
         if not product:
             bot.send_message(user_id, "❌ Sản phẩm không tồn tại.")
-            del user_states[user_id]
+            user_states.pop(user_id, None)
             return
         
         # Phân tích danh sách tài khoản
@@ -823,15 +824,21 @@ def handle_state(bot: TeleBot, message: Message) -> None:
             bot.send_message(user_id, "❌ Danh sách tài khoản không hợp lệ.")
             return
         
-        # Thêm tài khoản vào cơ sở dữ liệu
-        count = db.add_accounts(product_id, accounts)
+        # Thêm tài khoản vào cơ sở dữ liệu (bỏ qua tài khoản trùng)
+        result = db.import_accounts(product_id, accounts)
+        count = result['added']
+        duplicates = result['duplicates']
         
         # Xóa trạng thái
-        del user_states[user_id]
+        user_states.pop(user_id, None)
+        
+        message = f"✅ Đã thêm {count} tài khoản cho sản phẩm *{product['name']}* thành công!"
+        if duplicates:
+            message += f"\n\n⚠️ Bỏ qua {len(duplicates)} tài khoản bị trùng."
         
         bot.send_message(
             user_id,
-            f"✅ Đã thêm {count} tài khoản cho sản phẩm *{product['name']}* thành công!",
+            message,
             parse_mode="Markdown"
         )
     
@@ -887,16 +894,16 @@ def handle_state(bot: TeleBot, message: Message) -> None:
                     user_id,
                     "❌ Không tìm thấy người dùng. Vui lòng thử lại."
                 )
-                del user_states[user_id]
+                user_states.pop(user_id, None)
                 return
             
-            # Cập nhật số dư
-            current_balance = target_user.get('balance', 0)
-            new_balance = current_balance + amount
+            # Cộng tiền trong một thao tác của database (không ghi đè số dư đã đọc,
+            # vì người dùng có thể đang mua hàng ở một worker khác cùng lúc)
+            new_balance = target_user.get('balance', 0) + amount
             
-            if db.update_user(target_user_id, {'balance': new_balance}):
+            if db.add_money(target_user_id, amount):
                 # Xóa trạng thái
-                del user_states[user_id]
+                user_states.pop(user_id, None)
                 
                 bot.send_message(
                     user_id,
@@ -919,7 +926,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
                     user_id,
                     "❌ Không thể cập nhật số dư. Vui lòng thử lại sau."
                 )
-                del user_states[user_id]
+                user_states.pop(user_id, None)
         except ValueError:
             bot.send_message(
                 user_id,
@@ -941,7 +948,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
         broadcast_message = text
         
         # Xóa trạng thái
-        del user_states[user_id]
+        user_states.pop(user_id, None)
         
         # Hiển thị tin nhắn xác nhận
         bot.send_message(
@@ -1014,10 +1021,10 @@ def handle_state(bot: TeleBot, message: Message) -> None:
                 return
             
             # Cấm người dùng
-            success = db.ban_user(target_user_id)
+            success = ban_user(target_user_id)
             
             # Xóa trạng thái
-            del user_states[user_id]
+            user_states.pop(user_id, None)
             
             if success:
                 bot.send_message(
@@ -1058,10 +1065,10 @@ def handle_state(bot: TeleBot, message: Message) -> None:
                 return
             
             # Bỏ cấm người dùng
-            success = db.unban_user(target_user_id)
+            success = unban_user(target_user_id)
             
             # Xóa trạng thái
-            del user_states[user_id]
+            user_states.pop(user_id, None)
             
             if success:
                 bot.send_message(
@@ -1088,7 +1095,7 @@ def handle_state(bot: TeleBot, message: Message) -> None:
     elif state == 'waiting_for_download_url':
         # Xử lý URL tải file
         # Xóa trạng thái người dùng
-        del user_states[user_id]
+        user_states.pop(user_id, None)
         
         # Chuyển xử lý cho file_manager
         file_manager.process_download_url(message)
@@ -1096,1292 +1103,1174 @@ def handle_state(bot: TeleBot, message: Message) -> None:
     # Thêm các trạng thái khác ở đây
 
 def handle_callback_query(bot: TeleBot, call: CallbackQuery) -> None:
-    """Xử lý callback query"""
+    """Xử lý callback query: kiểm tra người dùng rồi chuyển cho handler đã đăng ký trong callback_router"""
     user_id = call.from_user.id
     username = call.from_user.username or f"user_{user_id}"
-    data = call.data
     
-    logger.info(f"User {username} (ID: {user_id}) pressed button: {data}")
+    logger.info(f"User {username} (ID: {user_id}) pressed button: {call.data}")
     
-    # Kiểm tra xem người dùng có bị cấm không
-    user = db.get_user(user_id)
-    if user and user.get('banned', False):
+    # Kiểm tra xem người dùng có bị cấm không (tập ID trong bộ nhớ, không đọc bản ghi)
+    if is_user_banned(user_id):
         bot.answer_callback_query(call.id, "⛔ Tài khoản của bạn đã bị cấm. Vui lòng liên hệ quản trị viên.", show_alert=True)
         return
     
-    # Thêm các hàm tiện ích
-    def get_statistics():
-        """Lấy thống kê hệ thống"""
-        # Import datetime trong phạm vi hàm này
-        import datetime
-        
-        users = db.get_all_users()
-        total_users = len(users)
-        
-        # Đếm người dùng mới trong ngày
-        today = datetime.datetime.now().date()
-        new_users_today = 0
-        
-        # Giả sử có trường 'created_at' trong dữ liệu người dùng
-        for user in users:
-            if 'created_at' in user:
-                try:
-                    created_date = datetime.datetime.fromisoformat(user['created_at']).date()
-                    if created_date == today:
-                        new_users_today += 1
-                except (ValueError, TypeError):
-                    pass
-        
-        # Đếm tổng đơn hàng và doanh thu
-        total_orders = 0
-        revenue = 0
-        for user in users:
-            purchases = user.get('purchases', [])
-            total_orders += len(purchases)
-            for purchase in purchases:
-                revenue += purchase.get('price', 0)
-        
-        return {
-            'total_users': total_users,
-            'new_users_today': new_users_today,
-            'total_orders': total_orders,
-            'revenue': revenue
-        }
+    # Bản ghi người gửi được đọc một lần và dùng lại trong handler
+    ctx = get_context(db, call)
+    if not callback_router.dispatch(bot, call, ctx):
+        logger.info(f"No handler for callback data: {call.data}")
     
-    def process_purchase(user_id, product_id):
-        """Xử lý quá trình mua hàng"""
-        try:
-            # Import datetime ở đầu hàm để đảm bảo nó có sẵn trong phạm vi của hàm
-            import datetime
-            
-            user = db.get_user(user_id)
-            if not user:
-                # Tạo user mới nếu không tồn tại
-                user = {
-                    'id': user_id,
-                    'balance': 0,
-                    'purchases': [],
-                    'banned': False
-                }
-                db.add_user(user)
-            
-            product = db.get_product(product_id)
-            if not product:
-                return {
-                    'success': False,
-                    'message': 'Sản phẩm không tồn tại.'
-                }
-            
-            # Kiểm tra số lượng tài khoản còn lại
-            available_accounts = db.count_available_accounts(product_id)
-            if available_accounts <= 0:
-                return {
-                    'success': False,
-                    'message': 'Sản phẩm đã hết hàng.'
-                }
-            
-            # Kiểm tra nếu là sản phẩm miễn phí, người dùng chỉ được nhận 1 lần
-            if product.get('is_free', False):
-                user_purchases = user.get('purchases', [])
-                for purchase in user_purchases:
-                    if purchase.get('product_id') == product_id:
-                        return {
-                            'success': False,
-                            'message': 'Bạn đã nhận sản phẩm miễn phí này rồi. Mỗi người chỉ được nhận 1 lần.'
-                        }
-            
-            # Kiểm tra số dư
-            user_balance = user.get('balance', 0)
-            product_price = product.get('price', 0)
-            
-            if product_price > 0 and user_balance < product_price:
-                return {
-                    'success': False,
-                    'message': f'Số dư không đủ. Bạn cần thêm {product_price - user_balance:,} {config.CURRENCY}.'
-                }
-            
-            # Lấy một tài khoản
-            account = db.get_available_account(product_id)
-            if not account:
-                return {
-                    'success': False,
-                    'message': 'Không thể lấy tài khoản. Vui lòng thử lại sau.'
-                }
-            
-            # Trừ tiền
-            if product_price > 0:
-                new_balance = user_balance - product_price
-                db.update_user(user_id, {'balance': new_balance})
-            else:
-                new_balance = user_balance
-            
-            # Lưu lịch sử mua hàng
-            purchase_data = {
-                'product_id': product_id,
-                'product_name': product.get('name', 'Unknown'),
-                'price': product_price,
-                'account_data': account.get('data', ''),
-                'timestamp': datetime.datetime.now().isoformat()
-            }
-            
-            user_purchases = user.get('purchases', [])
-            user_purchases.append(purchase_data)
-            db.update_user(user_id, {'purchases': user_purchases})
-            
-            # Trả về kết quả thành công
-            return {
-                'success': True,
-                'product_name': product.get('name', 'Unknown'),
-                'price': product_price,
-                'new_balance': new_balance,
-                'account_info': account.get('data', '')
-            }
-        except Exception as e:
-            logger.error(f"Error in process_purchase: {e}")
-            return {
-                'success': False,
-                'message': 'Đã xảy ra lỗi khi xử lý giao dịch. Vui lòng thử lại sau.'
-            }
+    # Đánh dấu callback đã được xử lý
+    try:
+        bot.answer_callback_query(call.id)
+    except telebot.apihelper.ApiTelegramException:
+        # Handler đã trả lời callback (ví dụ bằng thông báo lỗi)
+        pass
 
-    # Xử lý các callback data
-    if data == "premium_accounts":
-        # Hiển thị danh sách tài khoản trả phí
-        products = [p for p in db.get_all_products() if not p.get('is_free', False)]
-        
-        # Lọc sản phẩm có hàng
-        products_with_stock = []
-        for product in products:
-            if db.count_available_accounts(product.get('id', 0)) > 0:
-                products_with_stock.append(product)
-        
-        if not products_with_stock:
-            bot.edit_message_text(
-                "📦 Hiện tại không có sản phẩm trả phí nào có sẵn.",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.back_button()
-            )
-            return
-        
-        bot.edit_message_text(
-            "🔐 *Tài khoản trả phí*\n\nChọn một sản phẩm để xem chi tiết:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.product_list_keyboard(products_with_stock)
-        )
-    
-    elif data == "free_accounts":
-        # Hiển thị danh sách tài khoản miễn phí
-        products = [p for p in db.get_all_products() if p.get('is_free', False)]
-        
-        # Lọc sản phẩm có hàng
-        products_with_stock = []
-        for product in products:
-            if db.count_available_accounts(product.get('id', 0)) > 0:
-                products_with_stock.append(product)
-        
-        if not products_with_stock:
-            bot.edit_message_text(
-                "📦 Hiện tại không có sản phẩm miễn phí nào có sẵn.",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.back_button()
-            )
-            return
-        
-        bot.edit_message_text(
-            "🆓 *Tài khoản miễn phí*\n\nChọn một sản phẩm để xem chi tiết:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.product_list_keyboard(products_with_stock)
-        )
+
+# === Callback handlers (đăng ký vào callback_router) ===
+
+@callback_router.exact("premium_accounts")
+def premium_accounts_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị danh sách tài khoản trả phí còn hàng"""
+    catalog = db.catalog()
     
-    elif data == "tutorial":
-        # Hiển thị hướng dẫn sử dụng
+    if not catalog.products('premium'):
         bot.edit_message_text(
-            "📚 Hướng dẫn sử dụng:\n\n"
-            "1. Chọn loại tài khoản (trả phí/miễn phí)\n"
-            "2. Chọn sản phẩm bạn muốn mua\n"
-            "3. Xác nhận thanh toán\n"
-            "Để được hỗ trợ, vui lòng liên hệ admin: @ngochacoder",
+            "📦 Hiện tại không có sản phẩm trả phí nào có sẵn.",
             call.message.chat.id,
             call.message.message_id,
             reply_markup=keyboards.back_button()
         )
+        return
     
-    elif data == "balance":
-        # Hiển thị số dư tài khoản
-        user = db.get_user(user_id)
-        balance = user.get('balance', 0)
-        
-        bot.edit_message_text(
-            f"💰 Số dư tài khoản của bạn: {balance:,} {config.CURRENCY}\n\n"
-            "Để nạp tiền, vui lòng liên hệ admin @ngochacoder.",
-            call.message.chat.id,
-            call.message.message_id,
-            reply_markup=keyboards.back_button("my_account")  # Thay đổi ở đây
-        )
-    
-    elif data == "admin_panel" and is_admin(user_id):
-        # Lấy cài đặt hiển thị
-        settings = db.get_visibility_settings()
-        show_premium = settings.get('show_premium', True)
-        
-        # Hiển thị bảng điều khiển quản trị
-        bot.edit_message_text(
-            "⚙️ *Bảng điều khiển quản trị*\n\n"
-            f"Hiển thị tài khoản trả phí: {'Bật' if show_premium else 'Tắt'}\n\n"
-            "Chọn một tùy chọn bên dưới:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.admin_panel_keyboard()
-        )
-    
-    elif data == "manage_products" and is_admin(user_id):
-        # Hiển thị menu quản lý sản phẩm
-        bot.edit_message_text(
-            "📦 Quản lý sản phẩm",
-            call.message.chat.id,
-            call.message.message_id,
-            reply_markup=keyboards.product_management()
-        )
-    
-    elif data == "manage_users" and is_admin(user_id):
-        # Hiển thị menu quản lý người dùng
-        bot.edit_message_text(
-            "👥 *Quản lý người dùng*\n\n"
-            "Chọn một tùy chọn bên dưới:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.user_management()
-        )
-    
-    elif data == "statistics" and is_admin(user_id):
-        # Hiển thị thống kê
-        stats = get_statistics()
-        bot.edit_message_text(
-            f"📊 Thống kê:\n\n"
-            f"Tổng người dùng: {stats['total_users']}\n"
-            f"Người dùng mới hôm nay: {stats['new_users_today']}\n"
-            f"Tổng đơn hàng: {stats['total_orders']}\n"
-            f"Doanh thu: {stats['revenue']} VNĐ",
-            call.message.chat.id,
-            call.message.message_id,
-            reply_markup=keyboards.back_button("back_to_admin")
-        )
+    bot.edit_message_text(
+        "🔐 *Tài khoản trả phí*\n\nChọn một sản phẩm để xem chi tiết:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.product_list_keyboard('premium', catalog=catalog)
+    )
+
+
+@callback_router.exact("free_accounts")
+def free_accounts_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị danh sách tài khoản miễn phí còn hàng"""
+    catalog = db.catalog()
     
-    elif data == "product_list" and is_admin(user_id):
-        # Hiển thị danh sách sản phẩm cho admin
-        products = db.get_all_products()
+    if not catalog.products('free'):
         bot.edit_message_text(
-            "📋 Danh sách sản phẩm:",
+            "📦 Hiện tại không có sản phẩm miễn phí nào có sẵn.",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.product_list_keyboard(products, admin=True)
+            reply_markup=keyboards.back_button()
         )
+        return
     
-    elif data == "user_list":
-        # Hiển thị danh sách người dùng
-        try:
-            users = db.get_all_users()
-            
-            if not users:
-                bot.edit_message_text(
-                    "👥 Chưa có người dùng nào.",
-                    call.message.chat.id,
-                    call.message.message_id
-                )
-                return
-            
-            # Sắp xếp người dùng theo username (a-z)
-            # Đảm bảo sắp xếp không phân biệt chữ hoa/thường và xử lý trường hợp username là None
-            users = sorted(users, key=lambda x: str(x.get('username', '')).lower() if x.get('username') is not None else '')
-            
-            # Lưu trạng thái để xử lý phân trang
-            user_states[user_id] = {
-                'state': 'viewing_user_list',
-                'page': 0,
-                'users': users,
-                'search_query': ''
-            }
-            
-            # Hiển thị trang đầu tiên
-            display_user_list_page(bot, user_id, call.message.message_id)
-        except Exception as e:
-            logger.error(f"Error displaying user list: {e}")
-            try:
-                bot.answer_callback_query(call.id, "Đã xảy ra lỗi khi hiển thị danh sách người dùng.", show_alert=True)
-            except:
-                pass
-    
-    # Xử lý các callback có pattern
-    elif data.startswith("view_product_"):
-        # Xem chi tiết sản phẩm
-        product_id = int(data.split("_")[2])
-        product = db.get_product(product_id)
-        
-        if product:
-            available_accounts = db.count_available_accounts(product_id)
-            bot.edit_message_text(
-                f"🏷️ {product['name']}\n\n"
-                f"📝 Mô tả: {product['description']}\n"
-                f"💰 Giá: {product['price']} VNĐ\n"
-                f"📦 Còn lại: {available_accounts} tài khoản",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.product_detail_keyboard(product_id)
-            )
-    
-    elif data.startswith("admin_product_") and is_admin(user_id):
-        # Xem chi tiết sản phẩm (admin)
-        product_id = int(data.split("_")[2])
-        product = db.get_product(product_id)
-        
-        if product:
-            available_accounts = db.count_available_accounts(product_id)
-            bot.edit_message_text(
-                f"🏷️ {product['name']}\n\n"
-                f"📝 Mô tả: {product['description']}\n"
-                f"💰 Giá: {product['price']} VNĐ\n"
-                f"📦 Còn lại: {available_accounts} tài khoản\n"
-                f"🆔 ID: {product['id']}",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.product_detail_keyboard(product_id, is_admin=True)
-            )
-    
-    elif data.startswith("admin_user_") and is_admin(user_id):
-        # Xem chi tiết người dùng
-        target_user_id = int(data.split("_")[2])
-        target_user = db.get_user(target_user_id)
-        
-        if target_user:
-            status = "🚫 Đã bị cấm" if target_user.get('banned', False) else "✅ Đang hoạt động"
-            bot.edit_message_text(
-                f"👤 Thông tin người dùng:\n\n"
-                f"ID: {target_user['id']}\n"
-                f"Username: @{target_user.get('username', 'Không có')}\n"
-                f"Tên: {target_user.get('first_name', '')} {target_user.get('last_name', '')}\n"
-                f"Số dư: {target_user.get('balance', 0)} VNĐ\n"
-                f"Trạng thái: {status}",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.back_button("back_to_user_list")
-            )
-    
-    elif data.startswith("buy_product_"):
-        # Mua sản phẩm
-        product_id = int(data.split("_")[2])
+    bot.edit_message_text(
+        "🆓 *Tài khoản miễn phí*\n\nChọn một sản phẩm để xem chi tiết:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.product_list_keyboard('free', catalog=catalog)
+    )
+
+
+@callback_router.exact("tutorial")
+def tutorial_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị hướng dẫn sử dụng"""
+    bot.edit_message_text(
+        "📚 Hướng dẫn sử dụng:\n\n"
+        "1. Chọn loại tài khoản (trả phí/miễn phí)\n"
+        "2. Chọn sản phẩm bạn muốn mua\n"
+        "3. Xác nhận thanh toán\n"
+        "Để được hỗ trợ, vui lòng liên hệ admin: @ngochacoder",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.back_button()
+    )
+
+
+@callback_router.exact("balance")
+def balance_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị số dư tài khoản"""
+    balance = ctx.user.get('balance', 0)
+    
+    bot.edit_message_text(
+        f"💰 Số dư tài khoản của bạn: {balance:,} {config.CURRENCY}\n\n"
+        "Để nạp tiền, vui lòng liên hệ admin @ngochacoder.",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.back_button("my_account")  # Thay đổi ở đây
+    )
+
+
+@callback_router.exact("admin_panel")
+@admin_only
+def admin_panel_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị bảng điều khiển quản trị"""
+    # Lấy cài đặt hiển thị
+    settings = db.get_visibility_settings()
+    show_premium = settings.get('show_premium', True)
+    
+    # Hiển thị bảng điều khiển quản trị
+    bot.edit_message_text(
+        "⚙️ *Bảng điều khiển quản trị*\n\n"
+        f"Hiển thị tài khoản trả phí: {'Bật' if show_premium else 'Tắt'}\n\n"
+        "Chọn một tùy chọn bên dưới:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.admin_panel_keyboard()
+    )
+
+
+@callback_router.exact("manage_products")
+@admin_only
+def manage_products_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị menu quản lý sản phẩm"""
+    bot.edit_message_text(
+        "📦 Quản lý sản phẩm",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.product_management()
+    )
+
+
+@callback_router.exact("manage_users")
+@admin_only
+def manage_users_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị menu quản lý người dùng"""
+    bot.edit_message_text(
+        "👥 *Quản lý người dùng*\n\n"
+        "Chọn một tùy chọn bên dưới:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.user_management()
+    )
+
+
+@callback_router.exact("statistics")
+@admin_only
+def statistics_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị thống kê"""
+    stats = db.get_statistics()
+    
+    # Doanh thu 30 ngày gần nhất theo sản phẩm (5 sản phẩm cao nhất)
+    revenue_by_product = db.get_revenue_by_product('day', 30)
+    top_products = sorted(revenue_by_product.items(), key=lambda item: item[1]['revenue'], reverse=True)[:5]
+    top_lines = ""
+    for product_id, totals in top_products:
         product = db.get_product(product_id)
+        product_name = product.get('name', 'Không tên') if product else f"#{product_id}"
+        top_lines += f"\n- {product_name}: {totals['orders']} đơn, {totals['revenue']:,.0f} VNĐ"
+    
+    bot.edit_message_text(
+        f"📊 Thống kê:\n\n"
+        f"Tổng người dùng: {stats['total_users']}\n"
+        f"Người dùng mới hôm nay: {stats['new_users_today']}\n"
+        f"Tổng đơn hàng: {stats['total_orders']}\n"
+        f"Doanh thu: {stats['revenue']} VNĐ"
+        + (f"\n\n📈 Doanh thu 30 ngày qua theo sản phẩm:{top_lines}" if top_lines else ""),
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.back_button("back_to_admin")
+    )
+
+
+@callback_router.exact("product_list")
+@admin_only
+def product_list_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị danh sách sản phẩm cho admin"""
+    bot.edit_message_text(
+        "📋 Danh sách sản phẩm:",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.product_list_keyboard('all', admin=True)
+    )
+
+
+@callback_router.exact("user_list")
+def user_list_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị danh sách người dùng"""
+    user_id = call.from_user.id
+    username = call.from_user.username or f"user_{user_id}"
+    try:
+        _, total = db.get_users_page(0, 1)
         
-        if product:
+        if not total:
             bot.edit_message_text(
-                f"🛒 Xác nhận mua:\n\n"
-                f"Sản phẩm: {product['name']}\n"
-                f"Giá: {product['price']} VNĐ\n\n"
-                f"Bạn có chắc chắn muốn mua sản phẩm này?",
+                "👥 Chưa có người dùng nào.",
                 call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.confirm_purchase_keyboard(product_id)
+                call.message.message_id
             )
-    
-    elif data.startswith("confirm_purchase_"):
-        # Xác nhận mua hàng
-        product_id = int(data.split("_")[2])
+            return
         
-        # Xử lý mua hàng
-        result = process_purchase(user_id, product_id)
+        # Lưu trạng thái để xử lý phân trang (danh sách đã được sắp xếp theo username trong database)
+        user_states[user_id] = {
+            'state': 'viewing_user_list',
+            'page': 0,
+            'search_query': ''
+        }
         
-        if result and result.get('success'):
-            # Gửi thông tin tài khoản cho người dùng
-            bot.edit_message_text(
-                f"✅ *Mua hàng thành công!*\n\n"
-                f"Sản phẩm: {result['product_name']}\n"
-                f"Giá: {result['price']:,} {config.CURRENCY}\n"
-                f"Số dư còn lại: {result['new_balance']:,} {config.CURRENCY}\n\n"
-                f"📝 *Thông tin tài khoản:*\n"
-                f"`{result['account_info']}`\n\n"
-                f"Cảm ơn bạn đã sử dụng dịch vụ!",
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown",
-                reply_markup=keyboards.back_button()
-            )
-            
-            
-            # Gửi thông báo cho admin về giao dịch thành công
-            # Import datetime
-            import datetime
-            current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Hiển thị trang đầu tiên
+        display_user_list_page(bot, user_id, call.message.message_id)
+    except Exception as e:
+        logger.error(f"Error displaying user list: {e}")
+        try:
+            bot.answer_callback_query(call.id, "Đã xảy ra lỗi khi hiển thị danh sách người dùng.", show_alert=True)
+        except:
+            pass
 
-            # Escape any special characters in username and product name
-            safe_username = username.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[')
-            safe_product_name = result['product_name'].replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[')
 
-            admin_notification = (
-                f"💰 *Giao dịch mới thành công!*\n\n"
-                f"Người dùng: @{safe_username} (ID: `{user_id}`)\n"
-                f"Sản phẩm: {safe_product_name}\n"
-                f"Giá: {result['price']:,} {config.CURRENCY}\n"
-                f"Thời gian: {current_time}"
-            )
-            notify_admins(bot, admin_notification, parse_mode="Markdown")
-        else:
-            # Hiển thị thông báo lỗi
-            error_message = result.get('message', 'Đã xảy ra lỗi không xác định') if result else 'Đã xảy ra lỗi không xác định'
-            bot.answer_callback_query(call.id, f"❌ {error_message}", show_alert=True)
-            
-            # Quay lại menu chính
-            bot.edit_message_text(
-                f"🏠 *Menu chính*\n\nSố dư: {user.get('balance', 0):,} {config.CURRENCY}",
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown",
-                reply_markup=keyboards.main_menu(is_admin(user_id))
-            )
+@callback_router.prefix("view_product_")
+def view_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Xem chi tiết sản phẩm"""
+    product = db.get_product(product_id)
     
-    # Xử lý các nút quay lại
-    elif data == "back_to_main":
+    if product:
+        available_accounts = db.count_available_accounts(product_id)
         bot.edit_message_text(
-            f"🏠 *Menu chính*\n\nSố dư: {user.get('balance', 0):,} {config.CURRENCY}",
+            f"🏷️ {product['name']}\n\n"
+            f"📝 Mô tả: {product['description']}\n"
+            f"💰 Giá: {product['price']} VNĐ\n"
+            f"📦 Còn lại: {available_accounts} tài khoản",
             call.message.chat.id,
             call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.main_menu(is_admin(user_id))
+            reply_markup=keyboards.product_detail_keyboard(product_id)
         )
+
+
+@callback_router.prefix("admin_product_")
+@admin_only
+def admin_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Xem chi tiết sản phẩm (admin)"""
+    product = db.get_product(product_id)
     
-    elif data == "back_to_admin":
+    if product:
+        available_accounts = db.count_available_accounts(product_id)
         bot.edit_message_text(
-            "⚙️ Panel quản trị viên",
+            f"🏷️ {product['name']}\n\n"
+            f"📝 Mô tả: {product['description']}\n"
+            f"💰 Giá: {product['price']} VNĐ\n"
+            f"📦 Còn lại: {available_accounts} tài khoản\n"
+            f"🆔 ID: {product['id']}",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.admin_panel()
+            reply_markup=keyboards.product_detail_keyboard(product_id, is_admin=True)
         )
+
+
+@callback_router.prefix("admin_user_")
+@admin_only
+def admin_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, target_user_id: int) -> None:
+    """Xem chi tiết người dùng"""
+    target_user = db.get_user(target_user_id)
     
-    elif data == "back_to_product_management":
+    if target_user:
+        status = "🚫 Đã bị cấm" if target_user.get('banned', False) else "✅ Đang hoạt động"
         bot.edit_message_text(
-            "📦 Quản lý sản phẩm",
+            f"👤 Thông tin người dùng:\n\n"
+            f"ID: {target_user['id']}\n"
+            f"Username: @{target_user.get('username', 'Không có')}\n"
+            f"Tên: {target_user.get('first_name', '')} {target_user.get('last_name', '')}\n"
+            f"Số dư: {target_user.get('balance', 0)} VNĐ\n"
+            f"Trạng thái: {status}",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.product_management()
+            reply_markup=keyboards.back_button("back_to_user_list")
         )
+
+
+@callback_router.prefix("buy_product_")
+def buy_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Mua sản phẩm"""
+    product = db.get_product(product_id)
     
-    elif data == "back_to_user_management":
-        # Quay lại menu quản lý người dùng
+    if product:
         bot.edit_message_text(
-            "👥 Quản lý người dùng",
+            f"🛒 Xác nhận mua:\n\n"
+            f"Sản phẩm: {product['name']}\n"
+            f"Giá: {product['price']} VNĐ\n\n"
+            f"Bạn có chắc chắn muốn mua sản phẩm này?",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.user_management()
+            reply_markup=keyboards.confirm_purchase_keyboard(product_id)
         )
+
+
+@callback_router.prefix("confirm_purchase_")
+def confirm_purchase_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Xác nhận mua hàng"""
+    user_id = call.from_user.id
+    username = call.from_user.username or f"user_{user_id}"
     
-    elif data == "ban_user" and is_admin(user_id):
-        # Lưu trạng thái chờ nhập ID người dùng để cấm
-        user_states[user_id] = {
-            'state': 'waiting_for_ban_user_id',
-            'data': {}
-        }
-        
-        bot.send_message(
-                                user_id,
-            "🚫 *Cấm người dùng*\n\n"
-            "Vui lòng nhập ID người dùng bạn muốn cấm.\n"
-            "Ví dụ: `123456789`\n\n"
-            "Gửi /cancel để hủy.",
-            parse_mode="Markdown"
-        )
+    # Xử lý mua hàng
+    try:
+        result = db.purchase(user_id, product_id)
+    except Exception as e:
+        logger.error(f"Error in purchase: {e}")
+        result = PurchaseResult.failed('Đã xảy ra lỗi khi xử lý giao dịch. Vui lòng thử lại sau.')
+    
+    if result.success:
+        # Số dư của người mua đã thay đổi
+        ctx.invalidate()
         
-        # Sửa tin nhắn hiện tại để hiển thị trạng thái
+        # Gửi thông tin tài khoản cho người dùng
         bot.edit_message_text(
-            "👥 Quản lý người dùng\n\n"
-            "📝 Đang chờ nhập ID người dùng để cấm...",
+            f"✅ *Mua hàng thành công!*\n\n"
+            f"Sản phẩm: {result.product_name}\n"
+            f"Giá: {result.price:,} {config.CURRENCY}\n"
+            f"Số dư còn lại: {result.new_balance:,} {config.CURRENCY}\n\n"
+            f"📝 *Thông tin tài khoản:*\n"
+            f"`{result.account_info}`\n\n"
+            f"Cảm ơn bạn đã sử dụng dịch vụ!",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.back_button("back_to_user_management")
+            parse_mode="Markdown",
+            reply_markup=keyboards.back_button()
         )
-    
-    elif data == "unban_user" and is_admin(user_id):
-        # Lưu trạng thái chờ nhập ID người dùng để bỏ cấm
-        user_states[user_id] = {
-            'state': 'waiting_for_unban_user_id',
-            'data': {}
-        }
         
-        bot.send_message(
-            user_id,
-            "✅ *Bỏ cấm người dùng*\n\n"
-            "Vui lòng nhập ID người dùng bạn muốn bỏ cấm.\n"
-            "Ví dụ: `123456789`\n\n"
-            "Gửi /cancel để hủy.",
-            parse_mode="Markdown"
+        
+        # Gửi thông báo cho admin về giao dịch thành công
+        # Import datetime
+        current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        # Escape any special characters in username and product name
+        safe_username = username.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[')
+        safe_product_name = result.product_name.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[')
+
+        admin_notification = (
+            f"💰 *Giao dịch mới thành công!*\n\n"
+            f"Người dùng: @{safe_username} (ID: `{user_id}`)\n"
+            f"Sản phẩm: {safe_product_name}\n"
+            f"Giá: {result.price:,} {config.CURRENCY}\n"
+            f"Thời gian: {current_time}"
         )
+        notify_admins(bot, admin_notification, parse_mode="Markdown")
+    else:
+        # Hiển thị thông báo lỗi
+        error_message = result.message or 'Đã xảy ra lỗi không xác định'
+        bot.answer_callback_query(call.id, f"❌ {error_message}", show_alert=True)
         
-        # Sửa tin nhắn hiện tại để hiển thị trạng thái
+        # Quay lại menu chính
         bot.edit_message_text(
-            "👥 Quản lý người dùng\n\n"
-            "📝 Đang chờ nhập ID người dùng để bỏ cấm...",
+            f"🏠 *Menu chính*\n\nSố dư: {ctx.user.get('balance', 0):,} {config.CURRENCY}",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.back_button("back_to_user_management")
+            parse_mode="Markdown",
+            reply_markup=keyboards.main_menu(is_admin(user_id))
         )
+
+
+@callback_router.exact("back_to_main")
+def back_to_main_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Quay lại menu chính"""
+    user_id = call.from_user.id
+    bot.edit_message_text(
+        f"🏠 *Menu chính*\n\nSố dư: {ctx.user.get('balance', 0):,} {config.CURRENCY}",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.main_menu(is_admin(user_id))
+    )
+
+
+@callback_router.exact("back_to_admin")
+def back_to_admin_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Quay lại panel quản trị viên"""
+    bot.edit_message_text(
+        "⚙️ Panel quản trị viên",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.admin_panel()
+    )
+
+
+@callback_router.exact("back_to_product_management")
+def back_to_product_management_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Quay lại menu quản lý sản phẩm"""
+    bot.edit_message_text(
+        "📦 Quản lý sản phẩm",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.product_management()
+    )
+
+
+@callback_router.exact("back_to_user_management")
+def back_to_user_management_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Quay lại menu quản lý người dùng"""
+    bot.edit_message_text(
+        "👥 Quản lý người dùng",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.user_management()
+    )
+
+
+@callback_router.exact("ban_user")
+@admin_only
+def ban_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Bắt đầu cấm người dùng: chờ admin nhập ID"""
+    user_id = call.from_user.id
+    # Lưu trạng thái chờ nhập ID người dùng để cấm
+    user_states[user_id] = {
+        'state': 'waiting_for_ban_user_id',
+        'data': {}
+    }
+    
+    bot.send_message(
+        user_id,
+        "🚫 *Cấm người dùng*\n\n"
+        "Vui lòng nhập ID người dùng bạn muốn cấm.\n"
+        "Ví dụ: `123456789`\n\n"
+        "Gửi /cancel để hủy.",
+        parse_mode="Markdown"
+    )
+    
+    # Sửa tin nhắn hiện tại để hiển thị trạng thái
+    bot.edit_message_text(
+        "👥 Quản lý người dùng\n\n"
+        "📝 Đang chờ nhập ID người dùng để cấm...",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.back_button("back_to_user_management")
+    )
+
+
+@callback_router.exact("unban_user")
+@admin_only
+def unban_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Bắt đầu bỏ cấm người dùng: chờ admin nhập ID"""
+    user_id = call.from_user.id
+    # Lưu trạng thái chờ nhập ID người dùng để bỏ cấm
+    user_states[user_id] = {
+        'state': 'waiting_for_unban_user_id',
+        'data': {}
+    }
     
-    elif data == "back_to_product_list":
-        if is_admin(user_id):
-            products = db.get_all_products()
-            bot.edit_message_text(
-                "📋 Danh sách sản phẩm:",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.product_list_keyboard(products, admin=True)
-            )
-        else:
-            products = [p for p in db.get_all_products() if not p.get('is_free', False)]
-            
-            # Lọc sản phẩm có hàng
-            products_with_stock = []
-            for product in products:
-                if db.count_available_accounts(product.get('id', 0)) > 0:
-                    products_with_stock.append(product)
-            
-            if not products_with_stock:
-                bot.edit_message_text(
-                    "📦 Hiện tại không có sản phẩm trả phí nào có sẵn.",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=keyboards.back_button("back_to_main")
-                )
-                return
-            
-            bot.edit_message_text(
-                "🔐 Danh sách tài khoản trả phí:",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.product_list_keyboard(products_with_stock)
-            )
-    
-    elif data == "cancel_purchase":
+    bot.send_message(
+        user_id,
+        "✅ *Bỏ cấm người dùng*\n\n"
+        "Vui lòng nhập ID người dùng bạn muốn bỏ cấm.\n"
+        "Ví dụ: `123456789`\n\n"
+        "Gửi /cancel để hủy.",
+        parse_mode="Markdown"
+    )
+    
+    # Sửa tin nhắn hiện tại để hiển thị trạng thái
+    bot.edit_message_text(
+        "👥 Quản lý người dùng\n\n"
+        "📝 Đang chờ nhập ID người dùng để bỏ cấm...",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.back_button("back_to_user_management")
+    )
+
+
+@callback_router.exact("back_to_product_list")
+def back_to_product_list_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Quay lại danh sách sản phẩm"""
+    user_id = call.from_user.id
+    if is_admin(user_id):
         bot.edit_message_text(
-            "🏠 Đã hủy giao dịch. Quay lại menu chính",
+            "📋 Danh sách sản phẩm:",
             call.message.chat.id,
             call.message.message_id,
-            reply_markup=keyboards.main_menu(is_admin(user_id))
+            reply_markup=keyboards.product_list_keyboard('all', admin=True)
         )
-    # Xử lý phân trang
-    elif data.startswith("product_page_"):
-        page = int(data.split("_")[2])
-        if is_admin(user_id):
-            products = db.get_all_products()
-            bot.edit_message_text(
-                "📋 Danh sách sản phẩm:",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.product_list_keyboard(products, page=page, admin=True)
-            )
-        else:
-            products = [p for p in db.get_all_products() if not p.get('is_free', False)]
-            
-            # Lọc sản phẩm có hàng
-            products_with_stock = []
-            for product in products:
-                if db.count_available_accounts(product.get('id', 0)) > 0:
-                    products_with_stock.append(product)
-            
+    else:
+        catalog = db.catalog()
+        
+        if not catalog.products('premium'):
             bot.edit_message_text(
-                "🔐 Danh sách tài khoản trả phí:",
+                "📦 Hiện tại không có sản phẩm trả phí nào có sẵn.",
                 call.message.chat.id,
                 call.message.message_id,
-                reply_markup=keyboards.product_list_keyboard(products_with_stock, page=page)
+                reply_markup=keyboards.back_button("back_to_main")
             )
-    
-    elif data.startswith("user_page_"):
-        # Xử lý phân trang danh sách người dùng
+            return
+        
+        bot.edit_message_text(
+            "🔐 Danh sách tài khoản trả phí:",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=keyboards.product_list_keyboard('premium', catalog=catalog)
+        )
+
+
+@callback_router.exact("cancel_purchase")
+def cancel_purchase_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hủy giao dịch và quay lại menu chính"""
+    user_id = call.from_user.id
+    bot.edit_message_text(
+        "🏠 Đã hủy giao dịch. Quay lại menu chính",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.main_menu(is_admin(user_id))
+    )
+
+
+@callback_router.prefix("product_page_")
+def product_page_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, page: int) -> None:
+    """Chuyển trang danh sách sản phẩm"""
+    user_id = call.from_user.id
+    if is_admin(user_id):
+        bot.edit_message_text(
+            "📋 Danh sách sản phẩm:",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=keyboards.product_list_keyboard('all', page=page, admin=True)
+        )
+    else:
+        bot.edit_message_text(
+            "🔐 Danh sách tài khoản trả phí:",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=keyboards.product_list_keyboard('premium', page=page)
+        )
+
+
+@callback_router.prefix("user_page_")
+def user_page_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, page: int) -> None:
+    """Xử lý phân trang danh sách người dùng"""
+    user_id = call.from_user.id
+    try:
+        # Cập nhật trang hiện tại
+        if user_id in user_states:
+            user_states[user_id]['page'] = page
+        
+        # Hiển thị trang mới
+        display_user_list_page(bot, user_id, call.message.message_id)
+    except Exception as e:
+        logger.error(f"Error navigating user list: {e}")
         try:
-            page = int(data.split("_")[2])
-            
-            # Cập nhật trang hiện tại
-            if user_id in user_states:
-                user_states[user_id]['page'] = page
-            
-            # Hiển thị trang mới
-            display_user_list_page(bot, user_id, call.message.message_id)
-        except Exception as e:
-            logger.error(f"Error navigating user list: {e}")
-            try:
-                bot.answer_callback_query(call.id, "Đã xảy ra lỗi khi điều hướng danh sách.", show_alert=True)
-            except:
-                pass
-    
-    # Thêm xử lý cho các nút admin
-    elif data.startswith("add_money_") and is_admin(user_id):
-        # Thêm tiền cho người dùng
-        target_user_id = int(data.split("_")[2])
-        target_user = db.get_user(target_user_id)
+            bot.answer_callback_query(call.id, "Đã xảy ra lỗi khi điều hướng danh sách.", show_alert=True)
+        except:
+            pass
+
+
+@callback_router.prefix("add_money_")
+@admin_only
+def add_money_to_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, target_user_id: int) -> None:
+    """Thêm tiền cho người dùng"""
+    user_id = call.from_user.id
+    target_user = db.get_user(target_user_id)
+    
+    if target_user:
+        # Lưu trạng thái để nhận số tiền
+        user_states[user_id] = {
+            'state': 'waiting_for_add_money',
+            'target_user_id': target_user_id
+        }
         
-        if target_user:
-            # Lưu trạng thái để nhận số tiền
-            user_states[user_id] = {
-                'state': 'waiting_for_add_money',
-                'target_user_id': target_user_id
-            }
+        bot.edit_message_text(
+            f"💰 Thêm tiền cho người dùng:\n\n"
+            f"ID: {target_user['id']}\n"
+            f"Username: @{target_user.get('username', 'Không có')}\n"
+            f"Số dư hiện tại: {target_user.get('balance', 0):,} {config.CURRENCY}\n\n"
+            f"Vui lòng nhập số tiền muốn thêm:",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=keyboards.deposit_amount_keyboard()
+        )
+
+
+@callback_router.prefix("ban_user_")
+@admin_only
+def ban_selected_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, target_user_id: int) -> None:
+    """Cấm người dùng"""
+    user_id = call.from_user.id
+    username = call.from_user.username or f"user_{user_id}"
+    target_user = db.get_user(target_user_id)
+    
+    if target_user:
+        # Không cho phép cấm admin
+        if is_admin(target_user_id):
+            bot.answer_callback_query(call.id, "⛔ Không thể cấm quản trị viên khác.", show_alert=True)
+            return
+        
+        # Kiểm tra nếu người dùng đã bị cấm
+        if target_user.get('banned', False):
+            bot.answer_callback_query(call.id, "❌ Người dùng này đã bị cấm rồi.", show_alert=True)
+            return
+        
+        # Cấm người dùng qua database
+        logger.info(f"Admin {username} (ID: {user_id}) is banning user {target_user_id} via callback")
+        
+        try:
+            if not ban_user(target_user_id):
+                logger.error(f"User {target_user_id} not found in users data")
+                bot.answer_callback_query(call.id, f"❌ Không tìm thấy người dùng với ID {target_user_id} trong dữ liệu.", show_alert=True)
+                return
             
+            # Hiển thị thông báo thành công
             bot.edit_message_text(
-                f"💰 Thêm tiền cho người dùng:\n\n"
+                f"✅ Đã cấm người dùng thành công!\n\n"
                 f"ID: {target_user['id']}\n"
-                f"Username: @{target_user.get('username', 'Không có')}\n"
-                f"Số dư hiện tại: {target_user.get('balance', 0):,} {config.CURRENCY}\n\n"
-                f"Vui lòng nhập số tiền muốn thêm:",
+                f"Username: @{target_user.get('username', 'Không có')}",
                 call.message.chat.id,
                 call.message.message_id,
-                reply_markup=keyboards.deposit_amount_keyboard()
+                reply_markup=keyboards.back_button("back_to_user_list")
             )
-    
-    elif data.startswith("ban_user_") and is_admin(user_id):
-        # Cấm người dùng
-        target_user_id = int(data.split("_")[2])
-        target_user = db.get_user(target_user_id)
-        
-        if target_user:
-            # Không cho phép cấm admin
-            if is_admin(target_user_id):
-                bot.answer_callback_query(call.id, "⛔ Không thể cấm quản trị viên khác.", show_alert=True)
-                return
-            
-            # Kiểm tra nếu người dùng đã bị cấm
-            if target_user.get('banned', False):
-                bot.answer_callback_query(call.id, "❌ Người dùng này đã bị cấm rồi.", show_alert=True)
-                return
-            
-            # Cấm người dùng với phương pháp trực tiếp nhất
-            logger.info(f"Admin {username} (ID: {user_id}) is banning user {target_user_id} via callback")
             
+            # Thông báo cho người dùng
             try:
-                # Đọc dữ liệu hiện tại
-                import json
-                import os
-                
-                users_file_path = config.USERS_FILE
-                logger.info(f"Reading users data from {users_file_path}")
-                
-                if not os.path.exists(users_file_path):
-                    logger.error(f"Users file does not exist: {users_file_path}")
-                    bot.answer_callback_query(call.id, "❌ File dữ liệu người dùng không tồn tại.", show_alert=True)
-                    return
-                
-                # Đọc dữ liệu trực tiếp từ file
-                try:
-                    with open(users_file_path, 'r', encoding='utf-8') as file:
-                        users_data = json.load(file)
-                        logger.info(f"Successfully read users data. Found {len(users_data)} users.")
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON decode error: {e}")
-                    bot.answer_callback_query(call.id, "❌ Lỗi định dạng file dữ liệu.", show_alert=True)
-                    return
-                except Exception as e:
-                    logger.error(f"Error reading users file: {e}")
-                    bot.answer_callback_query(call.id, f"❌ Lỗi khi đọc file dữ liệu: {str(e)}", show_alert=True)
-                    return
-                
-                # Tìm và cập nhật người dùng
-                user_found = False
-                for i, user in enumerate(users_data):
-                    if user.get('id') == target_user_id:
-                        logger.info(f"Found user {target_user_id} at index {i}")
-                        users_data[i]['banned'] = True
-                        user_found = True
-                        break
-                
-                if not user_found:
-                    logger.error(f"User {target_user_id} not found in users data")
-                    bot.answer_callback_query(call.id, f"❌ Không tìm thấy người dùng với ID {target_user_id} trong dữ liệu.", show_alert=True)
-                    return
-                
-                # Ghi dữ liệu trở lại file
-                try:
-                    with open(users_file_path, 'w', encoding='utf-8') as file:
-                        json.dump(users_data, file, ensure_ascii=False, indent=2)
-                        logger.info(f"Successfully wrote updated data to {users_file_path}")
-                except Exception as e:
-                    logger.error(f"Error writing to users file: {e}")
-                    bot.answer_callback_query(call.id, f"❌ Lỗi khi ghi file dữ liệu: {str(e)}", show_alert=True)
-                    return
-                
-                # Hiển thị thông báo thành công
-                bot.edit_message_text(
-                    f"✅ Đã cấm người dùng thành công!\n\n"
-                    f"ID: {target_user['id']}\n"
-                    f"Username: @{target_user.get('username', 'Không có')}",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=keyboards.back_button("back_to_user_list")
+                bot.send_message(
+                    target_user_id,
+                    "⛔ Tài khoản của bạn đã bị cấm. Vui lòng liên hệ quản trị viên."
                 )
-                
-                # Thông báo cho người dùng
-                try:
-                    bot.send_message(
-                        target_user_id,
-                        "⛔ Tài khoản của bạn đã bị cấm. Vui lòng liên hệ quản trị viên."
-                    )
-                    logger.info(f"Notification sent to banned user {target_user_id}")
-                except Exception as e:
-                    logger.error(f"Không thể gửi thông báo đến người dùng bị cấm: {e}")
-            
+                logger.info(f"Notification sent to banned user {target_user_id}")
             except Exception as e:
-                logger.error(f"Unexpected error in ban user callback: {e}", exc_info=True)
-                bot.answer_callback_query(call.id, f"❌ Lỗi không xác định: {str(e)}", show_alert=True)
-        else:
-            bot.answer_callback_query(call.id, f"❌ Không tìm thấy người dùng với ID {target_user_id}.", show_alert=True)
+                logger.error(f"Không thể gửi thông báo đến người dùng bị cấm: {e}")
+        
+        except Exception as e:
+            logger.error(f"Unexpected error in ban user callback: {e}", exc_info=True)
+            bot.answer_callback_query(call.id, f"❌ Lỗi không xác định: {str(e)}", show_alert=True)
+    else:
+        bot.answer_callback_query(call.id, f"❌ Không tìm thấy người dùng với ID {target_user_id}.", show_alert=True)
+
+
+@callback_router.prefix("unban_user_")
+@admin_only
+def unban_selected_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, target_user_id: int) -> None:
+    """Bỏ cấm người dùng"""
+    user_id = call.from_user.id
+    username = call.from_user.username or f"user_{user_id}"
+    target_user = db.get_user(target_user_id)
     
-    elif data.startswith("unban_user_") and is_admin(user_id):
-        # Bỏ cấm người dùng
-        target_user_id = int(data.split("_")[2])
-        target_user = db.get_user(target_user_id)
+    if target_user:
+        # Kiểm tra nếu người dùng không bị cấm
+        if not target_user.get('banned', False):
+            bot.answer_callback_query(call.id, "❌ Người dùng này không bị cấm.", show_alert=True)
+            return
         
-        if target_user:
-            # Kiểm tra nếu người dùng không bị cấm
-            if not target_user.get('banned', False):
-                bot.answer_callback_query(call.id, "❌ Người dùng này không bị cấm.", show_alert=True)
+        # Bỏ cấm người dùng qua database
+        logger.info(f"Admin {username} (ID: {user_id}) is unbanning user {target_user_id} via callback")
+        
+        try:
+            if not unban_user(target_user_id):
+                bot.answer_callback_query(call.id, "❌ Không thể tìm thấy người dùng trong cơ sở dữ liệu.", show_alert=True)
                 return
             
-            # Bỏ cấm người dùng sử dụng phương pháp trực tiếp nhất
-            logger.info(f"Admin {username} (ID: {user_id}) is unbanning user {target_user_id} via callback")
+            # Hiển thị thông báo thành công
+            bot.edit_message_text(
+                f"✅ Đã bỏ cấm người dùng thành công!\n\n"
+                f"ID: {target_user['id']}\n"
+                f"Username: @{target_user.get('username', 'Không có')}",
+                call.message.chat.id,
+                call.message.message_id,
+                reply_markup=keyboards.back_button("back_to_user_list")
+            )
             
+            # Thông báo cho người dùng
             try:
-                # Đọc dữ liệu người dùng
-                users = db._read_data(config.USERS_FILE)
-                
-                # Cập nhật trạng thái banned
-                user_found = False
-                for i, user in enumerate(users):
-                    if user.get('id') == target_user_id:
-                        users[i]['banned'] = False
-                        user_found = True
-                        break
-                
-                if not user_found:
-                    bot.answer_callback_query(call.id, "❌ Không thể tìm thấy người dùng trong cơ sở dữ liệu.", show_alert=True)
-                    return
-                
-                # Lưu dữ liệu đã cập nhật
-                db._write_data(config.USERS_FILE, users)
-                
-                # Hiển thị thông báo thành công
-                bot.edit_message_text(
-                    f"✅ Đã bỏ cấm người dùng thành công!\n\n"
-                    f"ID: {target_user['id']}\n"
-                    f"Username: @{target_user.get('username', 'Không có')}",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=keyboards.back_button("back_to_user_list")
+                bot.send_message(
+                    target_user_id,
+                    "✅ Tài khoản của bạn đã được bỏ cấm. Bạn có thể sử dụng bot bình thường."
                 )
-                
-                # Thông báo cho người dùng
-                try:
-                    bot.send_message(
-                        target_user_id,
-                        "✅ Tài khoản của bạn đã được bỏ cấm. Bạn có thể sử dụng bot bình thường."
-                    )
-                except Exception as e:
-                    logger.error(f"Không thể gửi thông báo đến người dùng được bỏ cấm: {e}")
-            
             except Exception as e:
-                logger.error(f"Error unbanning user: {e}")
-                bot.answer_callback_query(call.id, f"❌ Đã xảy ra lỗi khi bỏ cấm người dùng: {str(e)}", show_alert=True)
-        else:
-            bot.answer_callback_query(call.id, f"❌ Không tìm thấy người dùng với ID {target_user_id}.", show_alert=True)
-    
-    elif data.startswith("upload_product_") and is_admin(user_id):
-        # Upload tài khoản cho sản phẩm
-        product_id = int(data.split("_")[2])
-        product = db.get_product(product_id)
+                logger.error(f"Không thể gửi thông báo đến người dùng được bỏ cấm: {e}")
         
-        if product:
-            # Lưu trạng thái để nhận danh sách tài khoản
-            user_states[user_id] = {
-                'state': 'waiting_for_accounts',
-                'product_id': product_id
-            }
-            
-            bot.edit_message_text(
-                f"📤 *Upload tài khoản cho sản phẩm*\n\n"
-                f"ID: {product['id']}\n"
-                f"Tên: {product['name']}\n\n"
-                f"Vui lòng nhập danh sách tài khoản, mỗi tài khoản một dòng.\n"
-                f"Định dạng: username:password hoặc email:password",
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown"
-            )
+        except Exception as e:
+            logger.error(f"Error unbanning user: {e}")
+            bot.answer_callback_query(call.id, f"❌ Đã xảy ra lỗi khi bỏ cấm người dùng: {str(e)}", show_alert=True)
+    else:
+        bot.answer_callback_query(call.id, f"❌ Không tìm thấy người dùng với ID {target_user_id}.", show_alert=True)
+
+
+@callback_router.prefix("upload_product_")
+@admin_only
+def upload_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Upload tài khoản cho sản phẩm"""
+    user_id = call.from_user.id
+    product = db.get_product(product_id)
     
-    elif data == "broadcast" and is_admin(user_id):
-        # Bắt đầu quá trình gửi thông báo
+    if product:
+        # Lưu trạng thái để nhận danh sách tài khoản
         user_states[user_id] = {
-            'state': 'waiting_for_broadcast',
-            'data': {}
+            'state': 'waiting_for_accounts',
+            'product_id': product_id
         }
         
         bot.edit_message_text(
-            "📣 *Gửi thông báo đến tất cả người dùng*\n\n"
-            "Vui lòng nhập nội dung thông báo bạn muốn gửi.\n"
-            "Bạn có thể sử dụng định dạng Markdown.\n\n"
-            "Gửi /cancel để hủy.",
+            f"📤 *Upload tài khoản cho sản phẩm*\n\n"
+            f"ID: {product['id']}\n"
+            f"Tên: {product['name']}\n\n"
+            f"Vui lòng nhập danh sách tài khoản, mỗi tài khoản một dòng.\n"
+            f"Định dạng: username:password hoặc email:password",
             call.message.chat.id,
             call.message.message_id,
             parse_mode="Markdown"
         )
+
+
+@callback_router.exact("broadcast")
+@admin_only
+def broadcast_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Bắt đầu quá trình gửi thông báo"""
+    user_id = call.from_user.id
+    user_states[user_id] = {
+        'state': 'waiting_for_broadcast',
+        'data': {}
+    }
     
-    # Thêm xử lý cho nút "Thêm tiền" trong menu quản lý người dùng
-    elif data == "add_money" and is_admin(user_id):
-        # Hiển thị form nhập ID người dùng để thêm tiền
-        user_states[user_id] = {
-            'state': 'waiting_for_user_id_to_add_money',
-            'data': {}
-        }
-        
-        bot.edit_message_text(
-            "💰 *Thêm tiền cho người dùng*\n\n"
-            "Vui lòng nhập ID người dùng bạn muốn thêm tiền:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown"
-        )
+    bot.edit_message_text(
+        "📣 *Gửi thông báo đến tất cả người dùng*\n\n"
+        "Vui lòng nhập nội dung thông báo bạn muốn gửi.\n"
+        "Bạn có thể sử dụng định dạng Markdown.\n\n"
+        "Gửi /cancel để hủy.",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown"
+    )
+
+
+@callback_router.exact("add_money")
+@admin_only
+def add_money_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị form nhập ID người dùng để thêm tiền"""
+    user_id = call.from_user.id
+    user_states[user_id] = {
+        'state': 'waiting_for_user_id_to_add_money',
+        'data': {}
+    }
     
-    # Thêm xử lý cho nút xem chi tiết người dùng
-    elif data.startswith("view_user_") and is_admin(user_id):
-        # Xem chi tiết người dùng
-        target_user_id = int(data.split("_")[2])
-        target_user = db.get_user(target_user_id)
-        
-        if target_user:
-            # Hiển thị thông tin người dùng
-            purchases = target_user.get('purchases', [])
-            purchase_count = len(purchases)
-            total_spent = sum(p.get('price', 0) for p in purchases)
-            status = '🚫 Bị cấm' if target_user.get('banned', False) else '✅ Hoạt động'
-            
-            user_info = (
-                f"👤 *Thông tin người dùng*\n\n"
-                f"ID: `{target_user['id']}`\n"
-                f"Username: @{target_user.get('username', 'Không có')}\n"
-                f"Tên: {target_user.get('first_name', '')} {target_user.get('last_name', '')}\n"
-                f"Số dư: {target_user.get('balance', 0)} VNĐ\n"
-                f"Trạng thái: {status}"
-            )
-            
-            bot.edit_message_text(
-                user_info,
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown",
-                reply_markup=keyboards.user_detail_keyboard(target_user_id)
-            )
+    bot.edit_message_text(
+        "💰 *Thêm tiền cho người dùng*\n\n"
+        "Vui lòng nhập ID người dùng bạn muốn thêm tiền:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown"
+    )
+
+
+@callback_router.prefix("view_user_")
+@admin_only
+def view_user_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, target_user_id: int) -> None:
+    """Xem chi tiết người dùng"""
+    target_user = db.get_user(target_user_id)
     
-    elif data == "add_admin" and is_admin(user_id):
-        # Yêu cầu admin nhập ID người dùng để thêm làm admin
-        user_states[user_id] = {
-            'state': 'waiting_for_admin_id',
-            'data': {}
-        }
+    if target_user:
+        # Hiển thị thông tin người dùng
+        purchases = db.get_user_purchases(target_user_id)
+        purchase_count = len(purchases)
+        total_spent = sum(p.get('price', 0) for p in purchases)
+        status = '🚫 Bị cấm' if target_user.get('banned', False) else '✅ Hoạt động'
+        
+        user_info = (
+            f"👤 *Thông tin người dùng*\n\n"
+            f"ID: `{target_user['id']}`\n"
+            f"Username: @{target_user.get('username', 'Không có')}\n"
+            f"Tên: {target_user.get('first_name', '')} {target_user.get('last_name', '')}\n"
+            f"Số dư: {target_user.get('balance', 0)} VNĐ\n"
+            f"Trạng thái: {status}"
+        )
         
         bot.edit_message_text(
-            "👑 *Thêm quản trị viên mới*\n\n"
-            "Vui lòng nhập ID người dùng bạn muốn thêm làm quản trị viên:",
+            user_info,
             call.message.chat.id,
             call.message.message_id,
-            parse_mode="Markdown"
+            parse_mode="Markdown",
+            reply_markup=keyboards.user_detail_keyboard(target_user_id)
         )
+
+
+@callback_router.exact("add_admin")
+@admin_only
+def add_admin_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Yêu cầu admin nhập ID người dùng để thêm làm admin"""
+    user_id = call.from_user.id
+    user_states[user_id] = {
+        'state': 'waiting_for_admin_id',
+        'data': {}
+    }
     
-    # Sửa phần xử lý nút edit_product trong hàm handle_callback_query
-    elif data.startswith("edit_product_") and is_admin(user_id):
-        # Lấy ID sản phẩm
-        product_id = int(data.split("_")[2])
-        product = db.get_product(product_id)
-        
-        if product:
-            # Lưu trạng thái để chỉnh sửa sản phẩm
-            user_states[user_id] = {
-                'state': 'edit_product_name',
-                'product_id': product_id,
-                'data': {
-                    'id': product_id,
-                    'name': product.get('name', ''),
-                    'price': product.get('price', 0),
-                    'description': product.get('description', '')
-                }
-            }
-            
-            bot.edit_message_text(
-                f"✏️ *Chỉnh sửa sản phẩm*\n\n"
-                f"ID: {product['id']}\n"
-                f"Tên hiện tại: {product['name']}\n"
-                f"Giá hiện tại: {product['price']:,} {config.CURRENCY}\n"
-                f"Mô tả hiện tại: {product.get('description', 'Không có')}\n\n"
-                f"Vui lòng nhập tên mới cho sản phẩm (hoặc gõ 'giữ nguyên' để không thay đổi):",
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown"
-            )
+    bot.edit_message_text(
+        "👑 *Thêm quản trị viên mới*\n\n"
+        "Vui lòng nhập ID người dùng bạn muốn thêm làm quản trị viên:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown"
+    )
+
+
+@callback_router.prefix("edit_product_")
+@admin_only
+def edit_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Bắt đầu chỉnh sửa sản phẩm"""
+    user_id = call.from_user.id
+    product = db.get_product(product_id)
     
-    elif data == "create_product" and is_admin(user_id):
-        # Bắt đầu quá trình tạo sản phẩm mới
+    if product:
+        # Lưu trạng thái để chỉnh sửa sản phẩm
         user_states[user_id] = {
-            'state': 'waiting_for_product_name',
-            'data': {}
+            'state': 'edit_product_name',
+            'product_id': product_id,
+            'data': {
+                'id': product_id,
+                'name': product.get('name', ''),
+                'price': product.get('price', 0),
+                'description': product.get('description', '')
+            }
         }
         
         bot.edit_message_text(
-            "➕ *Tạo sản phẩm mới*\n\n"
-            "Vui lòng nhập tên sản phẩm:",
+            f"✏️ *Chỉnh sửa sản phẩm*\n\n"
+            f"ID: {product['id']}\n"
+            f"Tên hiện tại: {product['name']}\n"
+            f"Giá hiện tại: {product['price']:,} {config.CURRENCY}\n"
+            f"Mô tả hiện tại: {product.get('description', 'Không có')}\n\n"
+            f"Vui lòng nhập tên mới cho sản phẩm (hoặc gõ 'giữ nguyên' để không thay đổi):",
             call.message.chat.id,
             call.message.message_id,
             parse_mode="Markdown"
         )
+
+
+@callback_router.exact("create_product")
+@admin_only
+def create_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Bắt đầu quá trình tạo sản phẩm mới"""
+    user_id = call.from_user.id
+    user_states[user_id] = {
+        'state': 'waiting_for_product_name',
+        'data': {}
+    }
     
-    elif data == "toggle_premium_visibility" and is_admin(user_id):
-        # Lấy cài đặt hiện tại
-        settings = db.get_visibility_settings()
-        show_premium = settings.get('show_premium', True)
-        
-        # Đảo ngược trạng thái
-        new_status = not show_premium
-        db.update_visibility_setting('show_premium', new_status)
-        
-        status_text = "bật" if new_status else "tắt"
-        
-        # Thông báo cho admin
-        bot.answer_callback_query(
-            call.id,
-            f"Đã {status_text} hiển thị tài khoản trả phí",
-            show_alert=True
-        )
-        
-        # Cập nhật menu admin
+    bot.edit_message_text(
+        "➕ *Tạo sản phẩm mới*\n\n"
+        "Vui lòng nhập tên sản phẩm:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown"
+    )
+
+
+@callback_router.exact("toggle_premium_visibility")
+@admin_only
+def toggle_premium_visibility_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Bật/tắt hiển thị tài khoản trả phí"""
+    # Lấy cài đặt hiện tại
+    settings = db.get_visibility_settings()
+    show_premium = settings.get('show_premium', True)
+    
+    # Đảo ngược trạng thái
+    new_status = not show_premium
+    db.update_visibility_setting('show_premium', new_status)
+    
+    status_text = "bật" if new_status else "tắt"
+    
+    # Thông báo cho admin
+    bot.answer_callback_query(
+        call.id,
+        f"Đã {status_text} hiển thị tài khoản trả phí",
+        show_alert=True
+    )
+    
+    # Cập nhật menu admin
+    bot.edit_message_text(
+        "⚙️ *Bảng điều khiển quản trị*\n\n"
+        f"Hiển thị tài khoản trả phí: {'Bật' if new_status else 'Tắt'}",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.admin_panel_keyboard()
+    )
+
+
+@callback_router.prefix("delete_product_")
+@admin_only
+def delete_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Xóa sản phẩm"""
+    product = db.get_product(product_id)
+    
+    if product:
+        # Xác nhận xóa sản phẩm
         bot.edit_message_text(
-            "⚙️ *Bảng điều khiển quản trị*\n\n"
-            f"Hiển thị tài khoản trả phí: {'Bật' if new_status else 'Tắt'}",
+            f"🗑️ *Xác nhận xóa sản phẩm*\n\n"
+            f"ID: {product['id']}\n"
+            f"Tên: {product['name']}\n"
+            f"Giá: {product['price']:,} {config.CURRENCY}\n\n"
+            f"Bạn có chắc chắn muốn xóa sản phẩm này?",
             call.message.chat.id,
             call.message.message_id,
             parse_mode="Markdown",
-            reply_markup=keyboards.admin_panel_keyboard()
+            reply_markup=keyboards.confirm_delete_product_keyboard(product_id)
         )
-    
-    # Thêm xử lý cho nút xóa sản phẩm
-    elif data.startswith("delete_product_") and is_admin(user_id):
-        # Xóa sản phẩm
-        product_id = int(data.split("_")[2])
-        product = db.get_product(product_id)
-        
-        if product:
-            # Xác nhận xóa sản phẩm
-            bot.edit_message_text(
-                f"🗑️ *Xác nhận xóa sản phẩm*\n\n"
-                f"ID: {product['id']}\n"
-                f"Tên: {product['name']}\n"
-                f"Giá: {product['price']:,} {config.CURRENCY}\n\n"
-                f"Bạn có chắc chắn muốn xóa sản phẩm này?",
-                call.message.chat.id,
-                call.message.message_id,
-                parse_mode="Markdown",
-                reply_markup=keyboards.confirm_delete_product_keyboard(product_id)
-            )
-    
-    # Thêm xử lý cho nút xác nhận xóa sản phẩm
-    elif data.startswith("confirm_delete_product_") and is_admin(user_id):
-        # Xác nhận xóa sản phẩm
-        product_id = int(data.split("_")[3])
-        
-        # Xóa sản phẩm
-        if db.delete_product(product_id):
-            bot.edit_message_text(
-                "✅ Đã xóa sản phẩm thành công!",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.back_button("back_to_product_list")
-            )
-        else:
-            bot.edit_message_text(
-                "❌ Không thể xóa sản phẩm. Vui lòng thử lại sau.",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.back_button("back_to_product_list")
-            )
-    
-    # Thêm xử lý cho nút hủy xóa sản phẩm
-    elif data == "cancel_delete_product" and is_admin(user_id):
-        # Hủy xóa sản phẩm
+
+
+@callback_router.prefix("confirm_delete_product_")
+@admin_only
+def confirm_delete_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, product_id: int) -> None:
+    """Xác nhận xóa sản phẩm"""
+    if db.delete_product(product_id):
         bot.edit_message_text(
-            "❌ Đã hủy xóa sản phẩm.",
+            "✅ Đã xóa sản phẩm thành công!",
             call.message.chat.id,
             call.message.message_id,
             reply_markup=keyboards.back_button("back_to_product_list")
         )
-    
-    # Thêm xử lý cho nút tìm kiếm người dùng
-    elif data.startswith("user_list_page_"):
-        # Xử lý phân trang danh sách người dùng
-        page = int(data.split("_")[3])
-        user_states[user_id]['page'] = page
-        display_user_list_page(bot, user_id, call.message.message_id)
-
-    elif data == "user_list_search":
-        # Bắt đầu tìm kiếm người dùng
-        user_states[user_id]['state'] = 'searching_user'
+    else:
         bot.edit_message_text(
-            "🔍 *Tìm kiếm người dùng*\n\n"
-            "Vui lòng nhập tên người dùng hoặc ID để tìm kiếm:",
+            "❌ Không thể xóa sản phẩm. Vui lòng thử lại sau.",
             call.message.chat.id,
             call.message.message_id,
-            parse_mode="Markdown"
+            reply_markup=keyboards.back_button("back_to_product_list")
         )
 
-    elif data == "user_list_refresh":
-        # Làm mới danh sách người dùng
-        users = db.get_all_users()
-        user_states[user_id] = {
-            'state': 'viewing_user_list',
-            'page': 0,
-            'users': users,
-            'search_query': ''
-        }
-        display_user_list_page(bot, user_id, call.message.message_id)
+
+@callback_router.exact("cancel_delete_product")
+@admin_only
+def cancel_delete_product_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hủy xóa sản phẩm"""
+    bot.edit_message_text(
+        "❌ Đã hủy xóa sản phẩm.",
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=keyboards.back_button("back_to_product_list")
+    )
+
+
+@callback_router.prefix("user_list_page_")
+def user_list_page_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, page: int) -> None:
+    """Xử lý phân trang danh sách người dùng"""
+    user_id = call.from_user.id
+    user_states[user_id]['page'] = page
+    display_user_list_page(bot, user_id, call.message.message_id)
+
+
+@callback_router.exact("user_list_search")
+def user_list_search_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Bắt đầu tìm kiếm người dùng"""
+    user_id = call.from_user.id
+    user_states[user_id]['state'] = 'searching_user'
+    bot.edit_message_text(
+        "🔍 *Tìm kiếm người dùng*\n\n"
+        "Vui lòng nhập tên người dùng hoặc ID để tìm kiếm:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown"
+    )
+
+
+@callback_router.exact("user_list_refresh")
+def user_list_refresh_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Làm mới danh sách người dùng"""
+    user_id = call.from_user.id
+    user_states[user_id] = {
+        'state': 'viewing_user_list',
+        'page': 0,
+        'search_query': ''
+    }
+    display_user_list_page(bot, user_id, call.message.message_id)
+
+
+@callback_router.exact("my_purchases")
+def my_purchases_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị danh sách tài khoản đã mua"""
+    user_id = call.from_user.id
+    total = db.count_user_purchases(user_id)
     
-    elif data == "my_purchases":
-        # Hiển thị danh sách tài khoản đã mua
-        user = db.get_user(user_id)
-        purchases = user.get('purchases', [])
-        
-        if not purchases:
-            bot.edit_message_text(
-                "🛒 Bạn chưa mua tài khoản nào.",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=keyboards.back_button()
-            )
-            return
-        
-        # Lưu trạng thái để xử lý phân trang
-        user_states[user_id] = {
-            'state': 'viewing_purchases',
-            'page': 0,
-            'purchases': purchases
-        }
-        
+    if not total:
         bot.edit_message_text(
-            "🛒 *Tài khoản đã mua*\n\nChọn một tài khoản để xem chi tiết:",
+            "🛒 Bạn chưa mua tài khoản nào.",
             call.message.chat.id,
             call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.purchase_history_keyboard(purchases)
+            reply_markup=keyboards.back_button()
         )
+        return
     
-    elif data.startswith("view_purchase_"):
-        # Xem chi tiết tài khoản đã mua
-        purchase_idx = int(data.split("_")[2])
-        
-        # Lấy thông tin mua hàng từ trạng thái người dùng
-        state = user_states.get(user_id, {})
-        purchases = state.get('purchases', [])
-        
-        if not purchases or purchase_idx >= len(purchases):
-            # Nếu không có thông tin trong trạng thái, lấy từ cơ sở dữ liệu
-            user = db.get_user(user_id)
-            purchases = user.get('purchases', [])
-        
-        if purchase_idx >= len(purchases):
-            bot.answer_callback_query(call.id, "❌ Không tìm thấy thông tin tài khoản.", show_alert=True)
-            return
-        
-        purchase = purchases[purchase_idx]
-        product_name = purchase.get('product_name', 'Không tên')
-        price = purchase.get('price', 0)
-        account_info = purchase.get('account_data', 'Không có thông tin')
-        
-        # Định dạng thời gian mua
-        timestamp = purchase.get('timestamp', '')
-        if timestamp:
-            try:
-                import datetime
-                dt = datetime.datetime.fromisoformat(timestamp)
-                date_str = dt.strftime('%d/%m/%Y %H:%M:%S')
-            except:
-                date_str = 'Không rõ'
-        else:
+    # Lưu trạng thái để xử lý phân trang
+    user_states[user_id] = {
+        'state': 'viewing_purchases',
+        'page': 0
+    }
+    
+    purchases = db.get_user_purchases(user_id, 0, keyboards.PURCHASES_PER_PAGE)
+    bot.edit_message_text(
+        "🛒 *Tài khoản đã mua*\n\nChọn một tài khoản để xem chi tiết:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.purchase_history_keyboard(purchases, total=total)
+    )
+
+
+@callback_router.prefix("view_purchase_")
+def view_purchase_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, purchase_idx: int) -> None:
+    """Xem chi tiết tài khoản đã mua"""
+    user_id = call.from_user.id
+    
+    # Chỉ đọc đúng bản ghi cần xem từ lịch sử mua hàng
+    purchase = db.get_user_purchase(user_id, purchase_idx)
+    
+    if not purchase:
+        bot.answer_callback_query(call.id, "❌ Không tìm thấy thông tin tài khoản.", show_alert=True)
+        return
+    
+    product_name = purchase.get('product_name', 'Không tên')
+    price = purchase.get('price', 0)
+    account_info = purchase.get('account_data', 'Không có thông tin')
+    
+    # Định dạng thời gian mua
+    timestamp = purchase.get('timestamp', '')
+    if timestamp:
+        try:
+            dt = datetime.datetime.fromisoformat(timestamp)
+            date_str = dt.strftime('%d/%m/%Y %H:%M:%S')
+        except:
             date_str = 'Không rõ'
-        
-        bot.edit_message_text(
-            f"🛒 *Chi tiết tài khoản đã mua*\n\n"
-            f"Sản phẩm: {product_name}\n"
-            f"Giá: {price:,} {config.CURRENCY}\n"
-            f"Ngày mua: {date_str}\n\n"
-            f"📝 *Thông tin tài khoản:*\n"
-            f"`{account_info}`",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.back_button("back_to_purchases")
-        )
+    else:
+        date_str = 'Không rõ'
     
-    elif data == "back_to_purchases":
-        # Quay lại danh sách tài khoản đã mua
-        state = user_states.get(user_id, {})
-        page = state.get('page', 0)
-        purchases = state.get('purchases', [])
-        
-        if not purchases:
-            # Nếu không có thông tin trong trạng thái, lấy từ cơ sở dữ liệu
-            user = db.get_user(user_id)
-            purchases = user.get('purchases', [])
-        
-        bot.edit_message_text(
-            "🛒 *Tài khoản đã mua*\n\nChọn một tài khoản để xem chi tiết:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.purchase_history_keyboard(purchases, page, "my_account")  # Thêm tham số để quay lại menu tài khoản
-        )
+    bot.edit_message_text(
+        f"🛒 *Chi tiết tài khoản đã mua*\n\n"
+        f"Sản phẩm: {product_name}\n"
+        f"Giá: {price:,} {config.CURRENCY}\n"
+        f"Ngày mua: {date_str}\n\n"
+        f"📝 *Thông tin tài khoản:*\n"
+        f"`{account_info}`",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.back_button("back_to_purchases")
+    )
+
+
+@callback_router.exact("back_to_purchases")
+def back_to_purchases_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Quay lại danh sách tài khoản đã mua"""
+    user_id = call.from_user.id
+    state = user_states.get(user_id, {})
+    page = state.get('page', 0)
+    total = db.count_user_purchases(user_id)
+    purchases = db.get_user_purchases(user_id, page * keyboards.PURCHASES_PER_PAGE, keyboards.PURCHASES_PER_PAGE)
+    
+    bot.edit_message_text(
+        "🛒 *Tài khoản đã mua*\n\nChọn một tài khoản để xem chi tiết:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.purchase_history_keyboard(purchases, page, "my_account", total=total)  # Thêm tham số để quay lại menu tài khoản
+    )
+
+
+@callback_router.prefix("purchase_page_")
+def purchase_page_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, page: int) -> None:
+    """Xử lý phân trang danh sách tài khoản đã mua"""
+    user_id = call.from_user.id
     
-    elif data.startswith("purchase_page_"):
-        # Xử lý phân trang danh sách tài khoản đã mua
-        page = int(data.split("_")[2])
-        
-        state = user_states.get(user_id, {})
-        purchases = state.get('purchases', [])
-        
-        if not purchases:
-            # Nếu không có thông tin trong trạng thái, lấy từ cơ sở dữ liệu
-            user = db.get_user(user_id)
-            purchases = user.get('purchases', [])
-        
-        # Cập nhật trang hiện tại
-        if user_id in user_states:
-            user_states[user_id]['page'] = page
-        else:
-            user_states[user_id] = {
-                'state': 'viewing_purchases',
-                'page': page,
-                'purchases': purchases
-            }
-        
+    total = db.count_user_purchases(user_id)
+    purchases = db.get_user_purchases(user_id, page * keyboards.PURCHASES_PER_PAGE, keyboards.PURCHASES_PER_PAGE)
+    
+    # Cập nhật trang hiện tại
+    if user_id in user_states:
+        user_states[user_id]['page'] = page
+    else:
+        user_states[user_id] = {
+            'state': 'viewing_purchases',
+            'page': page
+        }
+    
+    bot.edit_message_text(
+        "🛒 *Tài khoản đã mua*\n\nChọn một tài khoản để xem chi tiết:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.purchase_history_keyboard(purchases, page, total=total)
+    )
+
+
+@callback_router.exact("my_account")
+def my_account_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị menu tài khoản"""
+    user_id = call.from_user.id
+    username = call.from_user.username or f"user_{user_id}"
+    balance = ctx.user.get('balance', 0)
+    
+    # Escape username để tránh lỗi Markdown
+    safe_username = username.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[')
+    
+    try:
         bot.edit_message_text(
-            "🛒 *Tài khoản đã mua*\n\nChọn một tài khoản để xem chi tiết:",
+            f"👤 *Thông tin tài khoản*\n\n"
+            f"ID: `{user_id}`\n"
+            f"Username: @{safe_username}\n"
+            f"Số dư: {balance:,} {config.CURRENCY}\n\n"
+            f"Chọn một tùy chọn bên dưới:",
             call.message.chat.id,
             call.message.message_id,
             parse_mode="Markdown",
-            reply_markup=keyboards.purchase_history_keyboard(purchases, page)
+            reply_markup=keyboards.account_menu()
         )
-    
-    elif data == "my_account":
-        # Hiển thị menu tài khoản
-        user = db.get_user(user_id)
-        balance = user.get('balance', 0)
-        
-        # Escape username để tránh lỗi Markdown
-        safe_username = username.replace('_', '\\_').replace('*', '\\*').replace('`', '\\`').replace('[', '\\[')
-        
-        try:
+    except telebot.apihelper.ApiTelegramException as e:
+        # Nếu vẫn lỗi, thử gửi không có parse_mode
+        if "can't parse entities" in str(e):
             bot.edit_message_text(
-                f"👤 *Thông tin tài khoản*\n\n"
-                f"ID: `{user_id}`\n"
-                f"Username: @{safe_username}\n"
+                f"👤 Thông tin tài khoản\n\n"
+                f"ID: {user_id}\n"
+                f"Username: @{username}\n"
                 f"Số dư: {balance:,} {config.CURRENCY}\n\n"
                 f"Chọn một tùy chọn bên dưới:",
                 call.message.chat.id,
                 call.message.message_id,
-                parse_mode="Markdown",
                 reply_markup=keyboards.account_menu()
             )
-        except telebot.apihelper.ApiTelegramException as e:
-            # Nếu vẫn lỗi, thử gửi không có parse_mode
-            if "can't parse entities" in str(e):
-                bot.edit_message_text(
-                    f"👤 Thông tin tài khoản\n\n"
-                    f"ID: {user_id}\n"
-                    f"Username: @{username}\n"
-                    f"Số dư: {balance:,} {config.CURRENCY}\n\n"
-                    f"Chọn một tùy chọn bên dưới:",
-                    call.message.chat.id,
-                    call.message.message_id,
-                    reply_markup=keyboards.account_menu()
-                )
-    
-    elif data == "deposit_money":
-        # Hiển thị form nạp tiền
-        bot.edit_message_text(
-            "💰 *Nạp tiền vào tài khoản*\n\n"
-            "Vui lòng chọn số tiền bạn muốn nạp:",
-            call.message.chat.id,
-            call.message.message_id,
-            parse_mode="Markdown",
-            reply_markup=keyboards.deposit_amount_keyboard()
-        )
-
-    elif data.startswith("deposit_amount_"):
-        # Xử lý số tiền nạp
-        try:
-            amount = int(data.split("_")[2])
-            
-            # Tạo mô tả giao dịch
-            description = f"Naptien {username} {user_id}"
-            
-            # Tạo mã QR
-            qr_image = generate_payment_qr(user_id, amount, description)
-            
-            if qr_image:
-                # Gửi ảnh QR code
-                bot.delete_message(call.message.chat.id, call.message.message_id)
-                
-                # Tạo bàn phím với nút liên hệ admin và quay lại
-                contact_markup = keyboards.payment_contact_keyboard()
-                
-                bot.send_photo(
-                    call.message.chat.id,
-                    qr_image,
-                    caption=f"📱 *Quét mã QR để nạp tiền*\n\n"
-                    f"Số tiền: {amount:,} {config.CURRENCY}\n"
-                    f"Nội dung chuyển khoản: `{description}`\n\n"
-                    f"⚠️ *Lưu ý:*\n"
-                    f"- Vui lòng không thay đổi nội dung chuyển khoản\n"
-                    f"- Tiền sẽ được cộng vào tài khoản sau khi admin xác nhận\n"
-                    f"- Sử dụng nút bên dưới để liên hệ admin nếu cần hỗ trợ",
-                    parse_mode="Markdown",
-                    reply_markup=contact_markup
-                )
-            else:
-                bot.answer_callback_query(call.id, "❌ Không thể tạo mã QR. Vui lòng thử lại sau.", show_alert=True)
-        except Exception as e:
-            logger.error(f"Error processing deposit: {e}")
-            bot.answer_callback_query(call.id, "❌ Đã xảy ra lỗi. Vui lòng thử lại sau.", show_alert=True)
-    
-    # Đánh dấu callback đã được xử lý
-    bot.answer_callback_query(call.id)
-    
-    # Add the file download handlers here, inside the function
-    if data == "download_files":
-        # Sử dụng file_manager để hiển thị menu tải file
-        file_manager.show_download_menu(call.message.chat.id, call.message.message_id)
 
-    elif data == "file_list":
-        # Hiển thị danh sách file
-        file_manager.show_file_list(call.message.chat.id, call.message.message_id)
 
-    elif data == "search_file":
-        # Hiển thị form tìm kiếm file
-        file_manager.search_file(call.message.chat.id, call.message.message_id)
+@callback_router.exact("deposit_money")
+def deposit_money_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext) -> None:
+    """Hiển thị form nạp tiền"""
+    bot.edit_message_text(
+        "💰 *Nạp tiền vào tài khoản*\n\n"
+        "Vui lòng chọn số tiền bạn muốn nạp:",
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode="Markdown",
+        reply_markup=keyboards.deposit_amount_keyboard()
+    )
 
-    elif data == "popular_files":
-        # Hiển thị danh sách file phổ biến
-        file_manager.show_popular_files(call.message.chat.id, call.message.message_id)
 
-    elif data == "newest_files":
-        # Hiển thị danh sách file mới nhất
-        file_manager.show_newest_files(call.message.chat.id, call.message.message_id)
+@callback_router.prefix("deposit_amount_")
+def deposit_amount_callback(bot: TeleBot, call: CallbackQuery, ctx: RequestContext, amount: int) -> None:
+    """Xử lý số tiền nạp"""
+    user_id = call.from_user.id
+    username = call.from_user.username or f"user_{user_id}"
+    try:
+        # Tạo mô tả giao dịch
+        description = f"Naptien {username} {user_id}"
+        
+        # Tạo mã QR
+        qr_image = generate_payment_qr(user_id, amount, description)
+        
+        if qr_image:
+            # Gửi ảnh QR code
+            bot.delete_message(call.message.chat.id, call.message.message_id)
+            
+            # Tạo bàn phím với nút liên hệ admin và quay lại
+            contact_markup = keyboards.payment_contact_keyboard()
+            
+            bot.send_photo(
+                call.message.chat.id,
+                qr_image,
+                caption=f"📱 *Quét mã QR để nạp tiền*\n\n"
+                f"Số tiền: {amount:,} {config.CURRENCY}\n"
+                f"Nội dung chuyển khoản: `{description}`\n\n"
+                f"⚠️ *Lưu ý:*\n"
+                f"- Vui lòng không thay đổi nội dung chuyển khoản\n"
+                f"- Tiền sẽ được cộng vào tài khoản sau khi admin xác nhận\n"
+                f"- Sử dụng nút bên dưới để liên hệ admin nếu cần hỗ trợ",
+                parse_mode="Markdown",
+                reply_markup=contact_markup
+            )
+        else:
+            bot.answer_callback_query(call.id, "❌ Không thể tạo mã QR. Vui lòng thử lại sau.", show_alert=True)
+    except Exception as e:
+        logger.error(f"Error processing deposit: {e}")
+        bot.answer_callback_query(call.id, "❌ Đã xảy ra lỗi. Vui lòng thử lại sau.", show_alert=True)
 
-    elif data == "download_from_url":
-        # Hiển thị form nhập URL để tải file
-        file_manager.download_from_url(call.message.chat.id, call.message.message_id)
 
 def add_admin_command(bot: TeleBot, message: Message) -> None:
     """Xử lý lệnh /add_admin - Thêm admin mới"""
@@ -2523,7 +2412,21 @@ def check_ban_command(bot: TeleBot, message: Message) -> None:
 
 def is_user_banned(user_id: int) -> bool:
     """Kiểm tra xem người dùng có bị cấm không"""
-    return db.is_user_banned(user_id)
+    return user_id in banned_users
+
+def ban_user(user_id: int) -> bool:
+    """Cấm người dùng trong database và thêm vào tập ID bị cấm"""
+    success = db.ban_user(user_id)
+    if success:
+        banned_users.add(user_id)
+    return success
+
+def unban_user(user_id: int) -> bool:
+    """Bỏ cấm người dùng trong database và xóa khỏi tập ID bị cấm"""
+    success = db.unban_user(user_id)
+    if success:
+        banned_users.discard(user_id)
+    return success
 
 def force_ban_command(bot: TeleBot, message: Message) -> None:
     """Lệnh cấm người dùng trực tiếp"""
@@ -2548,7 +2451,7 @@ def force_ban_command(bot: TeleBot, message: Message) -> None:
             return
         
         # Sử dụng hàm ban_user từ database
-        success = db.ban_user(target_user_id)
+        success = ban_user(target_user_id)
         
         if success:
             bot.send_message(user_id, f"✅ Đã cấm người dùng {target_user_id} thành công!")
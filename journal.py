@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+
+def read_journal(file_path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """Đọc các bản ghi của file nhật ký, trả về (bản ghi, vị trí kết thúc của bản ghi hợp lệ cuối cùng)"""
+    records = []
+    good_offset = 0
+    if not os.path.exists(file_path):
+        return records, good_offset
+
+    with open(file_path, 'rb') as f:
+        for line in f:
+            try:
+                records.append(jsoncodec.decode(line))
+            except ValueError:
+                # Dòng cuối bị ghi dở
+                break
+            good_offset += len(line)
+    return records, good_offset
+
+
+def apply_user_records(users: Dict[Any, Dict], records: Iterable[Dict[str, Any]]) -> None:
+    """Áp dụng các bản ghi nhật ký lên bảng người dùng theo ID"""
+    for record in records:
+        user_id = record.get('id')
+        fields = record.get('fields', {})
+        if record.get('op') == 'add':
+            users.setdefault(user_id, dict(fields))
+        elif record.get('op') == 'update' and user_id in users:
+            users[user_id].update(fields)
+
+
+class Journal:
+    """Nhật ký ghi thêm (JSONL) với fsync gộp nhóm.
+
+    Mỗi thay đổi là một dòng ``{"op": ..., "id": ..., "fields": {...}}``. Các bản
+    ghi được đưa vào hàng đợi bằng ``write()`` và một luồng nền ghi chúng theo
+    lô, mỗi lô chỉ cần một lần fsync. ``wait()`` chờ đến khi bản ghi đã bền vững.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._pending: List[str] = []
+        self._seq = 0
+        self._durable_seq = 0
+        self._closed = False
+        # Lỗi làm luồng ghi dừng (ví dụ hết dung lượng đĩa), báo lại cho các luồng đang chờ
+        self._error: Optional[Exception] = None
+
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def size(self) -> int:
+        """Kích thước hiện tại của nhật ký (byte)"""
+        return self._size
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """Đọc lại các bản ghi trong nhật ký, bỏ qua dòng cuối bị ghi dở"""
+        with self._io_lock:
+            records, good_offset = read_journal(self.file_path)
+
+            # Cắt bỏ phần bị ghi dở để các bản ghi mới nối tiếp đúng chỗ
+            if good_offset < self._size:
+                self._file.truncate(good_offset)
+                self._size = good_offset
+
+        return records
+
+    def write(self, op: str, record_id: Any, fields: Optional[Dict] = None) -> int:
+        """Đưa một bản ghi vào hàng đợi ghi, trả về số thứ tự của bản ghi"""
+        line = json.dumps({'op': op, 'id': record_id, 'fields': fields or {}}, ensure_ascii=False) + "\n"
+        with self._cond:
+            self._pending.append(line)
+            self._seq += 1
+            self._cond.notify_all()
+            return self._seq
+
+    def wait(self, seq: int) -> None:
+        """Chờ đến khi bản ghi có số thứ tự ``seq`` đã được fsync (OSError nếu luồng ghi đã dừng vì lỗi)"""
+        with self._cond:
+            while self._durable_seq < seq and not self._closed and self._error is None:
+                self._cond.wait()
+            if self._durable_seq < seq and self._error is not None:
+                raise OSError(f"Không ghi được nhật ký {self.file_path}: {self._error}") from self._error
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            try:
+                self._write_batch()
+            except Exception as e:
+                logger.error(f"Error writing {self.file_path}, journal writer stopped: {e}", exc_info=True)
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+
+    def _write_batch(self) -> None:
+        with self._io_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                last_seq = self._seq
+
+            if batch:
+                data = "".join(batch)
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._size += len(data.encode('utf-8'))
+
+        with self._cond:
+            self._durable_seq = max(self._durable_seq, last_seq)
+            self._cond.notify_all()
+
+    def reset(self) -> None:
+        """Xóa toàn bộ nhật ký sau khi dữ liệu đã được gộp vào snapshot"""
+        with self._io_lock:
+            with self._cond:
+                self._pending = []
+                last_seq = self._seq
+
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size = 0
+
+        with self._cond:
+            self._durable_seq = max(self._durable_seq, last_seq)
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        """Ghi nốt các bản ghi còn chờ và đóng file"""
+        self._write_batch()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        with self._io_lock:
+            self._file.close()
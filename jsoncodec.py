@@ -0,0 +1,101 @@
+import json
+import logging
+from typing import Any, Callable, Dict, Tuple, Union
+import config
+
+logger = logging.getLogger(__name__)
+
+# Bộ mã hóa JSON: orjson hoặc msgspec nếu đã cài (nhanh hơn nhiều), nếu không thì
+# dùng thư viện chuẩn. Tất cả đều cho ra cùng một định dạng file: dạng gọn do bộ
+# mã hóa đang dùng tạo, dạng thụt lề (pretty) luôn do thư viện chuẩn tạo.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class DecodeError(ValueError):
+    """Dữ liệu JSON không hợp lệ (dùng chung cho mọi bộ mã hóa)"""
+
+
+def _stdlib_encode(data: Any, pretty: bool = False) -> bytes:
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+    # Không thụt lề để json dùng bộ mã hóa viết bằng C
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _stdlib_decode(data: Union[bytes, str]) -> Any:
+    return json.loads(data)
+
+
+def _orjson_encode(data: Any) -> bytes:
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _msgspec_encode(data: Any) -> bytes:
+    return msgspec.json.encode(data)
+
+
+def _msgspec_decode(data: Union[bytes, str]) -> Any:
+    try:
+        return msgspec.json.decode(data)
+    except msgspec.DecodeError as e:
+        raise DecodeError(str(e)) from e
+
+
+# {tên: (hàm mã hóa dạng gọn, hàm giải mã, các lỗi mã hóa cần chuyển sang thư viện chuẩn)}
+_codecs: Dict[str, Tuple[Callable[[Any], bytes], Callable[[Union[bytes, str]], Any], Tuple]] = {
+    'json': (_stdlib_encode, _stdlib_decode, ())
+}
+if orjson is not None:
+    _codecs['orjson'] = (_orjson_encode, orjson.loads, (TypeError,))
+if msgspec is not None:
+    _codecs['msgspec'] = (_msgspec_encode, _msgspec_decode, (TypeError, ValueError, OverflowError,
+                                                             msgspec.EncodeError))
+
+
+def _select(name: str) -> str:
+    if name == 'auto':
+        return next(codec for codec in ('orjson', 'msgspec', 'json') if codec in _codecs)
+    if name not in _codecs:
+        logger.warning(f"JSON codec {name!r} is not available, using the standard json module")
+        return 'json'
+    return name
+
+
+# Tên bộ mã hóa đang dùng
+name = _select(config.JSON_CODEC)
+_encode, _decode, _fallback_errors = _codecs[name]
+
+
+def encode(data: Any, pretty: bool = False) -> bytes:
+    """Mã hóa dữ liệu thành JSON UTF-8 (``pretty`` để thụt lề cho người đọc)"""
+    if _fallback_errors and not pretty:
+        try:
+            return _encode(data)
+        except _fallback_errors:
+            # Kiểu dữ liệu bộ mã hóa nhanh không hỗ trợ (ví dụ số nguyên quá 64 bit)
+            pass
+    return _stdlib_encode(data, pretty)
+
+
+def decode(data: Union[bytes, str]) -> Any:
+    """Giải mã JSON (bytes hoặc str), lỗi luôn là ``DecodeError``/``ValueError``"""
+    return _decode(data)
+
+
+def encode_file(data: Any) -> bytes:
+    """Mã hóa dữ liệu để ghi vào file trong thư mục data (gọn hoặc thụt lề theo config.DATA_FILES_PRETTY)"""
+    return encode(data, pretty=config.DATA_FILES_PRETTY)
+
+
+def read_file(file_path: str) -> Any:
+    """Đọc và giải mã một file JSON"""
+    with open(file_path, 'rb') as f:
+        return decode(f.read())
@@ -1,16 +1,83 @@
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Hashable, Optional, Tuple
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
-from database import Database
+from database import get_database
+from catalog import CatalogSnapshot
+
+# Số tài khoản đã mua hiển thị trên mỗi trang
+PURCHASES_PER_PAGE = 5
+
+# Số bàn phím đã dựng được giữ lại trong bộ nhớ đệm
+MARKUP_CACHE_SIZE = 256
+
+
+class CachedMarkup(InlineKeyboardMarkup):
+    """Bàn phím dùng chung giữa các lần gọi, chuỗi JSON chỉ được tạo một lần.
+    
+    Bàn phím lấy từ bộ nhớ đệm không được sửa (thêm hàng/nút) sau khi trả về.
+    """
+    
+    def to_json(self) -> str:
+        json_string = self.__dict__.get('_json')
+        if json_string is None:
+            json_string = self._json = super().to_json()
+        return json_string
+
+
+class MarkupCache:
+    """Bộ nhớ đệm LRU các bàn phím đã dựng, khóa là tên bàn phím và các tham số của nó"""
+    
+    def __init__(self, maxsize: int = MARKUP_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[Tuple, CachedMarkup]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._catalog_version: Optional[int] = None
+    
+    def get(self, key: Tuple[Hashable, ...], build: Callable[[], CachedMarkup]) -> CachedMarkup:
+        """Lấy bàn phím theo khóa, dựng mới bằng ``build`` nếu chưa có"""
+        with self._lock:
+            markup = self._entries.get(key)
+            if markup is not None:
+                self._entries.move_to_end(key)
+                return markup
+        
+        markup = build()
+        with self._lock:
+            self._entries[key] = markup
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return markup
+    
+    def set_catalog_version(self, version: int) -> None:
+        """Bỏ các bàn phím dựng từ phiên bản danh mục cũ"""
+        with self._lock:
+            if version == self._catalog_version:
+                return
+            self._catalog_version = version
+            for key in [key for key in self._entries if key[0] == 'product_list' and key[1] != version]:
+                del self._entries[key]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+markup_cache = MarkupCache()
 
 def main_menu(is_admin: bool = False) -> InlineKeyboardMarkup:
     """Tạo bàn phím menu chính"""
-    db = Database()
+    db = get_database()
     
     # Lấy cài đặt hiển thị
     settings = db.get_visibility_settings()
-    show_premium = settings.get('show_premium', True)
-    
-    markup = InlineKeyboardMarkup()
+    show_premium = bool(settings.get('show_premium', True))
+    is_admin = bool(is_admin)
+    return markup_cache.get(('main_menu', is_admin, show_premium), lambda: _main_menu(is_admin, show_premium))
+
+def _main_menu(is_admin: bool, show_premium: bool) -> CachedMarkup:
+    markup = CachedMarkup()
     
     # Chỉ hiển thị nút "Tài khoản trả phí" nếu cài đặt cho phép
     if show_premium:
@@ -82,67 +149,44 @@ def user_management() -> InlineKeyboardMarkup:
     )
     return markup
 
-def product_list_keyboard(products: List[Dict[str, Any]], page: int = 0, admin: bool = False) -> InlineKeyboardMarkup:
-    """Tạo bàn phím danh sách sản phẩm với hiển thị 2 cột"""
-    markup = InlineKeyboardMarkup()
-    
-    # Lấy database để kiểm tra số lượng tài khoản
-    db = Database()
+def product_list_keyboard(section: str = 'premium', page: int = 0, admin: bool = False,
+                          catalog: Optional[CatalogSnapshot] = None) -> InlineKeyboardMarkup:
+    """Tạo bàn phím danh sách sản phẩm với hiển thị 2 cột
+    
+    section: nhóm sản phẩm trong danh mục ('all', 'premium' hoặc 'free')
+    catalog: ảnh chụp danh mục; nếu không truyền sẽ lấy ảnh chụp hiện tại từ database
+    """
+    if catalog is None:
+        catalog = get_database().catalog()
+    
+    # Bàn phím chỉ phụ thuộc vào danh mục nên được dùng lại cho đến khi danh mục đổi phiên bản
+    markup_cache.set_catalog_version(catalog.version)
+    admin = bool(admin)
+    return markup_cache.get(
+        ('product_list', catalog.version, section, page, admin),
+        lambda: _product_list_keyboard(catalog, section, page, admin)
+    )
+
+def _product_list_keyboard(catalog: CatalogSnapshot, section: str, page: int, admin: bool) -> CachedMarkup:
+    markup = CachedMarkup()
     
-    # Lọc sản phẩm có hàng (chỉ lọc khi không phải admin)
-    if not admin:
-        filtered_products = []
-        for product in products:
-            product_id = product.get('id', 0)
-            available_count = db.count_available_accounts(product_id)
-            if available_count > 0:
-                filtered_products.append(product)
-        products = filtered_products
+    # Sản phẩm của trang hiện tại (danh mục đã lọc hàng và chia trang sẵn)
+    current_products = catalog.page(section, page)
     
-    # Nếu không có sản phẩm nào sau khi lọc
-    if not products:
+    # Nếu không có sản phẩm nào
+    if not catalog.products(section):
         return markup
     
-    # Hiển thị 10 sản phẩm mỗi trang
-    items_per_page = 10
-    start_idx = page * items_per_page
-    end_idx = min(start_idx + items_per_page, len(products))
-    
-    # Lấy danh sách sản phẩm cho trang hiện tại
-    current_products = products[start_idx:end_idx]
-    
     # Hiển thị sản phẩm theo 2 cột
     for i in range(0, len(current_products), 2):
         row_buttons = []
-        
-        # Sản phẩm đầu tiên trong hàng
-        product = current_products[i]
-        product_id = product.get('id', 0)
-        product_name = product.get('name', 'Không tên')
-        
-        # Lấy số lượng tài khoản còn lại
-        available_count = db.count_available_accounts(product_id)
-        
-        # Thêm số lượng vào tên sản phẩm
-        display_name = f"{product_name} ({available_count})"
-        
-        # Tạo nút cho sản phẩm đầu tiên
-        callback_data = f"admin_product_{product_id}" if admin else f"view_product_{product_id}"
-        row_buttons.append(InlineKeyboardButton(display_name, callback_data=callback_data))
-        
-        # Nếu còn sản phẩm thứ hai trong hàng
-        if i + 1 < len(current_products):
-            product = current_products[i + 1]
+        for product in current_products[i:i + 2]:
             product_id = product.get('id', 0)
             product_name = product.get('name', 'Không tên')
             
-            # Lấy số lượng tài khoản còn lại
-            available_count = db.count_available_accounts(product_id)
-            
-            # Thêm số lượng vào tên sản phẩm
-            display_name = f"{product_name} ({available_count})"
+            # Thêm số lượng tài khoản còn lại vào tên sản phẩm
+            display_name = f"{product_name} ({catalog.available(product_id)})"
             
-            # Tạo nút cho sản phẩm thứ hai
             callback_data = f"admin_product_{product_id}" if admin else f"view_product_{product_id}"
             row_buttons.append(InlineKeyboardButton(display_name, callback_data=callback_data))
         
@@ -154,7 +198,7 @@ def product_list_keyboard(products: List[Dict[str, Any]], page: int = 0, admin:
     if page > 0:
         nav_buttons.append(InlineKeyboardButton("⬅️ Trước", callback_data=f"product_page_{page-1}"))
     
-    if end_idx < len(products):
+    if page + 1 < catalog.page_count(section):
         nav_buttons.append(InlineKeyboardButton("➡️ Sau", callback_data=f"product_page_{page+1}"))
     
     if nav_buttons:
@@ -270,14 +314,15 @@ def back_button(callback_data: str = "back_to_main") -> InlineKeyboardMarkup:
 
 def admin_panel_keyboard() -> InlineKeyboardMarkup:
     """Tạo bàn phím panel quản trị"""
-    from database import Database
-    db = Database()
+    db = get_database()
     
     # Lấy cài đặt hiển thị
     settings = db.get_visibility_settings()
-    show_premium = settings.get('show_premium', True)
-    
-    markup = InlineKeyboardMarkup()
+    show_premium = bool(settings.get('show_premium', True))
+    return markup_cache.get(('admin_panel', show_premium), lambda: _admin_panel_keyboard(show_premium))
+
+def _admin_panel_keyboard(show_premium: bool) -> CachedMarkup:
+    markup = CachedMarkup()
     markup.row(
         InlineKeyboardButton("👥 Quản lý người dùng", callback_data="manage_users"),
         InlineKeyboardButton("🏷️ Quản lý sản phẩm", callback_data="manage_products")
@@ -352,17 +397,23 @@ def user_list_navigation_keyboard(current_page: int, total_pages: int, search_qu
     
     return markup
 
-def purchase_history_keyboard(purchases: List[Dict[str, Any]], page: int = 0, back_to: str = "back_to_main") -> InlineKeyboardMarkup:
-    """Tạo bàn phím danh sách tài khoản đã mua"""
+def purchase_history_keyboard(purchases: List[Dict[str, Any]], page: int = 0, back_to: str = "back_to_main",
+                              total: Optional[int] = None) -> InlineKeyboardMarkup:
+    """Tạo bàn phím danh sách tài khoản đã mua
+    
+    Nếu truyền ``total``, ``purchases`` chỉ là các bản ghi của trang hiện tại.
+    """
     markup = InlineKeyboardMarkup()
     
     # Hiển thị 5 tài khoản mỗi trang
-    items_per_page = 5
+    items_per_page = PURCHASES_PER_PAGE
     start_idx = page * items_per_page
-    end_idx = min(start_idx + items_per_page, len(purchases))
+    if total is None:
+        total = len(purchases)
+        purchases = purchases[start_idx:start_idx + items_per_page]
+    end_idx = min(start_idx + items_per_page, total)
     
-    for i in range(start_idx, end_idx):
-        purchase = purchases[i]
+    for i, purchase in enumerate(purchases[:items_per_page], start_idx):
         product_name = purchase.get('product_name', 'Không tên')
         purchase_id = i  # Sử dụng index làm ID
         
@@ -392,7 +443,7 @@ def purchase_history_keyboard(purchases: List[Dict[str, Any]], page: int = 0, ba
     if page > 0:
         nav_buttons.append(InlineKeyboardButton("⬅️ Trước", callback_data=f"purchase_page_{page-1}"))
     
-    if end_idx < len(purchases):
+    if end_idx < total:
         nav_buttons.append(InlineKeyboardButton("➡️ Sau", callback_data=f"purchase_page_{page+1}"))
     
     if nav_buttons:
@@ -417,7 +468,10 @@ def account_menu() -> InlineKeyboardMarkup:
 
 def deposit_amount_keyboard() -> InlineKeyboardMarkup:
     """Tạo bàn phím chọn số tiền nạp"""
-    markup = InlineKeyboardMarkup()
+    return markup_cache.get(('deposit_amount',), _deposit_amount_keyboard)
+
+def _deposit_amount_keyboard() -> CachedMarkup:
+    markup = CachedMarkup()
     markup.row(
         InlineKeyboardButton("50,000 VND", callback_data="deposit_amount_50000"),
         InlineKeyboardButton("100,000 VND", callback_data="deposit_amount_100000")
@@ -0,0 +1,52 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows không có fcntl, chỉ khóa trong tiến trình
+    fcntl = None
+
+
+class FileLock:
+    """Khóa tư vấn (fcntl.flock) giữa các tiến trình dùng chung thư mục data.
+
+    Khóa được giữ trên một file riêng (``lock_path``) vì các file dữ liệu được
+    thay thế bằng os.replace khi ghi. Có thể gọi lồng nhau trong cùng một luồng.
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+                self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
@@ -0,0 +1,608 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Any, Optional, Callable, Set, Deque, Tuple
+import config
+from database import Database, data_lock, split_duplicate_accounts
+from journal import Journal, apply_user_records
+from rollups import RevenueRollup
+from stats import StatsAggregate
+from user_index import UserIndex
+from records import AccountTable, Product, User, load_records
+from purchases import (PurchaseLog, PurchaseResult, check_purchase, extract_embedded_purchases, new_purchase_user,
+                       purchase_record, recover_purchases)
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindWriter:
+    """Luồng nền ghi các file dữ liệu đã thay đổi xuống đĩa sau một khoảng trễ"""
+
+    def __init__(self, flush_file: Callable[[str], None], delay: float = 1.0):
+        self.flush_file = flush_file
+        self.delay = delay
+        self._dirty: Set[str] = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, file_path: str) -> None:
+        """Đánh dấu file cần được ghi lại"""
+        with self._cond:
+            self._dirty.add(file_path)
+            self._cond.notify()
+
+    def _take_dirty(self) -> Set[str]:
+        with self._cond:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+
+                # Gom các thay đổi liên tiếp trong khoảng trễ thành một lần ghi
+                deadline = time.monotonic() + self.delay
+                while not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            for file_path in self._take_dirty():
+                self.flush_file(file_path)
+
+    def flush(self) -> None:
+        """Ghi ngay tất cả các file đang chờ"""
+        for file_path in self._take_dirty():
+            self.flush_file(file_path)
+
+    def close(self) -> None:
+        """Dừng luồng nền và ghi nốt các thay đổi còn lại"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        # Chờ lần ghi đang dở (nếu có) hoàn tất, nếu không thay đổi sẽ mất khi tiến trình thoát
+        self._thread.join()
+        self.flush()
+
+
+class MemoryDatabase(Database):
+    """Database giữ users/products/accounts trong bộ nhớ với chỉ mục theo ID.
+
+    Dữ liệu được đọc từ file JSON một lần khi khởi tạo. Mọi thay đổi được áp dụng
+    trong bộ nhớ và ghi xuống đĩa bởi luồng nền sau ``write_delay`` giây.
+
+    Khi bật ``journal``, mỗi thay đổi người dùng chỉ là một dòng ghi thêm vào
+    nhật ký; users.json chỉ được ghi lại khi nhật ký vượt quá ``JOURNAL_COMPACT_BYTES``.
+    """
+
+    # Dữ liệu đã nằm trong bộ nhớ, không cần giữ thêm bản phân tích của file
+    cache_reads = False
+
+    def __init__(self, write_delay: Optional[float] = None, journal: Optional[bool] = None):
+        if write_delay is None:
+            write_delay = config.DB_WRITE_BEHIND_DELAY
+        if journal is None:
+            journal = config.DB_JOURNAL_ENABLED
+
+        self._lock = threading.RLock()
+        # Bản ghi gọn (__slots__ / dạng cột) trong bộ nhớ, chuyển sang dict khi trả ra ngoài
+        self._users: Dict[int, User] = {}
+        self._products: Dict[int, Product] = {}
+        # Dữ liệu gốc của các người dùng/sản phẩm không hợp lệ: không dùng nhưng được ghi lại nguyên vẹn
+        self._invalid_users: List[Any] = []
+        self._invalid_products: List[Any] = []
+        self._accounts = AccountTable()
+        # Hàng đợi FIFO vị trí các tài khoản chưa bán theo từng sản phẩm
+        self._unsold: Dict[int, Deque[int]] = {}
+        # Số tài khoản còn lại theo từng sản phẩm, cập nhật theo mỗi thay đổi
+        self._stock: Dict[int, int] = {}
+        # Chỉ mục từ nội dung tài khoản đến vị trí trong bảng tài khoản (các vị trí trùng nằm riêng)
+        self._by_data: Dict[str, int] = {}
+        self._duplicate_data: Dict[str, List[int]] = {}
+        # Tăng mỗi khi sản phẩm hoặc tài khoản thay đổi, dùng làm phiên bản danh mục
+        self._catalog_changes = 0
+        self._settings: Optional[Dict] = None
+        self._stats = StatsAggregate()
+        self._user_index = UserIndex()
+        self._journal = Journal(config.USERS_JOURNAL_FILE) if journal else None
+        self._purchases = PurchaseLog(config.PURCHASES_FILE)
+
+        # Đảm bảo thư mục data tồn tại
+        os.makedirs("data", exist_ok=True)
+
+        # Khởi tạo các file nếu chưa tồn tại
+        self._init_file(config.USERS_FILE, [])
+        self._init_file(config.PRODUCTS_FILE, [])
+        self._init_file(config.ACCOUNTS_FILE, [])
+
+        # Tạo luồng ghi trước khi nạp dữ liệu vì bước chuyển đổi dữ liệu cũ có thể đánh dấu file cần ghi
+        self._writer = WriteBehindWriter(self._flush_file, write_delay)
+        self.load_data()
+        atexit.register(self.close)
+
+    @property
+    def users(self) -> List[Dict]:
+        """Danh sách người dùng hiện tại (tương thích với Database)"""
+        with self._lock:
+            return [user.to_dict() for user in self._users.values()]
+
+    def load_data(self):
+        """Đọc toàn bộ dữ liệu từ file và xây dựng chỉ mục trong bộ nhớ"""
+        with self._lock:
+            # Bản ghi thiếu id, trùng id hoặc sai kiểu nằm riêng và được ghi lại nguyên vẹn
+            records, self._invalid_users = load_records(User, self._read_shared(config.USERS_FILE), 'user',
+                                                        unique=True)
+            users: Dict[Any, Dict] = {user.id: user.to_dict() for user in records}
+
+            # Áp dụng các thay đổi trong nhật ký lên snapshot
+            if self._journal is not None:
+                apply_user_records(users, self._journal.replay())
+
+            # Chuyển lịch sử mua hàng cũ nằm trong bản ghi người dùng sang kho riêng
+            if any('purchases' in user for user in users.values()):
+                self._purchases.import_purchases(extract_embedded_purchases(users.values()))
+                self._mark_dirty(config.USERS_FILE)
+
+            # cache_reads = False nên dữ liệu đọc được không dùng chung, có thể sửa trực tiếp
+            accounts = self._read_shared(config.ACCOUNTS_FILE)
+
+            # Hoàn tất các lần mua đã ghi vào lịch sử nhưng chưa kịp lưu số dư/tài khoản
+            users_changed, accounts_changed = recover_purchases(users, accounts, self._purchases.all())
+            if users_changed:
+                self._mark_dirty(config.USERS_FILE)
+            if accounts_changed:
+                self._mark_dirty(config.ACCOUNTS_FILE)
+
+            # Chuyển sang bản ghi gọn, kiểm tra và điền giá trị mặc định một lần khi nạp
+            records, invalid = load_records(User, users.values(), 'user', unique=True)
+            self._invalid_users.extend(invalid)
+            self._users = {user.id: user for user in records}
+            records, self._invalid_products = load_records(Product, self._read_shared(config.PRODUCTS_FILE), 'product',
+                                                           unique=True)
+            self._products = {product.id: product for product in records}
+            self._accounts = AccountTable(accounts)
+
+            self._rebuild_account_queues()
+            self._catalog_changes += 1
+            self._settings = None
+            self._user_index = UserIndex(self._users.values())
+
+            # Thống kê: dùng bản đã lưu nếu còn khớp, nếu không thì tính lại. Nếu chỉ thiếu các lần mua
+            # cuối (chưa kịp ghi stats.json) thì chỉ cộng thêm các lần mua đó
+            stats = self._read_stats()
+            last_id = self._purchases.last_id
+            if (stats is not None and stats.total_users == len(self._users)
+                    and stats.rollup.last_purchase_id == stats.last_purchase_id < last_id):
+                for purchase in self._purchases.since(stats.last_purchase_id):
+                    stats.add_purchase(purchase)
+                self._mark_dirty(config.STATS_FILE)
+            if stats is None or not stats.is_current(len(self._users), last_id):
+                stats = StatsAggregate.rebuild(self._users.values(), self._purchases.all())
+                self._mark_dirty(config.STATS_FILE)
+            self._stats = stats
+
+    def save_data(self):
+        """Ghi ngay toàn bộ dữ liệu đang chờ xuống đĩa"""
+        self._writer.mark_dirty(config.USERS_FILE)
+        self._writer.flush()
+
+    def close(self) -> None:
+        """Dừng luồng ghi nền và lưu các thay đổi còn lại"""
+        self._writer.close()
+        if self._journal is not None:
+            self._journal.close()
+        self._purchases.close()
+
+    def _mark_dirty(self, file_path: str) -> None:
+        if file_path in (config.PRODUCTS_FILE, config.ACCOUNTS_FILE):
+            self._catalog_changes += 1
+        self._writer.mark_dirty(file_path)
+
+    def _catalog_source(self) -> Any:
+        return self._catalog_changes
+
+    def _flush_file(self, file_path: str) -> None:
+        """Ghi nội dung hiện tại của một file dữ liệu xuống đĩa"""
+        with self._lock:
+            if file_path == config.USERS_FILE and self._journal is not None:
+                self._compact_journal()
+                return
+            if file_path == config.USERS_FILE:
+                data = self._user_dicts()
+            elif file_path == config.PRODUCTS_FILE:
+                data = [product.to_dict() for product in self._products.values()] + self._invalid_products
+            elif file_path == config.ACCOUNTS_FILE:
+                data = self._accounts.to_dicts()
+            elif file_path == config.SETTINGS_FILE:
+                data = self._settings
+            elif file_path == config.STATS_FILE:
+                data = self._stats.to_dict()
+            else:
+                return
+            self._write_data(file_path, data)
+
+    def _user_dicts(self) -> List[Any]:
+        """Nội dung users.json: người dùng hiện tại và các bản ghi không hợp lệ giữ nguyên (gọi khi đang giữ khóa)"""
+        return [user.to_dict() for user in self._users.values()] + self._invalid_users
+
+    # === Nhật ký thay đổi người dùng ===
+    def _log_user_change(self, op: str, user_id: int, fields: Dict) -> int:
+        """Ghi nhận thay đổi người dùng (gọi khi đang giữ khóa), trả về số thứ tự nhật ký"""
+        if self._journal is None:
+            self._mark_dirty(config.USERS_FILE)
+            return 0
+        return self._journal.write(op, user_id, fields)
+
+    def _sync_user_change(self, seq: int, wait: bool = True) -> None:
+        """Chờ bản ghi nhật ký bền vững (gọi sau khi nhả khóa) và gộp nhật ký khi cần"""
+        if self._journal is None:
+            return
+        if wait:
+            self._journal.wait(seq)
+        if self._journal.size > config.JOURNAL_COMPACT_BYTES:
+            self._mark_dirty(config.USERS_FILE)
+
+    def _compact_journal(self) -> None:
+        """Gộp nhật ký vào users.json rồi xóa nhật ký (gọi khi đang giữ khóa)"""
+        with data_lock:
+            try:
+                self._replace_file(config.USERS_FILE, self._user_dicts())
+            except Exception as e:
+                # Giữ nguyên nhật ký, lần gộp sau sẽ thử lại
+                logger.error(f"Error compacting {config.USERS_JOURNAL_FILE} into {config.USERS_FILE}: {e}", exc_info=True)
+                return
+            self._journal.reset()
+
+    # === User methods ===
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Lấy thông tin người dùng theo ID"""
+        with self._lock:
+            user = self._users.get(user_id)
+            return user.to_dict() if user is not None else None
+
+    def add_user(self, user_data: Dict) -> bool:
+        """Thêm người dùng mới"""
+        with self._lock:
+            user = User.from_dict(user_data)
+            if user.id in self._users:
+                logger.warning(f"User already exists with ID: {user.id}")
+                return False
+
+            self._users[user.id] = user
+            self._user_index.add(user)
+            seq = self._log_user_change('add', user.id, user.to_dict())
+            self._stats.add_user(user)
+            self._mark_dirty(config.STATS_FILE)
+
+        self._sync_user_change(seq)
+        return True
+
+    def update_user(self, user_id: int, update_data: Dict) -> bool:
+        """Cập nhật thông tin người dùng"""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                logger.warning(f"User with ID {user_id} not found")
+                return False
+
+            # Kiểm tra trên bản ghi mới để giá trị sai không làm thay đổi một phần bản ghi hiện tại
+            try:
+                user = User.from_dict({**user.to_dict(), **update_data})
+            except ValueError as e:
+                logger.warning(f"Invalid update for user {user_id}: {e}")
+                return False
+            self._users[user_id] = user
+            if 'username' in update_data:
+                self._user_index.add(user)
+            seq = self._log_user_change('update', user_id, update_data)
+
+        self._sync_user_change(seq)
+        return True
+
+    def get_all_users(self) -> List[Dict]:
+        """Lấy danh sách tất cả người dùng"""
+        with self._lock:
+            return [user.to_dict() for user in self._users.values()]
+
+    def get_users_page(self, offset: int = 0, limit: int = 10, search: str = '') -> Tuple[List[Dict], int]:
+        """Lấy một trang người dùng theo thứ tự username (có thể lọc theo từ khóa), trả về (người dùng, tổng số)"""
+        with self._lock:
+            if search:
+                user_ids, total = self._user_index.search(search, offset, limit)
+            else:
+                user_ids, total = self._user_index.page(offset, limit), len(self._user_index)
+            return [self._users[user_id].to_dict() for user_id in user_ids], total
+
+    def ban_user(self, user_id: int) -> bool:
+        """Cấm người dùng"""
+        return self.update_user(user_id, {'banned': True})
+
+    def unban_user(self, user_id: int) -> bool:
+        """Bỏ cấm người dùng"""
+        return self.update_user(user_id, {'banned': False})
+
+    def get_banned_user_ids(self) -> List[int]:
+        """Lấy ID của tất cả người dùng bị cấm"""
+        with self._lock:
+            return [user_id for user_id, user in self._users.items() if user.banned]
+
+    def add_money(self, user_id: int, amount: float) -> bool:
+        """Thêm tiền cho người dùng"""
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return False
+
+            user.balance += amount
+            seq = self._log_user_change('update', user_id, {'balance': user.balance})
+
+        self._sync_user_change(seq)
+        return True
+
+    # === Product methods ===
+    def get_product(self, product_id: int) -> Optional[Dict]:
+        """Lấy thông tin sản phẩm theo ID"""
+        with self._lock:
+            product = self._products.get(product_id)
+            return product.to_dict() if product is not None else None
+
+    def get_all_products(self) -> List[Dict]:
+        """Lấy danh sách tất cả sản phẩm"""
+        with self._lock:
+            return [product.to_dict() for product in self._products.values()]
+
+    def create_product(self, product_data: Dict) -> int:
+        """Tạo sản phẩm mới hoặc cập nhật sản phẩm hiện có"""
+        # Đảm bảo các trường cần thiết
+        if 'name' not in product_data or 'price' not in product_data:
+            raise ValueError("Sản phẩm phải có tên và giá")
+
+        # Thêm trường is_free dựa trên giá
+        product_data['is_free'] = product_data['price'] <= 0
+
+        # Nếu không có mô tả, thêm mô tả mặc định
+        if 'description' not in product_data:
+            product_data['description'] = f"Sản phẩm: {product_data['name']}"
+
+        with self._lock:
+            # Nếu có ID và sản phẩm tồn tại, cập nhật
+            if 'id' in product_data and product_data['id'] in self._products:
+                # Giữ lại các trường khác nếu không được cung cấp
+                for key, value in self._products[product_data['id']].to_dict().items():
+                    product_data.setdefault(key, value)
+
+            # Tạo ID mới nếu không có
+            if 'id' not in product_data:
+                product_data['id'] = max(self._products, default=0) + 1
+
+            self._products[product_data['id']] = Product.from_dict(product_data)
+            self._mark_dirty(config.PRODUCTS_FILE)
+            return product_data['id']
+
+    def delete_product(self, product_id: int) -> bool:
+        """Xóa sản phẩm"""
+        with self._lock:
+            if self._products.pop(product_id, None) is None:
+                return False
+
+            self._mark_dirty(config.PRODUCTS_FILE)
+            return True
+
+    # === Account methods ===
+    def _rebuild_account_queues(self) -> None:
+        """Xây dựng lại hàng đợi tài khoản chưa bán và bộ đếm tồn kho cho từng sản phẩm"""
+        self._unsold = {}
+        self._stock = {}
+        self._by_data = {}
+        self._duplicate_data = {}
+        accounts = self._accounts
+        for index, (product_id, data, sold) in enumerate(zip(accounts.product_ids, accounts.data, accounts.sold)):
+            self._index_account_data(data, index)
+            if not sold:
+                self._unsold.setdefault(product_id, deque()).append(index)
+                self._stock[product_id] = self._stock.get(product_id, 0) + 1
+
+    def _index_account_data(self, data: str, index: int) -> None:
+        if data in self._by_data:
+            self._duplicate_data.setdefault(data, []).append(index)
+        else:
+            self._by_data[data] = index
+
+    def _account_indexes(self, data: str) -> List[int]:
+        """Vị trí các tài khoản có nội dung ``data`` (thường chỉ có một)"""
+        index = self._by_data.get(data)
+        if index is None:
+            return []
+        return [index] + self._duplicate_data.get(data, [])
+
+    def get_accounts(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả tài khoản"""
+        with self._lock:
+            return self._accounts.to_dicts()
+
+    def save_accounts(self, accounts: List[Dict[str, Any]]) -> None:
+        """Lưu danh sách tài khoản"""
+        with self._lock:
+            self._accounts = AccountTable(accounts)
+            self._rebuild_account_queues()
+            self._mark_dirty(config.ACCOUNTS_FILE)
+
+    def import_accounts(self, product_id: int, accounts: List[str]) -> Dict[str, Any]:
+        """Thêm tài khoản cho sản phẩm, bỏ qua tài khoản trùng"""
+        with self._lock:
+            accounts, duplicates = split_duplicate_accounts(accounts, self._by_data.__contains__)
+
+            queue = self._unsold.setdefault(product_id, deque())
+            for account in accounts:
+                index = self._accounts.append(product_id, account)
+                queue.append(index)
+                self._by_data[account] = index
+
+            if accounts:
+                self._stock[product_id] = self._stock.get(product_id, 0) + len(accounts)
+                self._mark_dirty(config.ACCOUNTS_FILE)
+            return {'added': len(accounts), 'duplicates': duplicates}
+
+    def _next_available_index(self, product_id: int) -> Optional[int]:
+        """Vị trí tài khoản chưa bán đầu tiên của sản phẩm (gọi khi đang giữ khóa)"""
+        queue = self._unsold.get(product_id)
+        while queue:
+            # Bỏ qua tài khoản đã bị đánh dấu bán bằng mark_account_sold
+            if not self._accounts.sold[queue[0]]:
+                return queue[0]
+            queue.popleft()
+        return None
+
+    def _sell_next_account(self, product_id: int) -> Dict:
+        """Đánh dấu đã bán tài khoản trả về bởi _next_available_index (gọi khi đang giữ khóa)"""
+        index = self._unsold[product_id].popleft()
+        self._accounts.sold[index] = 1
+        self._stock[product_id] -= 1
+        self._mark_dirty(config.ACCOUNTS_FILE)
+        return self._accounts.get(index)
+
+    def get_available_account(self, product_id: int) -> Optional[Dict]:
+        """Lấy một tài khoản chưa bán của sản phẩm"""
+        with self._lock:
+            if self._next_available_index(product_id) is None:
+                return None
+            return self._sell_next_account(product_id)
+
+    def count_available_accounts(self, product_id: int) -> int:
+        """Đếm số lượng tài khoản còn lại của sản phẩm"""
+        with self._lock:
+            return self._stock.get(product_id, 0)
+
+    def count_available_accounts_many(self, product_ids: List[int]) -> Dict[int, int]:
+        """Đếm số tài khoản còn lại của nhiều sản phẩm"""
+        with self._lock:
+            return {product_id: self._stock.get(product_id, 0) for product_id in product_ids}
+
+    def stock_snapshot(self) -> Dict[int, int]:
+        """Lấy số lượng tài khoản còn lại của tất cả sản phẩm"""
+        with self._lock:
+            return {product_id: count for product_id, count in self._stock.items() if count > 0}
+
+    def mark_account_sold(self, account_data: str) -> bool:
+        """Đánh dấu tài khoản đã bán"""
+        with self._lock:
+            for index in self._account_indexes(account_data):
+                if not self._accounts.sold[index]:
+                    self._accounts.sold[index] = 1
+                    self._stock[self._accounts.product_ids[index]] -= 1
+                    self._mark_dirty(config.ACCOUNTS_FILE)
+                    return True
+            return False
+
+    # === Purchase methods ===
+    def purchase(self, user_id: int, product_id: int) -> PurchaseResult:
+        """Mua một tài khoản: kiểm tra điều kiện, lấy tài khoản, trừ tiền và lưu lịch sử trong một bước.
+
+        Chỉ có một lần ghi bền vững (dòng lịch sử mua hàng); số dư và trạng thái tài
+        khoản được ghi sau và được khôi phục từ lịch sử nếu bị mất.
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            is_new_user = user is None
+            if is_new_user:
+                user = User.from_dict(new_purchase_user(user_id))
+
+            product = self._products.get(product_id)
+            index = self._next_available_index(product_id)
+            error = check_purchase(
+                user, product, 0 if index is None else 1,
+                bool(product and product.get('is_free', False)) and self._purchases.has_purchased(user_id, product_id)
+            )
+            if error:
+                return PurchaseResult.failed(error)
+
+            record = self._purchases.append(user_id, purchase_record(user, product, self._accounts.get(index)))
+            self._sell_next_account(product_id)
+            self._stats.add_purchase(record)
+            self._mark_dirty(config.STATS_FILE)
+
+            changes = {'balance': record['balance_after'], 'last_purchase_id': record['id']}
+            user.update(changes)
+            if is_new_user:
+                self._users[user_id] = user
+                self._user_index.add(user)
+                self._stats.add_user(user)
+                seq = self._log_user_change('add', user_id, user.to_dict())
+            else:
+                seq = self._log_user_change('update', user_id, changes)
+
+        # Không cần chờ nhật ký: lịch sử mua hàng đã đủ để khôi phục số dư
+        self._sync_user_change(seq, wait=False)
+        return PurchaseResult(True, purchase=record, new_balance=record['balance_after'])
+
+    def add_purchase(self, user_id: int, purchase_data: Dict) -> Dict:
+        """Lưu một lần mua hàng, trả về bản ghi đã lưu (có id)"""
+        with self._lock:
+            record = self._purchases.append(user_id, purchase_data)
+            self._stats.add_purchase(record)
+            self._mark_dirty(config.STATS_FILE)
+            return record
+
+    def get_user_purchases(self, user_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy lịch sử mua hàng của người dùng theo thứ tự thời gian (có phân trang)"""
+        return self._purchases.for_user(user_id, offset, limit)
+
+    def count_user_purchases(self, user_id: int) -> int:
+        """Đếm số lần mua của người dùng"""
+        return self._purchases.count_for_user(user_id)
+
+    def get_product_purchases(self, product_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy các lần mua của một sản phẩm (có phân trang)"""
+        return self._purchases.for_product(product_id, offset, limit)
+
+    def has_purchased(self, user_id: int, product_id: int) -> bool:
+        """Kiểm tra người dùng đã từng mua/nhận sản phẩm chưa"""
+        return self._purchases.has_purchased(user_id, product_id)
+
+    def get_all_purchases(self) -> List[Dict]:
+        """Lấy toàn bộ lịch sử mua hàng"""
+        return self._purchases.all()
+
+    def _revenue_rollup(self) -> RevenueRollup:
+        """Bảng tổng hợp doanh thu theo thời gian (cộng thêm ở mỗi lần mua, lưu cùng thống kê)"""
+        with self._lock:
+            return self._stats.rollup
+
+    # === Statistics methods ===
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """Tính lại toàn bộ thống kê từ người dùng và lịch sử mua hàng"""
+        with self._lock:
+            self._stats = StatsAggregate.rebuild(self._users.values(), self._purchases.all())
+            self._mark_dirty(config.STATS_FILE)
+            return self._stats.summary()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Lấy thống kê hệ thống (tổng người dùng, người dùng mới hôm nay, đơn hàng, doanh thu)"""
+        with self._lock:
+            return self._stats.summary()
+
+    # === Settings methods ===
+    def get_settings(self) -> Dict:
+        """Lấy tất cả cài đặt"""
+        with self._lock:
+            if self._settings is None:
+                self._settings = super().get_settings()
+            return dict(self._settings)
+
+    def update_setting(self, key: str, value: Any) -> None:
+        """Cập nhật một cài đặt"""
+        with self._lock:
+            if self._settings is None:
+                self._settings = super().get_settings()
+            self._settings[key] = value
+            self._mark_dirty(config.SETTINGS_FILE)
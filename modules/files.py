@@ -34,7 +34,20 @@ class FileManager:
         
         # Lưu trạng thái người dùng
         self.user_states = {}
-    
+
+    def register_callbacks(self, router) -> None:
+        """Đăng ký các nút của module vào bảng định tuyến callback (router.CallbackRouter)"""
+        actions = {
+            "download_files": self.show_download_menu,
+            "file_list": self.show_file_list,
+            "search_file": self.search_file,
+            "popular_files": self.show_popular_files,
+            "newest_files": self.show_newest_files,
+            "download_from_url": self.download_from_url
+        }
+        for name, action in actions.items():
+            router.add(name, lambda bot, call, ctx, action=action: action(call.message.chat.id, call.message.message_id))
+
     def show_download_menu(self, chat_id: int, message_id: int) -> None:
         """Hiển thị menu tải file"""
         self.bot.edit_message_text(
@@ -130,8 +143,7 @@ class FileManager:
         url = message.text.strip()
         
         # Xóa trạng thái người dùng
-        if chat_id in self.user_states:
-            del self.user_states[chat_id]
+        self.user_states.pop(chat_id, None)
         
         # Gửi thông báo đang xử lý
         try:
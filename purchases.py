@@ -0,0 +1,319 @@
+import datetime
+import json
+import logging
+import os
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+import config
+import jsoncodec
+from records import Purchase
+
+logger = logging.getLogger(__name__)
+
+def extract_embedded_purchases(users: List[Dict]) -> List[Dict]:
+    """Tách lịch sử mua hàng nằm trong bản ghi người dùng (định dạng cũ).
+
+    Xóa trường ``purchases`` khỏi từng người dùng và trả về danh sách bản ghi
+    mua hàng đã gắn ``user_id``, theo thứ tự thời gian mua.
+    """
+    purchases = []
+    for user in users:
+        for purchase in user.pop('purchases', None) or []:
+            purchases.append({'user_id': user.get('id'), **purchase})
+    purchases.sort(key=lambda purchase: str(purchase.get('timestamp') or ''))
+    return purchases
+
+
+def purchase_key(purchase: Dict) -> Tuple:
+    """Khóa nhận diện một lần mua, dùng để tránh nhập trùng khi chuyển dữ liệu"""
+    return (purchase.get('user_id'), purchase.get('product_id'),
+            purchase.get('account_data'), purchase.get('timestamp'))
+
+
+def scan_purchase_file(file_path: str, offset: int = 0) -> Tuple[List[Dict], int]:
+    """Đọc file lịch sử mua hàng (JSONL) từ vị trí ``offset``, trả về các bản ghi hợp lệ và vị trí kết thúc của chúng"""
+    records = []
+    good_offset = offset
+    if not os.path.exists(file_path):
+        return records, good_offset
+
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                records.append(jsoncodec.decode(line))
+            except ValueError:
+                # Dòng cuối bị ghi dở
+                break
+            good_offset += len(line)
+    return records, good_offset
+
+
+def read_purchase_file(file_path: str) -> List[Dict]:
+    """Đọc toàn bộ file lịch sử mua hàng (JSONL), bỏ qua dòng bị ghi dở"""
+    return scan_purchase_file(file_path)[0]
+
+
+def page(records: List[Any], offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+    """Lấy một trang bản ghi (dict hoặc ``Record``) theo offset/limit, trả về bản sao dạng dict"""
+    end = None if limit is None else offset + limit
+    return [record.to_dict() if hasattr(record, 'to_dict') else dict(record) for record in records[offset:end]]
+
+
+class PurchaseResult:
+    """Kết quả của một lần mua hàng (``Database.purchase``)"""
+
+    def __init__(self, success: bool, message: str = '', purchase: Optional[Dict] = None,
+                 new_balance: float = 0):
+        self.success = success
+        self.message = message
+        self.purchase = purchase or {}
+        self.new_balance = new_balance
+
+    @classmethod
+    def failed(cls, message: str) -> 'PurchaseResult':
+        return cls(False, message)
+
+    @property
+    def product_name(self) -> str:
+        return self.purchase.get('product_name', 'Unknown')
+
+    @property
+    def price(self) -> float:
+        return self.purchase.get('price', 0)
+
+    @property
+    def account_info(self) -> str:
+        return self.purchase.get('account_data', '')
+
+    def __bool__(self) -> bool:
+        return self.success
+
+
+def new_purchase_user(user_id: int) -> Dict:
+    """Bản ghi người dùng mặc định khi mua hàng mà chưa có tài khoản"""
+    return {
+        'id': user_id,
+        'balance': 0,
+        'banned': False
+    }
+
+
+def check_purchase(user: Dict, product: Optional[Dict], available: int, already_claimed: bool) -> Optional[str]:
+    """Kiểm tra điều kiện mua hàng, trả về thông báo lỗi hoặc None nếu hợp lệ"""
+    if not product:
+        return 'Sản phẩm không tồn tại.'
+
+    # Kiểm tra số lượng tài khoản còn lại
+    if available <= 0:
+        return 'Sản phẩm đã hết hàng.'
+
+    # Sản phẩm miễn phí, mỗi người dùng chỉ được nhận 1 lần
+    if product.get('is_free', False) and already_claimed:
+        return 'Bạn đã nhận sản phẩm miễn phí này rồi. Mỗi người chỉ được nhận 1 lần.'
+
+    # Kiểm tra số dư
+    user_balance = user.get('balance', 0)
+    product_price = product.get('price', 0)
+    if product_price > 0 and user_balance < product_price:
+        return f'Số dư không đủ. Bạn cần thêm {product_price - user_balance:,} {config.CURRENCY}.'
+
+    return None
+
+
+def purchase_record(user: Dict, product: Dict, account: Dict) -> Dict:
+    """Tạo bản ghi mua hàng; ``balance_after`` cho phép khôi phục số dư sau sự cố"""
+    product_price = product.get('price', 0)
+    balance = user.get('balance', 0)
+    return {
+        'product_id': product.get('id'),
+        'product_name': product.get('name', 'Unknown'),
+        'price': product_price,
+        'account_data': account.get('data', ''),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'balance_after': balance - product_price if product_price > 0 else balance
+    }
+
+
+def recover_purchases(users: Dict[Any, Dict], accounts: List[Dict], purchases: Iterable[Dict]) -> Tuple[bool, bool]:
+    """Áp dụng lại các lần mua đã có trong lịch sử nhưng chưa kịp ghi vào người dùng/tài khoản.
+
+    Lịch sử mua hàng là bản ghi bền vững duy nhất của một lần mua; số dư và trạng
+    thái tài khoản được ghi sau. Trả về (users_changed, accounts_changed).
+    """
+    users_changed = False
+    purchased: Dict[Tuple, int] = {}
+    for purchase in purchases:
+        # Chỉ các bản ghi tạo bởi Database.purchase mới có balance_after
+        if 'balance_after' not in purchase:
+            continue
+        key = (purchase.get('product_id'), purchase.get('account_data'))
+        purchased[key] = purchased.get(key, 0) + 1
+
+        user = users.get(purchase.get('user_id'))
+        if user is None:
+            user = new_purchase_user(purchase.get('user_id'))
+            users[user['id']] = user
+        if purchase.get('id', 0) > user.get('last_purchase_id', 0):
+            user['balance'] = purchase['balance_after']
+            user['last_purchase_id'] = purchase['id']
+            users_changed = True
+
+    # Mỗi lần mua phải tương ứng với một tài khoản đã bán
+    accounts_changed = False
+    if purchased:
+        sold: Dict[Tuple, int] = {}
+        unsold: Dict[Tuple, List[Dict]] = {}
+        for account in accounts:
+            key = (account.get('product_id'), account.get('data'))
+            if key not in purchased:
+                continue
+            if account.get('sold', False):
+                sold[key] = sold.get(key, 0) + 1
+            else:
+                unsold.setdefault(key, []).append(account)
+
+        for key, count in purchased.items():
+            for account in unsold.get(key, [])[:max(count - sold.get(key, 0), 0)]:
+                account['sold'] = True
+                accounts_changed = True
+
+    return users_changed, accounts_changed
+
+
+class PurchaseLog:
+    """Kho lịch sử mua hàng dạng file ghi thêm (JSONL).
+
+    Toàn bộ bản ghi được nạp một lần khi khởi tạo (dạng ``Purchase`` gọn) và lập
+    chỉ mục theo ``id``, ``user_id`` và ``product_id``. Mỗi lần mua chỉ ghi thêm một
+    dòng vào file; các phương thức đọc trả về dict. Dòng không hợp lệ được giữ
+    nguyên trong file nhưng không được lập chỉ mục; id của chúng không bị cấp lại.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._records: List[Purchase] = []
+        # id lớn nhất tính tới từng vị trí trong _records (không giảm), dùng để tìm theo id
+        self._ids: List[int] = []
+        # id sẽ cấp cho lần mua tiếp theo (lớn hơn mọi id trong file, kể cả dòng không hợp lệ)
+        self._next_id = 1
+        self._by_user: Dict[Any, List[Purchase]] = {}
+        self._by_product: Dict[Any, List[Purchase]] = {}
+        self._user_products: Set[Tuple] = set()
+        self._keys: Set[Tuple] = set()
+
+        records, good_offset = scan_purchase_file(file_path)
+        for record in records:
+            try:
+                self._index(Purchase.from_dict(record))
+            except (AttributeError, ValueError) as e:
+                logger.warning(f"Ignoring invalid purchase record (kept in {file_path}): {record!r}: {e}")
+                self._reserve_id(record)
+
+        self._file = open(file_path, 'a', encoding='utf-8')
+        # Cắt bỏ dòng cuối bị ghi dở (nếu có) để bản ghi mới nối tiếp đúng chỗ
+        if good_offset < self._file.tell():
+            self._file.truncate(good_offset)
+
+    def _reserve_id(self, record: Any) -> None:
+        """Không cấp lại id của một dòng trong file"""
+        record_id = record.get('id') if isinstance(record, dict) else None
+        if isinstance(record_id, int) and not isinstance(record_id, bool):
+            self._next_id = max(self._next_id, record_id + 1)
+
+    def _index(self, record: Purchase) -> None:
+        self._records.append(record)
+        self._ids.append(max(record.id or 0, self._ids[-1] if self._ids else 0))
+        self._next_id = max(self._next_id, (record.id or 0) + 1)
+        self._by_user.setdefault(record.user_id, []).append(record)
+        self._by_product.setdefault(record.product_id, []).append(record)
+        self._user_products.add((record.user_id, record.product_id))
+        self._keys.add(purchase_key(record))
+
+    def _write(self, records: List[Dict]) -> None:
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append(self, user_id: int, purchase_data: Dict) -> Dict:
+        """Ghi thêm một lần mua, trả về bản ghi đã lưu (có ``id``)"""
+        with self._lock:
+            data = {'id': self._next_id, 'user_id': user_id}
+            data.update((k, v) for k, v in purchase_data.items() if k not in ('id', 'user_id'))
+            record = Purchase.from_dict(data)
+            self._write([record.to_dict()])
+            self._index(record)
+            return record.to_dict()
+
+    def import_purchases(self, purchases: List[Dict]) -> int:
+        """Nhập nhiều bản ghi (ví dụ khi chuyển từ định dạng cũ), bỏ qua bản ghi trùng.
+
+        Bản ghi không hợp lệ vẫn được ghi vào file (kèm id) để không bị mất, nhưng không được lập chỉ mục.
+        """
+        with self._lock:
+            lines = []
+            new_records = []
+            for purchase in purchases:
+                if purchase_key(purchase) in self._keys:
+                    continue
+                data = dict(purchase, id=self._next_id + len(lines))
+                lines.append(data)
+                try:
+                    record = Purchase.from_dict(data)
+                except ValueError as e:
+                    logger.warning(f"Ignoring invalid purchase record (kept in {self.file_path}): {purchase!r}: {e}")
+                    continue
+                new_records.append(record)
+                self._keys.add(purchase_key(record))
+
+            if lines:
+                self._write(lines)
+                self._next_id += len(lines)
+                for record in new_records:
+                    self._index(record)
+            return len(new_records)
+
+    @property
+    def last_id(self) -> int:
+        """ID của lần mua cuối cùng"""
+        with self._lock:
+            return self._ids[-1] if self._ids else 0
+
+    def since(self, purchase_id: int) -> List[Dict]:
+        """Các lần mua có id lớn hơn ``purchase_id``"""
+        with self._lock:
+            return [record.to_dict() for record in self._records[bisect_right(self._ids, purchase_id):]]
+
+    def for_user(self, user_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy lịch sử mua hàng của người dùng theo thứ tự thời gian"""
+        with self._lock:
+            return page(self._by_user.get(user_id, []), offset, limit)
+
+    def count_for_user(self, user_id: int) -> int:
+        """Đếm số lần mua của người dùng"""
+        with self._lock:
+            return len(self._by_user.get(user_id, []))
+
+    def for_product(self, product_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy các lần mua của một sản phẩm"""
+        with self._lock:
+            return page(self._by_product.get(product_id, []), offset, limit)
+
+    def has_purchased(self, user_id: int, product_id: int) -> bool:
+        """Kiểm tra người dùng đã từng mua/nhận sản phẩm chưa"""
+        with self._lock:
+            return (user_id, product_id) in self._user_products
+
+    def all(self) -> List[Dict]:
+        """Lấy toàn bộ lịch sử mua hàng"""
+        with self._lock:
+            return [record.to_dict() for record in self._records]
+
+    def close(self) -> None:
+        """Đóng file"""
+        with self._lock:
+            self._file.close()
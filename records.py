@@ -0,0 +1,206 @@
+import logging
+from array import array
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Giá trị mặc định đánh dấu trường bắt buộc
+REQUIRED = object()
+
+
+def _as_int(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f"không phải số nguyên: {value!r}")
+    return value if isinstance(value, int) else int(value)
+
+
+def _as_number(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f"không phải số: {value!r}")
+    return value if isinstance(value, (int, float)) else float(value)
+
+
+def _as_text(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+class Record:
+    """Bản ghi gọn (``__slots__``) thay cho dict trong bộ nhớ.
+
+    ``FIELDS`` liệt kê (tên, hàm chuẩn hóa, giá trị mặc định) theo thứ tự khi
+    chuyển về dict; các khóa không khai báo được giữ nguyên trong ``extra``.
+    Trường có giá trị None được bỏ qua khi chuyển về dict. ``get`` cho phép
+    dùng bản ghi với các hàm nhận dict (check_purchase, UserIndex, ...).
+    """
+
+    __slots__ = ('extra',)
+    FIELDS: Tuple[Tuple[str, Callable[[Any], Any], Any], ...] = ()
+    NAMES: frozenset = frozenset()
+
+    @classmethod
+    def from_dict(cls: Type['R'], data: Dict[str, Any]) -> 'R':
+        """Tạo bản ghi từ dict: điền giá trị mặc định và kiểm tra kiểu (ValueError nếu không hợp lệ)"""
+        record = cls.__new__(cls)
+        for name, convert, default in cls.FIELDS:
+            value = data.get(name, default)
+            if value is REQUIRED:
+                raise ValueError(f"{cls.__name__} thiếu trường {name}")
+            try:
+                setattr(record, name, convert(value) if value is not None else None)
+            except (TypeError, ValueError):
+                raise ValueError(f"{cls.__name__}.{name} không hợp lệ: {value!r}")
+        extra = {key: value for key, value in data.items() if key not in cls.NAMES}
+        record.extra = extra or None
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for name, _, _ in self.FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.NAMES:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self.extra.get(key, default) if self.extra else default
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        """Cập nhật nhiều trường (kiểm tra kiểu như from_dict)"""
+        converters = {name: convert for name, convert, _ in self.FIELDS}
+        for key, value in fields.items():
+            if key in converters:
+                try:
+                    setattr(self, key, converters[key](value) if value is not None else None)
+                except (TypeError, ValueError):
+                    raise ValueError(f"{type(self).__name__}.{key} không hợp lệ: {value!r}")
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+R = TypeVar('R', bound=Record)
+
+
+def _record_class(cls: Type[R]) -> Type[R]:
+    cls.NAMES = frozenset(name for name, _, _ in cls.FIELDS)
+    return cls
+
+
+@_record_class
+class User(Record):
+    __slots__ = ('id', 'username', 'balance', 'banned', 'created_at', 'last_purchase_id')
+    FIELDS = (
+        ('id', _as_int, REQUIRED),
+        ('username', _as_text, None),
+        ('balance', _as_number, 0),
+        ('banned', bool, False),
+        ('created_at', _as_text, None),
+        ('last_purchase_id', _as_int, None)
+    )
+
+
+@_record_class
+class Product(Record):
+    __slots__ = ('id', 'name', 'price', 'description', 'is_free')
+    FIELDS = (
+        ('id', _as_int, REQUIRED),
+        ('name', _as_text, None),
+        ('price', _as_number, 0),
+        ('description', _as_text, None),
+        ('is_free', bool, None)
+    )
+
+
+@_record_class
+class Purchase(Record):
+    __slots__ = ('id', 'user_id', 'product_id', 'product_name', 'price', 'account_data', 'timestamp',
+                 'balance_after')
+    FIELDS = (
+        ('id', _as_int, None),
+        ('user_id', _as_int, REQUIRED),
+        ('product_id', _as_int, None),
+        ('product_name', _as_text, None),
+        ('price', _as_number, 0),
+        ('account_data', _as_text, None),
+        ('timestamp', _as_text, None),
+        ('balance_after', _as_number, None)
+    )
+
+
+def load_records(cls: Type[R], items: Iterable[Dict[str, Any]], label: str,
+                 unique: bool = False) -> Tuple[List[R], List[Any]]:
+    """Chuyển danh sách dict thành bản ghi, trả về (bản ghi, dữ liệu gốc của các phần tử không hợp lệ).
+
+    Phần tử không hợp lệ không được dùng nhưng phải được ghi lại nguyên vẹn khi lưu file.
+    Với ``unique``, phần tử thiếu id hoặc trùng id với một phần tử trước cũng bị coi là không hợp lệ.
+    """
+    records = []
+    invalid = []
+    seen = set()
+    for item in items:
+        try:
+            record = cls.from_dict(item)
+        except (AttributeError, ValueError) as e:
+            logger.warning(f"Keeping invalid {label} record unchanged: {item!r}: {e}")
+            invalid.append(item)
+            continue
+        if unique:
+            if record.id is None or record.id in seen:
+                logger.warning(f"Keeping {label} record with a missing or duplicate id unchanged: {item!r}")
+                invalid.append(item)
+                continue
+            seen.add(record.id)
+        records.append(record)
+    return records, invalid
+
+
+class AccountTable:
+    """Kho tài khoản dạng cột: mảng product_id, danh sách nội dung và mảng trạng thái đã bán.
+
+    Mỗi tài khoản chỉ tốn một phần tử trong mỗi cột thay vì một dict ba khóa;
+    tài khoản được xác định bằng vị trí (index) trong bảng. Các phần tử không hợp
+    lệ nằm riêng trong ``invalid`` và được ghi lại nguyên vẹn ở cuối ``to_dicts``.
+    """
+
+    __slots__ = ('product_ids', 'data', 'sold', 'invalid')
+
+    def __init__(self, accounts: Iterable[Dict[str, Any]] = ()):
+        self.product_ids = array('q')
+        self.data: List[str] = []
+        self.sold = bytearray()
+        self.invalid: List[Any] = []
+        for account in accounts:
+            try:
+                self.append(account['product_id'], account.get('data', ''), account.get('sold', False))
+            except (AttributeError, KeyError, TypeError, ValueError, OverflowError) as e:
+                logger.warning(f"Keeping invalid account record unchanged: {account!r}: {e}")
+                self.invalid.append(account)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def append(self, product_id: int, data: str, sold: bool = False) -> int:
+        """Thêm một tài khoản, trả về vị trí của nó"""
+        self.product_ids.append(_as_int(product_id))
+        self.data.append(_as_text(data))
+        self.sold.append(1 if sold else 0)
+        return len(self.data) - 1
+
+    def get(self, index: int) -> Dict[str, Any]:
+        """Tài khoản ở vị trí ``index`` dạng dict"""
+        return {'product_id': self.product_ids[index], 'data': self.data[index], 'sold': bool(self.sold[index])}
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [
+            {'product_id': product_id, 'data': data, 'sold': bool(sold)}
+            for product_id, data, sold in zip(self.product_ids, self.data, self.sold)
+        ] + list(self.invalid)
@@ -0,0 +1,66 @@
+"""Gửi lại các update đã ghi tới máy chủ webhook để thử trên máy.
+
+Mỗi file chứa một update (object JSON), một danh sách update hoặc mỗi dòng một
+update (JSON Lines). Các update được POST lần lượt kèm chuỗi bí mật trong cấu
+hình, giống như Telegram gửi. Ví dụ::
+
+    python bot.py                      # với config.UPDATE_MODE = "webhook"
+    python replay_updates.py updates.jsonl
+"""
+import argparse
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List
+import config
+import jsoncodec
+import webhook
+
+
+def read_updates(file_path: str) -> List[Dict[str, Any]]:
+    """Đọc các update từ một file JSON hoặc JSON Lines"""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    try:
+        data = jsoncodec.decode(content)
+    except ValueError:
+        return [jsoncodec.decode(line) for line in content.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def post_update(url: str, update: Dict[str, Any], secret_token: str = '') -> int:
+    """POST một update tới webhook, trả về mã HTTP"""
+    headers = {'Content-Type': 'application/json'}
+    if secret_token:
+        headers[webhook.SECRET_HEADER] = secret_token
+    request = urllib.request.Request(url, data=jsoncodec.encode(update), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    host = '127.0.0.1' if config.WEBHOOK_HOST in ('', '0.0.0.0') else config.WEBHOOK_HOST
+    scheme = 'https' if config.WEBHOOK_SSL_CERT else 'http'
+    parser = argparse.ArgumentParser(description="Gửi lại các update đã ghi tới máy chủ webhook")
+    parser.add_argument('files', nargs='+', help="File chứa update (JSON hoặc JSON Lines)")
+    parser.add_argument('--url', default=f"{scheme}://{host}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}",
+                        help="Địa chỉ máy chủ webhook")
+    parser.add_argument('--secret', default=config.WEBHOOK_SECRET_TOKEN, help="Chuỗi bí mật gửi kèm")
+    args = parser.parse_args()
+
+    sent = failed = 0
+    for file_path in args.files:
+        for update in read_updates(file_path):
+            status = post_update(args.url, update, args.secret)
+            if status == 200:
+                sent += 1
+            else:
+                failed += 1
+                print(f"Update {update.get('update_id')} bị từ chối: HTTP {status}")
+    print(f"Đã gửi {sent} update, lỗi {failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+from typing import Dict, Optional
+from storage import Storage
+
+# Tên thuộc tính gắn ngữ cảnh vào Message/CallbackQuery
+ATTRIBUTE = 'request_context'
+
+
+class RequestContext:
+    """Ngữ cảnh của một update: người gửi và bản ghi người dùng của họ.
+
+    Bản ghi được đọc từ Database nhiều nhất một lần cho mỗi update, dù handler
+    dùng ``ctx.user`` bao nhiêu lần. Sau khi ghi vào bản ghi của người gửi (mua
+    hàng, thêm tiền, ...) gọi ``invalidate()`` để lần đọc sau lấy dữ liệu mới.
+    """
+
+    __slots__ = ('db', 'user_id', 'username', '_user', '_loaded')
+
+    def __init__(self, db: Storage, user_id: int, username: Optional[str] = None):
+        self.db = db
+        self.user_id = user_id
+        self.username = username or f"user_{user_id}"
+        self._user: Optional[Dict] = None
+        self._loaded = False
+
+    @property
+    def user(self) -> Optional[Dict]:
+        """Bản ghi người dùng của người gửi (None nếu chưa đăng ký)"""
+        if not self._loaded:
+            self._user = self.db.get_user(self.user_id)
+            self._loaded = True
+        return self._user
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Bỏ bản ghi đã đọc (nếu truyền ``user_id`` thì chỉ khi đó là người gửi)"""
+        if user_id is None or user_id == self.user_id:
+            self._user = None
+            self._loaded = False
+
+
+def attach(db: Storage, update) -> RequestContext:
+    """Tạo ngữ cảnh cho một Message/CallbackQuery và gắn vào nó"""
+    ctx = RequestContext(db, update.from_user.id, update.from_user.username)
+    setattr(update, ATTRIBUTE, ctx)
+    return ctx
+
+
+def get_context(db: Storage, update) -> RequestContext:
+    """Ngữ cảnh đã được middleware gắn vào update (tạo mới nếu chưa có)"""
+    ctx = getattr(update, ATTRIBUTE, None)
+    return ctx if ctx is not None else attach(db, update)
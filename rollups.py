@@ -0,0 +1,197 @@
+import datetime
+import threading
+from array import array
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+# Số ô giữ lại cho mỗi mức thời gian: 14 ngày theo giờ, ~13 tháng theo ngày, 10 năm theo tháng
+ROLLUP_SIZES = {
+    'hour': 24 * 14,
+    'day': 400,
+    'month': 120
+}
+
+
+def bucket_of(moment: datetime.datetime, granularity: str) -> int:
+    """Số thứ tự ô thời gian chứa thời điểm ``moment``"""
+    if granularity == 'hour':
+        return moment.date().toordinal() * 24 + moment.hour
+    if granularity == 'day':
+        return moment.date().toordinal()
+    if granularity == 'month':
+        return moment.year * 12 + moment.month - 1
+    raise ValueError(f"Mức thời gian không hợp lệ: {granularity}")
+
+
+def bucket_range(granularity: str, periods: int, end: Optional[datetime.datetime] = None) -> Tuple[int, int]:
+    """Ô đầu và ô cuối (tính cả hai) của ``periods`` ô thời gian kết thúc tại ``end`` (mặc định: bây giờ)"""
+    last = bucket_of(end or datetime.datetime.now(), granularity)
+    return last - periods + 1, last
+
+
+def bucket_label(bucket: int, granularity: str) -> str:
+    """Nhãn hiển thị của một ô thời gian"""
+    if granularity == 'hour':
+        day = datetime.date.fromordinal(bucket // 24)
+        return f"{day.isoformat()} {bucket % 24:02d}:00"
+    if granularity == 'day':
+        return datetime.date.fromordinal(bucket).isoformat()
+    return f"{bucket // 12:04d}-{bucket % 12 + 1:02d}"
+
+
+class _RingSeries:
+    """Chuỗi số liệu kích thước cố định (vòng tròn) cho một sản phẩm ở một mức thời gian"""
+
+    __slots__ = ('size', 'latest', 'orders', 'revenue')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.latest: Optional[int] = None
+        self.orders = array('l', bytes(array('l').itemsize * size))
+        self.revenue = array('d', bytes(array('d').itemsize * size))
+
+    def add(self, bucket: int, price: float) -> None:
+        if self.latest is None:
+            self.latest = bucket
+        elif bucket > self.latest:
+            # Xóa các ô cũ sẽ bị dùng lại cho khoảng thời gian mới
+            for b in range(max(self.latest + 1, bucket - self.size + 1), bucket + 1):
+                self.orders[b % self.size] = 0
+                self.revenue[b % self.size] = 0.0
+            self.latest = bucket
+        elif bucket <= self.latest - self.size:
+            # Quá cũ so với khoảng đang lưu
+            return
+
+        slot = bucket % self.size
+        self.orders[slot] += 1
+        self.revenue[slot] += price
+
+    def range(self, start: int, end: int) -> Iterable[Tuple[int, int, float]]:
+        """Các ô trong khoảng [start, end] còn được lưu: (ô, số đơn, doanh thu)"""
+        if self.latest is None:
+            return
+        start = max(start, self.latest - self.size + 1)
+        end = min(end, self.latest)
+        for bucket in range(start, end + 1):
+            slot = bucket % self.size
+            yield bucket, self.orders[slot], self.revenue[slot]
+
+    def to_list(self) -> List[Any]:
+        """Dạng lưu trữ: [ô mới nhất, [[ô, số đơn, doanh thu], ...]] (chỉ các ô có đơn)"""
+        if self.latest is None:
+            return [None, []]
+        cells = self.range(self.latest - self.size + 1, self.latest)
+        return [self.latest, [[bucket, orders, revenue] for bucket, orders, revenue in cells if orders]]
+
+    @classmethod
+    def from_list(cls, size: int, data: List[Any]) -> '_RingSeries':
+        series = cls(size)
+        series.latest, cells = data
+        for bucket, orders, revenue in cells:
+            if series.latest - size < bucket <= series.latest:
+                series.orders[bucket % size] = orders
+                series.revenue[bucket % size] = revenue
+        return series
+
+
+class RevenueRollup:
+    """Doanh thu và số đơn theo giờ/ngày/tháng cho từng sản phẩm.
+
+    Mỗi lần mua được cộng vào các ô tương ứng; truy vấn theo khoảng thời gian
+    chỉ đọc các ô đã cộng sẵn, không duyệt lại lịch sử mua hàng. Được lưu cùng
+    thống kê (``StatsAggregate``) bằng ``to_dict``/``from_dict``.
+    """
+
+    def __init__(self, sizes: Optional[Dict[str, int]] = None):
+        self.sizes = dict(sizes or ROLLUP_SIZES)
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[Any, _RingSeries]] = {granularity: {} for granularity in self.sizes}
+        # ID lần mua cuối cùng đã được cộng
+        self.last_purchase_id = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], sizes: Optional[Dict[str, int]] = None) -> 'RevenueRollup':
+        """Đọc lại bảng tổng hợp đã lưu bằng ``to_dict``"""
+        rollup = cls(sizes)
+        rollup.last_purchase_id = data.get('last_purchase_id', 0)
+        for granularity, series_by_product in data.get('series', {}).items():
+            if granularity not in rollup._series:
+                continue
+            size = rollup.sizes[granularity]
+            for product_id, latest, cells in series_by_product:
+                rollup._series[granularity][product_id] = _RingSeries.from_list(size, [latest, cells])
+        return rollup
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'last_purchase_id': self.last_purchase_id,
+                'series': {
+                    granularity: [[product_id] + series.to_list() for product_id, series in series_by_product.items()]
+                    for granularity, series_by_product in self._series.items()
+                }
+            }
+
+    def add_purchase(self, purchase: Dict) -> None:
+        """Cộng một lần mua vào các ô thời gian (bỏ qua lần mua đã được tính)"""
+        purchase_id = purchase.get('id', 0)
+        try:
+            moment = datetime.datetime.fromisoformat(purchase.get('timestamp', ''))
+        except (TypeError, ValueError):
+            moment = None
+
+        with self._lock:
+            if purchase_id and purchase_id <= self.last_purchase_id:
+                return
+            self.last_purchase_id = max(self.last_purchase_id, purchase_id)
+            if moment is None:
+                return
+
+            product_id = purchase.get('product_id')
+            price = purchase.get('price', 0) or 0
+            for granularity, series_by_product in self._series.items():
+                series = series_by_product.get(product_id)
+                if series is None:
+                    series = series_by_product[product_id] = _RingSeries(self.sizes[granularity])
+                series.add(bucket_of(moment, granularity), price)
+
+    def add_purchases(self, purchases: Iterable[Dict]) -> None:
+        for purchase in purchases:
+            self.add_purchase(purchase)
+
+    def by_product(self, granularity: str = 'day', periods: int = 30,
+                   end: Optional[datetime.datetime] = None) -> Dict[Any, Dict[str, float]]:
+        """Tổng số đơn và doanh thu của từng sản phẩm trong ``periods`` ô gần nhất"""
+        start, last = bucket_range(granularity, periods, end)
+        result = {}
+        with self._lock:
+            for product_id, series in self._series[granularity].items():
+                orders = 0
+                revenue = 0.0
+                for _, bucket_orders, bucket_revenue in series.range(start, last):
+                    orders += bucket_orders
+                    revenue += bucket_revenue
+                if orders:
+                    result[product_id] = {'orders': orders, 'revenue': revenue}
+        return result
+
+    def series(self, product_id: Any = None, granularity: str = 'day', periods: int = 30,
+               end: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        """Số đơn và doanh thu theo từng ô thời gian (``product_id=None``: tất cả sản phẩm)"""
+        start, last = bucket_range(granularity, periods, end)
+        orders = [0] * periods
+        revenue = [0.0] * periods
+        with self._lock:
+            if product_id is None:
+                selected = list(self._series[granularity].values())
+            else:
+                selected = [s for s in (self._series[granularity].get(product_id),) if s is not None]
+            for series in selected:
+                for bucket, bucket_orders, bucket_revenue in series.range(start, last):
+                    orders[bucket - start] += bucket_orders
+                    revenue[bucket - start] += bucket_revenue
+
+        return [
+            {'period': bucket_label(start + i, granularity), 'orders': orders[i], 'revenue': revenue[i]}
+            for i in range(periods)
+        ]
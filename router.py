@@ -0,0 +1,111 @@
+import logging
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def admin_only(handler: Callable) -> Callable:
+    """Đánh dấu handler chỉ dành cho admin (router bỏ qua callback của người khác)"""
+    handler.admin_only = True
+    return handler
+
+
+class Route:
+    """Một callback đã đăng ký"""
+
+    __slots__ = ('name', 'handler', 'admin_only', 'int_arg')
+
+    def __init__(self, name: str, handler: Callable, int_arg: bool = False):
+        self.name = name
+        self.handler = handler
+        self.admin_only = getattr(handler, 'admin_only', False)
+        self.int_arg = int_arg
+
+
+class CallbackRouter:
+    """Bảng định tuyến callback_data tới handler.
+
+    Callback có tên cố định (``"balance"``) được tra bằng dict; callback có tiền
+    tố kèm tham số (``"view_product_12"``) được tra bằng cây tiền tố, chọn tiền
+    tố dài nhất khớp với dữ liệu. Phần còn lại sau tiền tố được đổi sang số
+    nguyên một lần trước khi gọi handler. Chi phí tra cứu chỉ phụ thuộc độ dài
+    callback_data, không phụ thuộc số callback đã đăng ký.
+
+    Handler có dạng ``handler(bot, call, ctx)`` hoặc
+    ``handler(bot, call, ctx, arg)`` với callback có tiền tố; ``ctx`` là
+    ``request_context.RequestContext`` của update.
+    """
+
+    # Khóa đánh dấu nút cây tiền tố có route (không trùng với một ký tự)
+    _ROUTE = ''
+
+    def __init__(self, is_admin: Callable[[int], bool]):
+        self._is_admin = is_admin
+        self._exact: Dict[str, Route] = {}
+        self._trie: Dict[str, Any] = {}
+
+    def add(self, name: str, handler: Callable) -> None:
+        """Đăng ký handler cho callback có tên cố định"""
+        self._exact[name] = Route(name, handler)
+
+    def add_prefix(self, prefix: str, handler: Callable, int_arg: bool = True) -> None:
+        """Đăng ký handler cho callback có tiền tố (tham số là số nguyên nếu ``int_arg``)"""
+        node = self._trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._ROUTE] = Route(prefix, handler, int_arg)
+
+    def exact(self, name: str) -> Callable[[Callable], Callable]:
+        """Decorator của ``add``"""
+        def decorator(handler: Callable) -> Callable:
+            self.add(name, handler)
+            return handler
+        return decorator
+
+    def prefix(self, prefix: str, int_arg: bool = True) -> Callable[[Callable], Callable]:
+        """Decorator của ``add_prefix``"""
+        def decorator(handler: Callable) -> Callable:
+            self.add_prefix(prefix, handler, int_arg)
+            return handler
+        return decorator
+
+    def resolve(self, data: str) -> Optional[Tuple[Route, Any]]:
+        """Tìm route và tham số cho callback_data (None nếu không có)"""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+
+        node = self._trie
+        match = None
+        for index, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._ROUTE in node:
+                match = (node[self._ROUTE], index + 1)
+        if match is None:
+            return None
+
+        route, end = match
+        arg = data[end:]
+        if route.int_arg:
+            try:
+                arg = int(arg)
+            except ValueError:
+                logger.warning(f"Invalid argument in callback data: {data}")
+                return None
+        return route, arg
+
+    def dispatch(self, bot, call, ctx) -> bool:
+        """Gọi handler của callback, trả về False nếu không có handler phù hợp"""
+        resolved = self.resolve(call.data or '')
+        if resolved is None:
+            return False
+        route, arg = resolved
+        if route.admin_only and not self._is_admin(call.from_user.id):
+            return False
+        if arg is None:
+            route.handler(bot, call, ctx)
+        else:
+            route.handler(bot, call, ctx, arg)
+        return True
@@ -0,0 +1,898 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+import config
+import jsoncodec
+from database import Database, split_duplicate_accounts
+from journal import apply_user_records, read_journal
+from purchases import (PurchaseResult, check_purchase, extract_embedded_purchases, new_purchase_user,
+                       purchase_key, purchase_record, read_purchase_file, recover_purchases)
+from rollups import bucket_label, bucket_range
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT,
+    balance NUMERIC NOT NULL DEFAULT 0,
+    banned INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (lower(coalesce(username, '')), id);
+
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    is_free INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    sold INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_accounts_product_sold ON accounts (product_id, sold);
+CREATE INDEX IF NOT EXISTS idx_accounts_data ON accounts (data);
+
+CREATE TABLE IF NOT EXISTS purchases (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    product_id INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_purchases_user ON purchases (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_purchases_product_user ON purchases (product_id, user_id);
+
+-- Thống kê cộng dồn, được cập nhật bằng trigger trong cùng giao dịch với thay đổi
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value NUMERIC NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS daily_users (
+    day TEXT PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_users_stats AFTER INSERT ON users BEGIN
+    INSERT INTO stats (key, value) VALUES ('total_users', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1;
+    INSERT INTO daily_users (day, total) SELECT substr(NEW.created_at, 1, 10), 1 WHERE NEW.created_at IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET total = total + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_purchases_stats AFTER INSERT ON purchases BEGIN
+    INSERT INTO stats (key, value) VALUES ('total_orders', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1;
+    INSERT INTO stats (key, value) VALUES ('revenue', COALESCE(json_extract(NEW.data, '$.price'), 0))
+        ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;
+END;
+
+-- Phiên bản danh mục: tăng mỗi khi sản phẩm hoặc tài khoản thay đổi (kể cả từ tiến trình khác)
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_products_insert_catalog AFTER INSERT ON products BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_update_catalog AFTER UPDATE ON products BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_delete_catalog AFTER DELETE ON products BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_insert_catalog AFTER INSERT ON accounts BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_update_catalog AFTER UPDATE OF product_id, sold ON accounts BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_accounts_delete_catalog AFTER DELETE ON accounts BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Số thứ tự ô thời gian của mốc {ts} theo từng mức (giống rollups.bucket_of); 1721424.5 là
+# julianday của ngày trước 0001-01-01, nên phần nguyên của hiệu là date.toordinal()
+ROLLUP_BUCKET_SQL = """CASE {granularity}
+    WHEN 'hour' THEN CAST(julianday(date({ts})) - 1721424.5 AS INTEGER) * 24 + CAST(strftime('%H', {ts}) AS INTEGER)
+    WHEN 'day' THEN CAST(julianday(date({ts})) - 1721424.5 AS INTEGER)
+    ELSE CAST(strftime('%Y', {ts}) AS INTEGER) * 12 + CAST(strftime('%m', {ts}) AS INTEGER) - 1
+END"""
+
+ROLLUP_GRANULARITIES_SQL = "SELECT 'hour' AS granularity UNION ALL SELECT 'day' UNION ALL SELECT 'month'"
+
+# Doanh thu theo giờ/ngày/tháng của từng sản phẩm, cộng bằng trigger trong cùng giao dịch với lần mua
+ROLLUP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS revenue_rollup (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    product_id INTEGER,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (granularity, bucket, product_id)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_purchases_rollup AFTER INSERT ON purchases
+WHEN julianday(json_extract(NEW.data, '$.timestamp')) IS NOT NULL BEGIN
+    INSERT INTO revenue_rollup (granularity, bucket, product_id, orders, revenue)
+        SELECT g.granularity, {ROLLUP_BUCKET_SQL.format(granularity='g.granularity', ts='t.ts')},
+            NEW.product_id, 1, COALESCE(json_extract(NEW.data, '$.price'), 0)
+        FROM (SELECT json_extract(NEW.data, '$.timestamp') AS ts) AS t, ({ROLLUP_GRANULARITIES_SQL}) AS g
+        WHERE true
+        ON CONFLICT(granularity, bucket, product_id)
+        DO UPDATE SET orders = orders + 1, revenue = revenue + excluded.revenue;
+END;
+"""
+
+# Chỉ mục tìm kiếm chuỗi con (trigram) theo username và ID, cần FTS5
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(username, uid, tokenize='trigram');
+
+CREATE TRIGGER IF NOT EXISTS trg_users_search_insert AFTER INSERT ON users BEGIN
+    INSERT INTO users_search (rowid, username, uid)
+        VALUES (NEW.id, lower(coalesce(NEW.username, '')), CAST(NEW.id AS TEXT));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_users_search_update AFTER UPDATE OF username ON users BEGIN
+    DELETE FROM users_search WHERE rowid = OLD.id;
+    INSERT INTO users_search (rowid, username, uid)
+        VALUES (NEW.id, lower(coalesce(NEW.username, '')), CAST(NEW.id AS TEXT));
+END;
+CREATE TRIGGER IF NOT EXISTS trg_users_search_delete AFTER DELETE ON users BEGIN
+    DELETE FROM users_search WHERE rowid = OLD.id;
+END;
+"""
+
+# Các trường người dùng được lưu thành cột riêng, phần còn lại nằm trong cột extra
+USER_COLUMNS = ('username', 'balance', 'banned', 'created_at')
+
+# PRAGMA user_version sau khi đã nhập xong dữ liệu từ các file JSON (ghi trong cùng giao dịch nhập)
+IMPORTED_VERSION = 1
+
+
+class SQLiteDatabase(Database):
+    """Database lưu trữ trên file SQLite (chế độ WAL) với chỉ mục thực sự.
+
+    Cung cấp cùng các phương thức như ``Database`` nên có thể thay thế trực tiếp
+    thông qua cấu hình ``DATABASE_BACKEND = "sqlite"``.
+    """
+
+    def __init__(self, db_file: Optional[str] = None):
+        self.db_file = db_file or config.SQLITE_DB_FILE
+        # Số bản ghi đã nhập từ các file JSON khi khởi tạo (None nếu không nhập)
+        self.import_counts: Optional[Dict[str, int]] = None
+
+        # Đảm bảo thư mục chứa file tồn tại
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+        self._conn.executescript(ROLLUP_SCHEMA)
+        self._has_search_index = self._init_search_index()
+
+        # Lần đầu chuyển sang SQLite (hoặc lần nhập trước bị lỗi): nhập dữ liệu từ các file JSON hiện có
+        if self._is_imported():
+            self._migrate_embedded_purchases()
+        else:
+            self.import_counts = self.import_json_data()
+
+        # File SQLite tạo trước khi có bảng thống kê hoặc bảng doanh thu: tính lại một lần
+        with self._lock:
+            has_stats = self._conn.execute("SELECT 1 FROM stats WHERE key = 'total_users'").fetchone()
+            missing_rollup = (self._conn.execute("SELECT 1 FROM purchases LIMIT 1").fetchone() is not None
+                              and self._conn.execute("SELECT 1 FROM revenue_rollup LIMIT 1").fetchone() is None)
+        if not has_stats or missing_rollup:
+            self.rebuild_statistics()
+
+    def _is_imported(self) -> bool:
+        """Kiểm tra dữ liệu JSON đã được nhập xong vào file SQLite chưa"""
+        with self._lock:
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] >= IMPORTED_VERSION:
+                return True
+
+            # File tạo trước khi có đánh dấu: một lần nhập lỗi không để lại dữ liệu (giao dịch bị hủy)
+            has_data = any(
+                self._conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+                for table in ('users', 'products', 'accounts', 'purchases', 'settings')
+            )
+            if has_data:
+                self._conn.execute(f"PRAGMA user_version = {IMPORTED_VERSION}")
+            return has_data
+
+    def _init_search_index(self) -> bool:
+        """Tạo chỉ mục tìm kiếm trigram nếu SQLite hỗ trợ FTS5, trả về True nếu dùng được"""
+        try:
+            self._conn.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 trigram is not available, user search will scan the table: {e}")
+            return False
+
+        # File SQLite tạo trước khi có chỉ mục tìm kiếm: lập chỉ mục lại toàn bộ
+        indexed = self._conn.execute("SELECT COUNT(*) AS total FROM users_search").fetchone()['total']
+        total = self._conn.execute("SELECT COUNT(*) AS total FROM users").fetchone()['total']
+        if indexed != total:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM users_search")
+                conn.execute(
+                    "INSERT INTO users_search (rowid, username, uid) "
+                    "SELECT id, lower(coalesce(username, '')), CAST(id AS TEXT) FROM users"
+                )
+        return True
+
+    def close(self) -> None:
+        """Đóng kết nối cơ sở dữ liệu"""
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    @property
+    def users(self) -> List[Dict]:
+        """Danh sách người dùng hiện tại (tương thích với Database)"""
+        return self.get_all_users()
+
+    def load_data(self):
+        """Không cần tải trước dữ liệu với SQLite"""
+        pass
+
+    def save_data(self):
+        """Dữ liệu SQLite được ghi ngay ở mỗi giao dịch"""
+        pass
+
+    # === Chuyển đổi bản ghi ===
+    @staticmethod
+    def _row_to_user(row: sqlite3.Row) -> Dict:
+        user = {'id': row['id']}
+        if row['username'] is not None:
+            user['username'] = row['username']
+        user['balance'] = row['balance']
+        user.update(json.loads(row['extra']))
+        user['banned'] = bool(row['banned'])
+        if row['created_at'] is not None:
+            user['created_at'] = row['created_at']
+        return user
+
+    @staticmethod
+    def _split_user(user_data: Dict) -> Dict:
+        """Tách dữ liệu người dùng thành các cột và phần extra"""
+        extra = {k: v for k, v in user_data.items() if k != 'id' and k not in USER_COLUMNS}
+        return {
+            'id': user_data['id'],
+            'username': user_data.get('username'),
+            'balance': user_data.get('balance', 0),
+            'banned': 1 if user_data.get('banned', False) else 0,
+            'created_at': user_data.get('created_at'),
+            'extra': json.dumps(extra, ensure_ascii=False)
+        }
+
+    @staticmethod
+    def _row_to_account(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'product_id': row['product_id'],
+            'data': row['data'],
+            'sold': bool(row['sold'])
+        }
+
+    # === User methods ===
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Lấy thông tin người dùng theo ID"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return self._row_to_user(row) if row else None
+
+    def add_user(self, user_data: Dict) -> bool:
+        """Thêm người dùng mới"""
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO users (id, username, balance, banned, created_at, extra) "
+                    "VALUES (:id, :username, :balance, :banned, :created_at, :extra)",
+                    self._split_user(user_data)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            logger.warning(f"User already exists with ID: {user_data['id']}")
+            return False
+
+    def update_user(self, user_id: int, update_data: Dict) -> bool:
+        """Cập nhật thông tin người dùng"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+            if not row:
+                logger.warning(f"User with ID {user_id} not found")
+                return False
+
+            user = self._row_to_user(row)
+            user.update(update_data)
+            conn.execute(
+                "UPDATE users SET username = :username, balance = :balance, banned = :banned, "
+                "created_at = :created_at, extra = :extra WHERE id = :id",
+                self._split_user(user)
+            )
+            return True
+
+    def get_all_users(self) -> List[Dict]:
+        """Lấy danh sách tất cả người dùng"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM users ORDER BY rowid").fetchall()
+        return [self._row_to_user(row) for row in rows]
+
+    def get_users_page(self, offset: int = 0, limit: int = 10, search: str = '') -> Tuple[List[Dict], int]:
+        """Lấy một trang người dùng theo thứ tự username (có thể lọc theo từ khóa), trả về (người dùng, tổng số)"""
+        where = ""
+        params: List[Any] = []
+        if search:
+            search = search.lower()
+            if self._has_search_index and len(search) >= 3:
+                # Chuỗi con dài từ 3 ký tự: tra chỉ mục trigram
+                where = "WHERE id IN (SELECT rowid FROM users_search WHERE users_search MATCH ?)"
+                params = ['"' + search.replace('"', '""') + '"']
+            else:
+                pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                where = (
+                    "WHERE lower(coalesce(username, '')) LIKE ? ESCAPE '\\' "
+                    "OR CAST(id AS TEXT) LIKE ? ESCAPE '\\'"
+                )
+                params = [pattern, pattern]
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) AS total FROM users {where}", params).fetchone()['total']
+            rows = self._conn.execute(
+                f"SELECT * FROM users {where} ORDER BY lower(coalesce(username, '')), id LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [self._row_to_user(row) for row in rows], total
+
+    def ban_user(self, user_id: int) -> bool:
+        """Cấm người dùng"""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE users SET banned = 1 WHERE id = ?", (user_id,)).rowcount > 0
+
+    def unban_user(self, user_id: int) -> bool:
+        """Bỏ cấm người dùng"""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE users SET banned = 0 WHERE id = ?", (user_id,)).rowcount > 0
+
+    def add_money(self, user_id: int, amount: float) -> bool:
+        """Thêm tiền cho người dùng"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE users SET balance = balance + ? WHERE id = ?", (amount, user_id)
+            ).rowcount > 0
+
+    def is_user_banned(self, user_id: int) -> bool:
+        """Kiểm tra xem người dùng có bị cấm không"""
+        with self._lock:
+            row = self._conn.execute("SELECT banned FROM users WHERE id = ?", (user_id,)).fetchone()
+        return bool(row and row['banned'])
+
+    def get_banned_user_ids(self) -> List[int]:
+        """Lấy ID của tất cả người dùng bị cấm"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM users WHERE banned = 1").fetchall()
+        return [row['id'] for row in rows]
+
+    # === Product methods ===
+    def get_product(self, product_id: int) -> Optional[Dict]:
+        """Lấy thông tin sản phẩm theo ID"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM products WHERE id = ?", (product_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def get_all_products(self) -> List[Dict]:
+        """Lấy danh sách tất cả sản phẩm"""
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM products ORDER BY rowid").fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def create_product(self, product_data: Dict) -> int:
+        """Tạo sản phẩm mới hoặc cập nhật sản phẩm hiện có"""
+        # Đảm bảo các trường cần thiết
+        if 'name' not in product_data or 'price' not in product_data:
+            raise ValueError("Sản phẩm phải có tên và giá")
+
+        # Thêm trường is_free dựa trên giá
+        product_data['is_free'] = product_data['price'] <= 0
+
+        # Nếu không có mô tả, thêm mô tả mặc định
+        if 'description' not in product_data:
+            product_data['description'] = f"Sản phẩm: {product_data['name']}"
+
+        with self._transaction() as conn:
+            if 'id' in product_data:
+                # Giữ lại các trường khác nếu không được cung cấp
+                row = conn.execute("SELECT data FROM products WHERE id = ?", (product_data['id'],)).fetchone()
+                if row:
+                    for key, value in json.loads(row['data']).items():
+                        product_data.setdefault(key, value)
+            else:
+                # Tạo ID mới
+                row = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM products").fetchone()
+                product_data['id'] = row['next_id']
+
+            conn.execute(
+                "INSERT INTO products (id, is_free, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET is_free = excluded.is_free, data = excluded.data",
+                (product_data['id'], 1 if product_data['is_free'] else 0,
+                 json.dumps(product_data, ensure_ascii=False))
+            )
+            return product_data['id']
+
+    def delete_product(self, product_id: int) -> bool:
+        """Xóa sản phẩm"""
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM products WHERE id = ?", (product_id,)).rowcount > 0
+
+    def _catalog_source(self) -> Any:
+        with self._lock:
+            return self._conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()['version']
+
+    # === Account methods ===
+    def get_accounts(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả tài khoản"""
+        with self._lock:
+            rows = self._conn.execute("SELECT product_id, data, sold FROM accounts ORDER BY id").fetchall()
+        return [self._row_to_account(row) for row in rows]
+
+    def save_accounts(self, accounts: List[Dict[str, Any]]) -> None:
+        """Lưu danh sách tài khoản"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM accounts")
+            conn.executemany(
+                "INSERT INTO accounts (product_id, data, sold) VALUES (?, ?, ?)",
+                [(a.get('product_id'), a.get('data', ''), 1 if a.get('sold', False) else 0) for a in accounts]
+            )
+
+    def import_accounts(self, product_id: int, accounts: List[str]) -> Dict[str, Any]:
+        """Thêm tài khoản cho sản phẩm, bỏ qua tài khoản trùng"""
+        with self._transaction() as conn:
+            # Tra cứu qua chỉ mục idx_accounts_data
+            def exists(account: str) -> bool:
+                return conn.execute("SELECT 1 FROM accounts WHERE data = ? LIMIT 1", (account,)).fetchone() is not None
+
+            accounts, duplicates = split_duplicate_accounts(accounts, exists)
+            conn.executemany(
+                "INSERT INTO accounts (product_id, data, sold) VALUES (?, ?, 0)",
+                [(product_id, account) for account in accounts]
+            )
+        return {'added': len(accounts), 'duplicates': duplicates}
+
+    def get_available_account(self, product_id: int) -> Optional[Dict]:
+        """Lấy một tài khoản chưa bán của sản phẩm"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, product_id, data, sold FROM accounts "
+                "WHERE product_id = ? AND sold = 0 ORDER BY id LIMIT 1",
+                (product_id,)
+            ).fetchone()
+            if not row:
+                return None
+
+            # Đánh dấu tài khoản đã bán
+            conn.execute("UPDATE accounts SET sold = 1 WHERE id = ?", (row['id'],))
+            account = self._row_to_account(row)
+            account['sold'] = True
+            return account
+
+    def count_available_accounts(self, product_id: int) -> int:
+        """Đếm số lượng tài khoản còn lại của sản phẩm"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS total FROM accounts WHERE product_id = ? AND sold = 0", (product_id,)
+            ).fetchone()
+        return row['total']
+
+    def count_available_accounts_many(self, product_ids: List[int]) -> Dict[int, int]:
+        """Đếm số tài khoản còn lại của nhiều sản phẩm trong một truy vấn"""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+
+        placeholders = ", ".join("?" for _ in product_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT product_id, COUNT(*) AS total FROM accounts "
+                f"WHERE sold = 0 AND product_id IN ({placeholders}) GROUP BY product_id",
+                product_ids
+            ).fetchall()
+        counts = {product_id: 0 for product_id in product_ids}
+        counts.update({row['product_id']: row['total'] for row in rows})
+        return counts
+
+    def stock_snapshot(self) -> Dict[int, int]:
+        """Lấy số lượng tài khoản còn lại của tất cả sản phẩm"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT product_id, COUNT(*) AS total FROM accounts WHERE sold = 0 GROUP BY product_id"
+            ).fetchall()
+        return {row['product_id']: row['total'] for row in rows}
+
+    def mark_account_sold(self, account_data: str) -> bool:
+        """Đánh dấu tài khoản đã bán"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM accounts WHERE data = ? AND sold = 0 ORDER BY id LIMIT 1", (account_data,)
+            ).fetchone()
+            if not row:
+                return False
+
+            conn.execute("UPDATE accounts SET sold = 1 WHERE id = ?", (row['id'],))
+            return True
+
+    # === Purchase methods ===
+    @staticmethod
+    def _row_to_purchase(row: sqlite3.Row) -> Dict:
+        purchase = {'id': row['id'], 'user_id': row['user_id']}
+        purchase.update(json.loads(row['data']))
+        return purchase
+
+    @staticmethod
+    def _purchase_params(purchase: Dict) -> tuple:
+        """Tham số INSERT của một lần mua: giữ id gốc nếu có, nếu không SQLite tự cấp id mới"""
+        purchase_id = purchase.get('id')
+        if not isinstance(purchase_id, int) or isinstance(purchase_id, bool):
+            purchase_id = None
+        data = {k: v for k, v in purchase.items() if k not in ('id', 'user_id')}
+        return (purchase_id, purchase.get('user_id'), purchase.get('product_id'), json.dumps(data, ensure_ascii=False))
+
+    def _migrate_embedded_purchases(self) -> None:
+        """Chuyển lịch sử mua hàng nằm trong cột extra của người dùng sang bảng purchases"""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT * FROM users WHERE json_extract(extra, '$.purchases') IS NOT NULL"
+            ).fetchall()
+            if not rows:
+                return
+
+            users = [self._row_to_user(row) for row in rows]
+            purchases = extract_embedded_purchases(users)
+            conn.executemany(
+                "INSERT INTO purchases (id, user_id, product_id, data) VALUES (?, ?, ?, ?)",
+                [self._purchase_params(purchase) for purchase in purchases]
+            )
+            conn.executemany(
+                "UPDATE users SET extra = :extra WHERE id = :id",
+                [self._split_user(user) for user in users]
+            )
+        logger.info(f"Migrated {len(purchases)} purchases to table purchases")
+
+    def purchase(self, user_id: int, product_id: int) -> PurchaseResult:
+        """Mua một tài khoản: kiểm tra điều kiện, lấy tài khoản, trừ tiền và lưu lịch sử trong một giao dịch"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+            user = self._row_to_user(row) if row else new_purchase_user(user_id)
+
+            row = conn.execute("SELECT data FROM products WHERE id = ?", (product_id,)).fetchone()
+            product = json.loads(row['data']) if row else None
+
+            account_row = conn.execute(
+                "SELECT id, product_id, data, sold FROM accounts "
+                "WHERE product_id = ? AND sold = 0 ORDER BY id LIMIT 1",
+                (product_id,)
+            ).fetchone()
+            already_claimed = bool(product and product.get('is_free', False)) and conn.execute(
+                "SELECT 1 FROM purchases WHERE product_id = ? AND user_id = ? LIMIT 1", (product_id, user_id)
+            ).fetchone() is not None
+
+            error = check_purchase(user, product, 1 if account_row else 0, already_claimed)
+            if error:
+                return PurchaseResult.failed(error)
+
+            record = dict(purchase_record(user, product, self._row_to_account(account_row)), user_id=user_id)
+            conn.execute("UPDATE accounts SET sold = 1 WHERE id = ?", (account_row['id'],))
+            record['id'] = conn.execute(
+                "INSERT INTO purchases (id, user_id, product_id, data) VALUES (?, ?, ?, ?)",
+                self._purchase_params(record)
+            ).lastrowid
+
+            user['balance'] = record['balance_after']
+            user['last_purchase_id'] = record['id']
+            conn.execute(
+                "INSERT INTO users (id, username, balance, banned, created_at, extra) "
+                "VALUES (:id, :username, :balance, :banned, :created_at, :extra) "
+                "ON CONFLICT(id) DO UPDATE SET balance = excluded.balance, extra = excluded.extra",
+                self._split_user(user)
+            )
+
+        return PurchaseResult(True, purchase=record, new_balance=record['balance_after'])
+
+    def add_purchase(self, user_id: int, purchase_data: Dict) -> Dict:
+        """Lưu một lần mua hàng, trả về bản ghi đã lưu (có id)"""
+        record = dict(purchase_data, user_id=user_id)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO purchases (id, user_id, product_id, data) VALUES (?, ?, ?, ?)",
+                self._purchase_params(record)
+            )
+            record['id'] = cursor.lastrowid
+        return record
+
+    def get_user_purchases(self, user_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy lịch sử mua hàng của người dùng theo thứ tự thời gian (có phân trang)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM purchases WHERE user_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                (user_id, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return [self._row_to_purchase(row) for row in rows]
+
+    def count_user_purchases(self, user_id: int) -> int:
+        """Đếm số lần mua của người dùng"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS total FROM purchases WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row['total']
+
+    def get_product_purchases(self, product_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lấy các lần mua của một sản phẩm (có phân trang)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM purchases WHERE product_id = ? ORDER BY id LIMIT ? OFFSET ?",
+                (product_id, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return [self._row_to_purchase(row) for row in rows]
+
+    def has_purchased(self, user_id: int, product_id: int) -> bool:
+        """Kiểm tra người dùng đã từng mua/nhận sản phẩm chưa"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM purchases WHERE product_id = ? AND user_id = ? LIMIT 1", (product_id, user_id)
+            ).fetchone()
+        return row is not None
+
+    def get_all_purchases(self) -> List[Dict]:
+        """Lấy toàn bộ lịch sử mua hàng"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM purchases ORDER BY id").fetchall()
+        return [self._row_to_purchase(row) for row in rows]
+
+    # === Statistics methods ===
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """Tính lại toàn bộ thống kê từ bảng users và purchases"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM stats")
+            conn.execute("DELETE FROM daily_users")
+            conn.execute(
+                "INSERT INTO stats (key, value) VALUES "
+                "('total_users', (SELECT COUNT(*) FROM users)), "
+                "('total_orders', (SELECT COUNT(*) FROM purchases)), "
+                "('revenue', (SELECT COALESCE(SUM(json_extract(data, '$.price')), 0) FROM purchases))"
+            )
+            conn.execute(
+                "INSERT INTO daily_users (day, total) "
+                "SELECT substr(created_at, 1, 10), COUNT(*) FROM users WHERE created_at IS NOT NULL GROUP BY 1"
+            )
+            conn.execute("DELETE FROM revenue_rollup")
+            conn.execute(
+                "INSERT INTO revenue_rollup (granularity, bucket, product_id, orders, revenue) "
+                f"SELECT g.granularity, {ROLLUP_BUCKET_SQL.format(granularity='g.granularity', ts='t.ts')} AS bucket, "
+                "t.product_id, COUNT(*), COALESCE(SUM(t.price), 0) "
+                "FROM (SELECT product_id, json_extract(data, '$.timestamp') AS ts, json_extract(data, '$.price') AS price "
+                "      FROM purchases WHERE julianday(json_extract(data, '$.timestamp')) IS NOT NULL) AS t, "
+                f"({ROLLUP_GRANULARITIES_SQL}) AS g "
+                "GROUP BY g.granularity, bucket, t.product_id"
+            )
+        return self.get_statistics()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Lấy thống kê hệ thống (tổng người dùng, người dùng mới hôm nay, đơn hàng, doanh thu)"""
+        today = datetime.datetime.now().date().isoformat()
+        with self._lock:
+            values = {row['key']: row['value'] for row in self._conn.execute("SELECT key, value FROM stats")}
+            row = self._conn.execute("SELECT total FROM daily_users WHERE day = ?", (today,)).fetchone()
+        return {
+            'total_users': values.get('total_users', 0),
+            'new_users_today': row['total'] if row else 0,
+            'total_orders': values.get('total_orders', 0),
+            'revenue': values.get('revenue', 0)
+        }
+
+    # === Revenue rollup methods ===
+    def get_revenue_by_product(self, granularity: str = 'day', periods: int = 30) -> Dict[int, Dict[str, float]]:
+        """Số đơn và doanh thu của từng sản phẩm trong ``periods`` giờ/ngày/tháng gần nhất"""
+        start, last = bucket_range(granularity, periods)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT product_id, SUM(orders) AS orders, SUM(revenue) AS revenue FROM revenue_rollup "
+                "WHERE granularity = ? AND bucket BETWEEN ? AND ? GROUP BY product_id",
+                (granularity, start, last)
+            ).fetchall()
+        return {row['product_id']: {'orders': row['orders'], 'revenue': row['revenue']} for row in rows if row['orders']}
+
+    def get_revenue_series(self, product_id: Optional[int] = None, granularity: str = 'day',
+                           periods: int = 30) -> List[Dict[str, Any]]:
+        """Số đơn và doanh thu theo từng giờ/ngày/tháng (``product_id=None``: tất cả sản phẩm)"""
+        start, last = bucket_range(granularity, periods)
+        query = ("SELECT bucket, SUM(orders) AS orders, SUM(revenue) AS revenue FROM revenue_rollup "
+                 "WHERE granularity = ? AND bucket BETWEEN ? AND ?")
+        params: List[Any] = [granularity, start, last]
+        if product_id is not None:
+            query += " AND product_id = ?"
+            params.append(product_id)
+        with self._lock:
+            totals = {row['bucket']: row for row in self._conn.execute(query + " GROUP BY bucket", params)}
+        return [
+            {'period': bucket_label(bucket, granularity),
+             'orders': totals[bucket]['orders'] if bucket in totals else 0,
+             'revenue': totals[bucket]['revenue'] if bucket in totals else 0.0}
+            for bucket in range(start, last + 1)
+        ]
+
+    # === Settings methods ===
+    def get_settings(self) -> Dict:
+        """Lấy tất cả cài đặt"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM settings").fetchall()
+
+        if not rows:
+            # Tạo cài đặt mặc định nếu chưa có
+            default_settings = {
+                'show_premium': True,
+                'show_free': True
+            }
+            for key, value in default_settings.items():
+                self.update_setting(key, value)
+            return default_settings
+
+        return {row['key']: json.loads(row['value']) for row in rows}
+
+    def update_setting(self, key: str, value: Any) -> None:
+        """Cập nhật một cài đặt"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value, ensure_ascii=False))
+            )
+
+    # === Nhập dữ liệu ===
+    def import_json_data(self) -> Dict[str, int]:
+        """Nhập toàn bộ dữ liệu từ các file JSON hiện có, thay thế dữ liệu cũ"""
+        # Người dùng theo ID; bản ghi thiếu id hoặc trùng id không nhập được vào bảng users
+        users_by_id = {}
+        for user in self._read_json_file(config.USERS_FILE, []):
+            user_id = user.get('id') if isinstance(user, dict) else None
+            if user_id is None or user_id in users_by_id:
+                logger.warning(f"Skipping user record with a missing or duplicate id: {user!r}")
+                continue
+            users_by_id[user_id] = user
+        # Các thay đổi người dùng của chế độ "memory" chưa được gộp vào users.json
+        journal_records, _ = read_journal(config.USERS_JOURNAL_FILE)
+        apply_user_records(users_by_id, journal_records)
+        products = self._read_json_file(config.PRODUCTS_FILE, [])
+        accounts = self._read_json_file(config.ACCOUNTS_FILE, [])
+        settings = self._read_json_file(config.SETTINGS_FILE, {})
+
+        # Lịch sử mua hàng: file riêng (giữ id gốc) và phần còn nằm trong users.json (định dạng cũ, được cấp id mới)
+        purchases = read_purchase_file(config.PURCHASES_FILE)
+        seen = {purchase_key(p) for p in purchases}
+        purchase_ids = set()
+        for purchase in purchases:
+            purchase_id = purchase.get('id')
+            if purchase_id is None:
+                continue
+            if purchase_id in purchase_ids:
+                logger.warning(f"Purchase id {purchase_id} is duplicated, importing it with a new id: {purchase!r}")
+                del purchase['id']
+            else:
+                purchase_ids.add(purchase_id)
+        for purchase in extract_embedded_purchases(users_by_id.values()):
+            if purchase_key(purchase) not in seen:
+                seen.add(purchase_key(purchase))
+                purchases.append(purchase)
+
+        # Hoàn tất các lần mua đã ghi vào lịch sử nhưng chưa kịp lưu số dư/tài khoản (như các backend khác khi khởi động)
+        recover_purchases(users_by_id, accounts, purchases)
+        users = list(users_by_id.values())
+
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM products")
+            conn.execute("DELETE FROM accounts")
+            conn.execute("DELETE FROM settings")
+            conn.execute("DELETE FROM purchases")
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (id, username, balance, banned, created_at, extra) "
+                "VALUES (:id, :username, :balance, :banned, :created_at, :extra)",
+                [self._split_user(user) for user in users]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO products (id, is_free, data) VALUES (?, ?, ?)",
+                [(p['id'], 1 if p.get('is_free', False) else 0, json.dumps(p, ensure_ascii=False))
+                 for p in products if 'id' in p]
+            )
+            conn.executemany(
+                "INSERT INTO accounts (product_id, data, sold) VALUES (?, ?, ?)",
+                [(a.get('product_id'), a.get('data', ''), 1 if a.get('sold', False) else 0) for a in accounts]
+            )
+            conn.executemany(
+                "INSERT INTO purchases (id, user_id, product_id, data) VALUES (?, ?, ?, ?)",
+                [self._purchase_params(purchase) for purchase in purchases]
+            )
+            conn.executemany(
+                "INSERT INTO settings (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in settings.items()]
+            )
+            # Đánh dấu nhập xong; nếu giao dịch bị hủy, lần khởi động sau sẽ nhập lại
+            conn.execute(f"PRAGMA user_version = {IMPORTED_VERSION}")
+
+        self.rebuild_statistics()
+        return {
+            'users': len(users),
+            'products': len(products),
+            'accounts': len(accounts),
+            'purchases': len(purchases),
+            'settings': len(settings)
+        }
+
+    @staticmethod
+    def _read_json_file(file_path: str, default: Any) -> Any:
+        """Đọc file JSON nếu tồn tại, không ghi đè file khi lỗi"""
+        if not os.path.exists(file_path):
+            return default
+        return jsoncodec.read_file(file_path)
+
+
+class _Transaction:
+    """Context manager cho một giao dịch ghi (BEGIN IMMEDIATE ... COMMIT)"""
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db._lock.acquire()
+        self.db._conn.execute("BEGIN IMMEDIATE")
+        return self.db._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.db._conn.execute("COMMIT")
+            else:
+                self.db._conn.execute("ROLLBACK")
+        finally:
+            self.db._lock.release()
+        return False
+
+
+def main():
+    """Nhập dữ liệu từ data/*.json vào file SQLite"""
+    parser = argparse.ArgumentParser(description="Nhập dữ liệu JSON vào cơ sở dữ liệu SQLite")
+    parser.add_argument('--db', default=config.SQLITE_DB_FILE, help="Đường dẫn file SQLite")
+    args = parser.parse_args()
+
+    db = SQLiteDatabase(args.db)
+    # File mới đã được nhập ngay khi khởi tạo
+    counts = db.import_counts or db.import_json_data()
+    db.close()
+    print(
+        f"Đã nhập {counts['users']} người dùng, {counts['products']} sản phẩm, "
+        f"{counts['accounts']} tài khoản, {counts['purchases']} lượt mua và {counts['settings']} cài đặt vào {args.db}"
+    )
+
+
+if __name__ == "__main__":
+    main()
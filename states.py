@@ -0,0 +1,28 @@
+import threading
+import weakref
+from typing import Any, Dict
+
+
+class UserStates(dict):
+    """Trạng thái hội thoại của người dùng (user_id -> dict trạng thái).
+
+    Update của cùng một người dùng có thể được xử lý trên nhiều luồng cùng lúc
+    (các chat khác nhau rơi vào các luồng khác nhau của UpdateDispatcher, hoặc
+    thread pool của telebot). Handler giữ ``lock(user_id)`` trong suốt lần xử lý
+    để các bước đọc-sửa-ghi trạng thái của một người không xen nhau; người dùng
+    khác không phải chờ. Khóa được bỏ khi không còn luồng nào dùng.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._locks_lock = threading.Lock()
+        self._locks: Dict[int, Any] = weakref.WeakValueDictionary()
+
+    def lock(self, user_id: int):
+        """Khóa (RLock) của một người dùng, dùng với ``with``"""
+        with self._locks_lock:
+            user_lock = self._locks.get(user_id)
+            if user_lock is None:
+                user_lock = threading.RLock()
+                self._locks[user_id] = user_lock
+            return user_lock
@@ -0,0 +1,83 @@
+import datetime
+from typing import Dict, List, Any, Iterable, Optional
+from rollups import RevenueRollup
+
+
+def user_created_day(user: Dict) -> Optional[str]:
+    """Ngày tạo người dùng dạng YYYY-MM-DD (lấy từ created_at dạng ISO)"""
+    created_at = user.get('created_at')
+    if not isinstance(created_at, str) or len(created_at) < 10:
+        return None
+    return created_at[:10]
+
+
+class StatsAggregate:
+    """Số liệu thống kê cộng dồn cho bảng điều khiển quản trị.
+
+    Được cập nhật mỗi khi thêm người dùng hoặc ghi nhận một lần mua, nên việc
+    đọc thống kê không phụ thuộc vào số lượng người dùng và lịch sử mua hàng.
+    Doanh thu theo giờ/ngày/tháng (``rollup``) được cộng cùng lúc và lưu chung.
+    """
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.total_users = data.get('total_users', 0)
+        self.users_by_day: Dict[str, int] = dict(data.get('users_by_day', {}))
+        self.total_orders = data.get('total_orders', 0)
+        self.revenue = data.get('revenue', 0)
+        # ID lần mua cuối cùng đã được cộng vào thống kê
+        self.last_purchase_id = data.get('last_purchase_id', 0)
+        self.rollup = RevenueRollup.from_dict(data.get('rollup', {}))
+
+    @classmethod
+    def rebuild(cls, users: Iterable[Dict], purchases: Iterable[Dict]) -> 'StatsAggregate':
+        """Tính lại toàn bộ thống kê từ dữ liệu gốc"""
+        stats = cls()
+        for user in users:
+            stats.add_user(user)
+        for purchase in purchases:
+            stats.add_purchase(purchase)
+        return stats
+
+    def add_user(self, user: Dict) -> None:
+        """Cộng thêm một người dùng mới"""
+        self.total_users += 1
+        day = user_created_day(user)
+        if day:
+            self.users_by_day[day] = self.users_by_day.get(day, 0) + 1
+
+    def add_purchase(self, purchase: Dict) -> None:
+        """Cộng thêm một lần mua (bỏ qua lần mua đã được tính)"""
+        purchase_id = purchase.get('id', 0)
+        if purchase_id and purchase_id <= self.last_purchase_id:
+            return
+        self.total_orders += 1
+        self.revenue += purchase.get('price', 0)
+        self.last_purchase_id = max(self.last_purchase_id, purchase_id)
+        self.rollup.add_purchase(purchase)
+
+    def is_current(self, total_users: int, last_purchase_id: int) -> bool:
+        """Kiểm tra thống kê có khớp với dữ liệu hiện tại không"""
+        # Thống kê lưu trước khi có rollup cũng phải được tính lại
+        return (self.total_users == total_users and self.last_purchase_id == last_purchase_id
+                and self.rollup.last_purchase_id == last_purchase_id)
+
+    def summary(self, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """Các số liệu hiển thị trên bảng điều khiển"""
+        today = today or datetime.datetime.now().date()
+        return {
+            'total_users': self.total_users,
+            'new_users_today': self.users_by_day.get(today.isoformat(), 0),
+            'total_orders': self.total_orders,
+            'revenue': self.revenue
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_users': self.total_users,
+            'users_by_day': dict(self.users_by_day),
+            'total_orders': self.total_orders,
+            'revenue': self.revenue,
+            'last_purchase_id': self.last_purchase_id,
+            'rollup': self.rollup.to_dict()
+        }
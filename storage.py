@@ -0,0 +1,205 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Any, Optional, Tuple
+from catalog import CatalogSnapshot
+from purchases import PurchaseResult
+
+
+class UserRepository(ABC):
+    """Thao tác với người dùng"""
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Lấy thông tin người dùng theo ID (None nếu không có)"""
+
+    @abstractmethod
+    def add_user(self, user_data: Dict) -> bool:
+        """Thêm người dùng mới"""
+
+    @abstractmethod
+    def update_user(self, user_id: int, update_data: Dict) -> bool:
+        """Cập nhật các trường của người dùng"""
+
+    @abstractmethod
+    def get_all_users(self) -> List[Dict]:
+        """Lấy danh sách tất cả người dùng"""
+
+    @abstractmethod
+    def get_users_page(self, offset: int = 0, limit: int = 10, search: str = '') -> Tuple[List[Dict], int]:
+        """Lấy một trang người dùng theo thứ tự username, trả về (người dùng, tổng số)"""
+
+    @abstractmethod
+    def ban_user(self, user_id: int) -> bool:
+        """Cấm người dùng"""
+
+    @abstractmethod
+    def unban_user(self, user_id: int) -> bool:
+        """Bỏ cấm người dùng"""
+
+    @abstractmethod
+    def is_user_banned(self, user_id: int) -> bool:
+        """Kiểm tra người dùng có bị cấm không"""
+
+    def get_banned_user_ids(self) -> List[int]:
+        """Lấy ID của tất cả người dùng bị cấm"""
+        return [user['id'] for user in self.get_all_users() if user.get('banned', False)]
+
+    @abstractmethod
+    def add_money(self, user_id: int, amount: float) -> bool:
+        """Thêm tiền cho người dùng"""
+
+
+class ProductRepository(ABC):
+    """Thao tác với sản phẩm"""
+
+    @abstractmethod
+    def get_product(self, product_id: int) -> Optional[Dict]:
+        """Lấy thông tin sản phẩm theo ID"""
+
+    @abstractmethod
+    def get_all_products(self) -> List[Dict]:
+        """Lấy danh sách tất cả sản phẩm"""
+
+    @abstractmethod
+    def create_product(self, product_data: Dict) -> int:
+        """Tạo sản phẩm mới hoặc cập nhật sản phẩm hiện có, trả về ID"""
+
+    @abstractmethod
+    def delete_product(self, product_id: int) -> bool:
+        """Xóa sản phẩm"""
+
+    @abstractmethod
+    def catalog(self) -> CatalogSnapshot:
+        """Ảnh chụp danh mục sản phẩm kèm tồn kho hiện tại"""
+
+
+class AccountRepository(ABC):
+    """Thao tác với kho tài khoản bán cho người dùng"""
+
+    @abstractmethod
+    def get_accounts(self) -> List[Dict[str, Any]]:
+        """Lấy tất cả tài khoản"""
+
+    @abstractmethod
+    def save_accounts(self, accounts: List[Dict[str, Any]]) -> None:
+        """Thay toàn bộ danh sách tài khoản"""
+
+    @abstractmethod
+    def add_accounts(self, product_id: int, accounts: List[str]) -> int:
+        """Thêm tài khoản cho sản phẩm, trả về số tài khoản đã thêm"""
+
+    @abstractmethod
+    def import_accounts(self, product_id: int, accounts: List[str]) -> Dict[str, Any]:
+        """Thêm tài khoản, bỏ qua tài khoản trùng: ``{'added': ..., 'duplicates': [...]}``"""
+
+    @abstractmethod
+    def get_available_account(self, product_id: int) -> Optional[Dict]:
+        """Lấy và đánh dấu đã bán một tài khoản chưa bán của sản phẩm"""
+
+    @abstractmethod
+    def count_available_accounts(self, product_id: int) -> int:
+        """Đếm số tài khoản còn lại của sản phẩm"""
+
+    @abstractmethod
+    def count_available_accounts_many(self, product_ids: List[int]) -> Dict[int, int]:
+        """Đếm số tài khoản còn lại của nhiều sản phẩm"""
+
+    @abstractmethod
+    def stock_snapshot(self) -> Dict[int, int]:
+        """Số tài khoản còn lại của tất cả sản phẩm còn hàng"""
+
+    @abstractmethod
+    def mark_account_sold(self, account_data: str) -> bool:
+        """Đánh dấu tài khoản đã bán"""
+
+
+class PurchaseRepository(ABC):
+    """Mua hàng và lịch sử mua hàng"""
+
+    @abstractmethod
+    def purchase(self, user_id: int, product_id: int) -> PurchaseResult:
+        """Mua một tài khoản: kiểm tra điều kiện, lấy tài khoản, trừ tiền và lưu lịch sử"""
+
+    @abstractmethod
+    def add_purchase(self, user_id: int, purchase_data: Dict) -> Dict:
+        """Lưu một lần mua hàng, trả về bản ghi đã lưu (có id)"""
+
+    @abstractmethod
+    def get_user_purchases(self, user_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Lịch sử mua hàng của người dùng theo thứ tự thời gian (có phân trang)"""
+
+    @abstractmethod
+    def count_user_purchases(self, user_id: int) -> int:
+        """Đếm số lần mua của người dùng"""
+
+    @abstractmethod
+    def get_user_purchase(self, user_id: int, index: int) -> Optional[Dict]:
+        """Lần mua thứ ``index`` của người dùng"""
+
+    @abstractmethod
+    def get_product_purchases(self, product_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Các lần mua của một sản phẩm (có phân trang)"""
+
+    @abstractmethod
+    def has_purchased(self, user_id: int, product_id: int) -> bool:
+        """Kiểm tra người dùng đã từng mua/nhận sản phẩm chưa"""
+
+    @abstractmethod
+    def get_all_purchases(self) -> List[Dict]:
+        """Toàn bộ lịch sử mua hàng"""
+
+
+class StatisticsRepository(ABC):
+    """Số liệu thống kê cho bảng điều khiển quản trị"""
+
+    @abstractmethod
+    def get_statistics(self) -> Dict[str, Any]:
+        """Tổng người dùng, người dùng mới hôm nay, số đơn và doanh thu"""
+
+    @abstractmethod
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """Tính lại thống kê từ dữ liệu gốc"""
+
+    @abstractmethod
+    def get_revenue_by_product(self, granularity: str = 'day', periods: int = 30) -> Dict[Any, Dict[str, float]]:
+        """Số đơn và doanh thu của từng sản phẩm trong ``periods`` ô thời gian gần nhất"""
+
+    @abstractmethod
+    def get_revenue_series(self, product_id: Optional[int] = None, granularity: str = 'day',
+                           periods: int = 30) -> List[Dict[str, Any]]:
+        """Số đơn và doanh thu theo từng ô thời gian"""
+
+
+class SettingsRepository(ABC):
+    """Cài đặt của bot"""
+
+    @abstractmethod
+    def get_settings(self) -> Dict:
+        """Lấy tất cả cài đặt"""
+
+    @abstractmethod
+    def update_setting(self, key: str, value: Any) -> None:
+        """Cập nhật một cài đặt"""
+
+    @abstractmethod
+    def get_visibility_settings(self) -> dict:
+        """Cài đặt hiển thị (ví dụ ``show_premium``)"""
+
+    @abstractmethod
+    def update_visibility_setting(self, key: str, value: bool) -> None:
+        """Cập nhật một cài đặt hiển thị"""
+
+
+class Storage(UserRepository, ProductRepository, AccountRepository, PurchaseRepository,
+              StatisticsRepository, SettingsRepository):
+    """Giao diện đầy đủ của một backend lưu trữ.
+
+    handlers và các module khác chỉ dùng các phương thức khai báo ở đây, nên có
+    thể thay backend (JSON, bộ nhớ, SQLite hoặc backend mới đăng ký bằng
+    ``database.register_backend``) mà không phải sửa logic xử lý.
+    """
+
+    def warm_up(self) -> None:
+        """Đọc trước dữ liệu hay dùng (tùy chọn)"""
+
+    def close(self) -> None:
+        """Giải phóng tài nguyên (file, kết nối, luồng nền)"""
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+# Các module của bot nằm ở thư mục gốc của repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import database  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Chạy test trong thư mục tạm: các đường dẫn data/... của config trỏ vào đó"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    database._parsed_cache.clear()
+    yield tmp_path / "data"
+    database._parsed_cache.clear()
+
+
+@pytest.fixture(params=database.available_backends())
+def backend(request):
+    """Tên backend đang thử; test chỉ dùng một số backend thì parametrize lại ``backend``"""
+    return request.param
+
+
+@pytest.fixture
+def open_db(data_dir, backend, monkeypatch):
+    """Hàm tạo Database của ``backend`` qua create_database; các đối tượng đã tạo được đóng khi test kết thúc"""
+    monkeypatch.setattr(config, 'DATABASE_BACKEND', backend)
+    monkeypatch.setattr(config, 'DB_WRITE_BEHIND_DELAY', 0)
+    opened = []
+
+    def open_db():
+        db = database.create_database()
+        opened.append(db)
+        return db
+
+    yield open_db
+    for db in opened:
+        if hasattr(db, 'close'):
+            db.close()
@@ -0,0 +1,58 @@
+import json
+import threading
+
+from database import Database
+
+
+def test_concurrent_user_updates_are_not_lost(data_dir):
+    users = [{'id': user_id, 'username': f'user{user_id}', 'balance': 0, 'banned': user_id % 2 == 1}
+             for user_id in range(1, 41)]
+    (data_dir / "users.json").write_text(json.dumps(users))
+    db = Database()
+
+    # Cấm/bỏ cấm và cộng tiền cùng lúc: mỗi thao tác đọc-sửa-ghi cả users.json
+    def ban_even():
+        for user_id in range(2, 41, 2):
+            db.ban_user(user_id)
+
+    def unban_odd():
+        for user_id in range(1, 41, 2):
+            db.unban_user(user_id)
+
+    def add_money():
+        for user_id in range(1, 41):
+            db.add_money(user_id, 10)
+
+    threads = [threading.Thread(target=target) for target in (ban_even, unban_odd, add_money)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for user in json.loads((data_dir / "users.json").read_text()):
+        assert user['banned'] == (user['id'] % 2 == 0)
+        assert user['balance'] == 10
+
+
+def test_memory_update_user_rejects_invalid_fields_without_partial_change(data_dir):
+    from memory_database import MemoryDatabase
+
+    (data_dir / "users.json").write_text(json.dumps([{'id': 1, 'username': 'alice', 'balance': 5}]))
+    db = MemoryDatabase(write_delay=0)
+    try:
+        assert db.update_user(1, {'username': 'bob', 'balance': 'lots'}) is False
+        assert db.get_user(1)['username'] == 'alice'
+        assert db.get_user(1)['balance'] == 5
+        assert db.get_users_page(search='bob') == ([], 0)
+
+        assert db.update_user(1, {'username': 'carol', 'balance': 8}) is True
+        assert db.get_user(1)['username'] == 'carol'
+    finally:
+        db.close()
+
+    reopened = MemoryDatabase(write_delay=0)
+    try:
+        assert reopened.get_user(1)['username'] == 'carol'
+        assert reopened.get_user(1)['balance'] == 8
+    finally:
+        reopened.close()
@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from dispatcher import UpdateDispatcher, chat_key, install
+from states import UserStates
+
+
+def _message_update(update_id, chat_id, user_id=None):
+    message = SimpleNamespace(chat=SimpleNamespace(id=chat_id), from_user=SimpleNamespace(id=user_id or chat_id))
+    return SimpleNamespace(update_id=update_id, message=message)
+
+
+def test_chat_key_uses_callback_message_chat():
+    callback = SimpleNamespace(message=SimpleNamespace(chat=SimpleNamespace(id=-100)), from_user=SimpleNamespace(id=7))
+    assert chat_key(SimpleNamespace(update_id=1, callback_query=callback)) == -100
+    inline = SimpleNamespace(from_user=SimpleNamespace(id=7))
+    assert chat_key(SimpleNamespace(update_id=2, inline_query=inline)) == 7
+    assert chat_key(SimpleNamespace(update_id=3)) == 3
+
+
+def test_updates_of_a_chat_are_processed_in_order_across_workers():
+    processed = {}
+    lock = threading.Lock()
+    rng = random.Random(0)
+
+    def process(updates):
+        for update in updates:
+            # Thời gian xử lý khác nhau để các luồng chạy xen nhau
+            time.sleep(rng.random() / 2000)
+            with lock:
+                processed.setdefault(update.message.chat.id, []).append(update.update_id)
+
+    dispatcher = UpdateDispatcher(process, workers=4, queue_size=8)
+    chats = list(range(1, 13))
+    updates = [_message_update(update_id, rng.choice(chats)) for update_id in range(1, 601)]
+    try:
+        for start in range(0, len(updates), 50):
+            dispatcher.dispatch(updates[start:start + 50])
+        dispatcher.join()
+    finally:
+        dispatcher.stop(timeout=5)
+
+    expected = {}
+    for update in updates:
+        expected.setdefault(update.message.chat.id, []).append(update.update_id)
+    assert processed == expected
+
+
+def test_install_requires_unthreaded_bot():
+    bot = SimpleNamespace(threaded=True, process_new_updates=lambda updates: None)
+    with pytest.raises(ValueError):
+        install(bot, 2, 10)
+
+
+def test_user_state_lock_serializes_one_user_across_threads():
+    states = UserStates()
+    states[1] = {'count': 0}
+    errors = []
+
+    def worker():
+        for _ in range(200):
+            with states.lock(1):
+                count = states[1]['count']
+                time.sleep(0)
+                states[1] = {'count': count + 1}
+                if states.lock(1) is not states.lock(1):
+                    errors.append('lock changed while held')
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert states[1]['count'] == 800
+    assert not errors
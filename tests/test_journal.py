@@ -0,0 +1,105 @@
+import errno
+import json
+import threading
+
+import pytest
+
+import config
+from journal import Journal, apply_user_records, read_journal
+
+
+def _line(op, record_id, fields):
+    return json.dumps({'op': op, 'id': record_id, 'fields': fields}) + "\n"
+
+
+def test_replay_drops_truncated_last_line(tmp_path):
+    path = tmp_path / "users.journal"
+    complete = _line('add', 1, {'id': 1, 'balance': 0}) + _line('update', 1, {'balance': 5})
+    path.write_text(complete + '{"op": "update", "id": 1, "fie')
+
+    journal = Journal(str(path))
+    try:
+        records = journal.replay()
+        assert [record['op'] for record in records] == ['add', 'update']
+        # Phần ghi dở bị cắt để bản ghi mới bắt đầu trên một dòng mới
+        assert path.read_text() == complete
+        assert journal.size == len(complete.encode())
+
+        journal.wait(journal.write('update', 1, {'balance': 7}))
+    finally:
+        journal.close()
+
+    records, good_offset = read_journal(str(path))
+    assert good_offset == path.stat().st_size
+    users = {}
+    apply_user_records(users, records)
+    assert users == {1: {'id': 1, 'balance': 7}}
+
+
+def test_reset_clears_journal(tmp_path):
+    path = tmp_path / "users.journal"
+    journal = Journal(str(path))
+    try:
+        journal.wait(journal.write('add', 1, {'id': 1}))
+        journal.reset()
+        assert journal.size == 0
+        assert journal.replay() == []
+    finally:
+        journal.close()
+
+
+def test_memory_database_compacts_journal_into_users_file(data_dir):
+    from memory_database import MemoryDatabase
+
+    db = MemoryDatabase(write_delay=0, journal=True)
+    try:
+        db.add_user({'id': 1, 'username': 'alice', 'balance': 0})
+        db.add_money(1, 10)
+        db._flush_file(config.USERS_FILE)
+
+        assert json.loads((data_dir / "users.json").read_text())[0]['balance'] == 10
+        assert (data_dir / "users.journal").stat().st_size == 0
+        assert not list(data_dir.glob("*.tmp"))
+    finally:
+        db.close()
+
+
+class _FailingFile:
+    """File giả: ghi luôn lỗi như khi đĩa đầy"""
+
+    def write(self, data):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def flush(self):
+        pass
+
+    def fileno(self):
+        raise OSError(errno.EBADF, "Bad file descriptor")
+
+    def close(self):
+        pass
+
+
+def test_wait_raises_when_writer_fails(tmp_path):
+    journal = Journal(str(tmp_path / "users.journal"))
+    real_file, journal._file = journal._file, _FailingFile()
+    errors = []
+
+    def wait():
+        try:
+            journal.wait(journal.write('update', 1, {'balance': 5}))
+        except OSError as e:
+            errors.append(e)
+
+    try:
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        waiter.join(timeout=5)
+        assert not waiter.is_alive()
+        assert len(errors) == 1
+        # Các lần chờ sau cũng báo lỗi ngay thay vì chờ mãi
+        with pytest.raises(OSError):
+            journal.wait(journal.write('update', 1, {'balance': 6}))
+    finally:
+        journal._file = real_file
+        journal.close()
@@ -0,0 +1,19 @@
+import json
+
+import pytest
+
+import jsoncodec
+
+DATA = [{'id': 1, 'username': 'Nguyễn', 'balance': 10.5, 'tags': ['a', 'b'], 'extra': {}}]
+
+
+@pytest.mark.parametrize('codec', sorted(jsoncodec._codecs))
+def test_every_codec_writes_the_same_files(codec, monkeypatch):
+    encode, decode, fallback_errors = jsoncodec._codecs[codec]
+    monkeypatch.setattr(jsoncodec, '_encode', encode)
+    monkeypatch.setattr(jsoncodec, '_decode', decode)
+    monkeypatch.setattr(jsoncodec, '_fallback_errors', fallback_errors)
+
+    assert jsoncodec.encode(DATA, pretty=True) == json.dumps(DATA, ensure_ascii=False, indent=4).encode('utf-8')
+    assert json.loads(jsoncodec.encode(DATA)) == DATA
+    assert jsoncodec.decode(jsoncodec.encode(DATA, pretty=True)) == DATA
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+import config
+from database import Database
+
+
+def _write_json(path, data):
+    path.write_text(json.dumps(data))
+
+
+@pytest.fixture
+def shop(data_dir):
+    """Một người dùng, một sản phẩm giá 30 và hai tài khoản chưa bán"""
+    _write_json(data_dir / "users.json", [{'id': 1, 'username': 'alice', 'balance': 100, 'banned': False}])
+    _write_json(data_dir / "products.json", [{'id': 1, 'name': 'Netflix', 'price': 30, 'is_free': False}])
+    _write_json(data_dir / "accounts.json", [
+        {'product_id': 1, 'data': 'acc-1', 'sold': False},
+        {'product_id': 1, 'data': 'acc-2', 'sold': False}
+    ])
+    return data_dir
+
+
+def test_recover_completes_half_written_purchase(shop, open_db):
+    # Tiến trình dừng ngay sau khi ghi dòng lịch sử, trước khi kịp lưu số dư và tài khoản
+    record = {'id': 1, 'user_id': 1, 'product_id': 1, 'product_name': 'Netflix', 'price': 30,
+              'account_data': 'acc-1', 'timestamp': '2026-01-01T10:00:00', 'balance_after': 70}
+    (shop / "purchases.jsonl").write_text(json.dumps(record) + "\n")
+
+    db = open_db()
+    user = db.get_user(1)
+    assert user['balance'] == 70
+    assert user['last_purchase_id'] == 1
+    assert [a['sold'] for a in db.get_accounts()] == [True, False]
+    assert db.get_statistics()['total_orders'] == 1
+
+    # Lần mua tiếp theo tiếp nối đúng trạng thái đã khôi phục
+    result = db.purchase(1, 1)
+    assert result.success
+    assert result.purchase['id'] == 2
+    assert result.account_info == 'acc-2'
+    assert result.new_balance == 40
+
+
+def test_json_purchase_ids_continue_after_torn_line(shop):
+    db = Database()
+    first = db.purchase(1, 1).purchase
+
+    # Một dòng bị ghi dở ở cuối file (ví dụ mất điện giữa lúc ghi)
+    with open(config.PURCHASES_FILE, 'a') as f:
+        f.write('{"id": 2, "user_id"')
+
+    second = db.add_purchase(1, {'product_id': 1, 'price': 0})
+    assert second['id'] == first['id'] + 1
+    lines = (shop / "purchases.jsonl").read_text().splitlines()
+    assert [json.loads(line)['id'] for line in lines] == [1, 2]
+    assert db.get_user(1)['last_purchase_id'] == 1
+
+
+def test_purchase_records_last_purchase_id(shop, open_db):
+    db = open_db()
+    result = db.purchase(1, 1)
+    assert result.success
+    user = db.get_user(1)
+    assert user['balance'] == 70
+    assert user['last_purchase_id'] == result.purchase['id']
+
+
+def test_sqlite_import_keeps_purchase_ids_and_recovers(shop):
+    from sqlite_database import SQLiteDatabase
+
+    # Id 1 đã bị mất (ví dụ dòng không hợp lệ); lần mua id 3 chưa kịp lưu số dư và tài khoản
+    done = {'id': 2, 'user_id': 1, 'product_id': 1, 'product_name': 'Netflix', 'price': 30,
+            'account_data': 'acc-0', 'timestamp': '2026-01-01T09:00:00', 'balance_after': 100}
+    half = dict(done, id=3, account_data='acc-1', timestamp='2026-01-01T10:00:00', balance_after=70)
+    (shop / "purchases.jsonl").write_text(json.dumps(done) + "\n" + json.dumps(half) + "\n")
+    _write_json(shop / "users.json", [
+        {'id': 1, 'username': 'alice', 'balance': 100, 'banned': False, 'last_purchase_id': 2},
+        {'id': 1, 'username': 'alice-copy', 'balance': 999},
+        {'id': 2, 'username': 'bob', 'balance': 0, 'purchases': [
+            {'product_id': 1, 'price': 0, 'timestamp': '2025-05-02T00:00:00'},
+            {'product_id': 1, 'price': 0, 'timestamp': '2025-05-01T00:00:00'}
+        ]}
+    ])
+
+    db = SQLiteDatabase(str(shop / "test.sqlite3"))
+    try:
+        assert db.import_counts['users'] == 2
+        user = db.get_user(1)
+        assert user['username'] == 'alice'
+        assert user['balance'] == 70
+        assert user['last_purchase_id'] == 3
+        assert [p['id'] for p in db.get_user_purchases(1)] == [2, 3]
+        assert [a['sold'] for a in db.get_accounts()] == [True, False]
+
+        # Lịch sử cũ trong users.json được cấp id mới theo thứ tự thời gian
+        legacy = db.get_user_purchases(2)
+        assert [p['timestamp'] for p in legacy] == ['2025-05-01T00:00:00', '2025-05-02T00:00:00']
+        assert all(p['id'] > 3 for p in legacy)
+
+        result = db.purchase(1, 1)
+        assert result.success
+        assert result.purchase['id'] > 3
+        assert db.get_user(1)['last_purchase_id'] == result.purchase['id']
+    finally:
+        db.close()
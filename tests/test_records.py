@@ -0,0 +1,111 @@
+import json
+
+import config
+from purchases import PurchaseLog
+from records import AccountTable, User, load_records
+
+
+def test_load_records_keeps_invalid_items():
+    records, invalid = load_records(User, [{'id': 1}, {'id': 'abc'}, {'username': 'no id'}], 'user')
+    assert [user.id for user in records] == [1]
+    assert invalid == [{'id': 'abc'}, {'username': 'no id'}]
+
+
+def test_account_table_writes_invalid_accounts_back():
+    broken = {'data': 'no product'}
+    table = AccountTable([{'product_id': 1, 'data': 'a'}, broken, {'product_id': 2, 'data': 'b', 'sold': True}])
+    assert len(table) == 2
+    assert table.to_dicts() == [
+        {'product_id': 1, 'data': 'a', 'sold': False},
+        {'product_id': 2, 'data': 'b', 'sold': True},
+        broken
+    ]
+
+
+def test_memory_database_keeps_invalid_records_on_flush(data_dir):
+    from memory_database import MemoryDatabase
+
+    bad_user = {'id': 2, 'balance': 'lots'}
+    bad_product = {'id': 3, 'name': 'Broken', 'price': 'free?'}
+    bad_account = {'data': 'orphan'}
+    (data_dir / "users.json").write_text(json.dumps([{'id': 1, 'balance': 0}, bad_user]))
+    (data_dir / "products.json").write_text(json.dumps([{'id': 1, 'name': 'Ok', 'price': 5}, bad_product]))
+    (data_dir / "accounts.json").write_text(json.dumps([{'product_id': 1, 'data': 'x'}, bad_account]))
+
+    for journal in (False, True):
+        db = MemoryDatabase(write_delay=0, journal=journal)
+        try:
+            assert db.get_user(2) is None
+            db.add_money(1, 10)
+            db.create_product({'id': 1, 'name': 'Ok', 'price': 6})
+            db.import_accounts(1, ['y'])
+            for file_path in (config.USERS_FILE, config.PRODUCTS_FILE, config.ACCOUNTS_FILE):
+                db._flush_file(file_path)
+        finally:
+            db.close()
+
+        assert bad_user in json.loads((data_dir / "users.json").read_text())
+        assert bad_product in json.loads((data_dir / "products.json").read_text())
+        assert bad_account in json.loads((data_dir / "accounts.json").read_text())
+
+
+def test_purchase_log_indexes_by_id_around_invalid_lines(tmp_path):
+    path = tmp_path / "purchases.jsonl"
+    lines = [
+        {'id': 1, 'user_id': 1, 'product_id': 1, 'price': 10},
+        {'id': 2, 'user_id': 'nobody', 'product_id': 1},
+        {'id': 3, 'user_id': 2, 'product_id': 1, 'price': 5}
+    ]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+    log = PurchaseLog(str(path))
+    try:
+        assert log.last_id == 3
+        assert [p['id'] for p in log.since(0)] == [1, 3]
+        assert [p['id'] for p in log.since(1)] == [3]
+        assert log.since(3) == []
+
+        record = log.append(1, {'product_id': 2, 'price': 1})
+        assert record['id'] == 4
+        assert [p['id'] for p in log.since(3)] == [4]
+
+        # Bản ghi nhập không hợp lệ vẫn được ghi vào file và giữ id riêng
+        assert log.import_purchases([{'user_id': 'x', 'product_id': 9}, {'user_id': 3, 'product_id': 9}]) == 1
+        assert log.last_id == 6
+    finally:
+        log.close()
+
+    written = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['id'] for line in written] == [1, 2, 3, 4, 5, 6]
+    assert written[1] == lines[1]
+
+
+def test_memory_database_keeps_duplicate_and_malformed_users(data_dir):
+    from memory_database import MemoryDatabase
+
+    first = {'id': 1, 'username': 'alice', 'balance': 5}
+    duplicate = {'id': 1, 'username': 'alice-old', 'balance': 7}
+    no_id = {'username': 'ghost'}
+    null_id = {'id': None, 'username': 'null'}
+    (data_dir / "users.json").write_text(json.dumps([first, duplicate, "not a user", no_id, null_id]))
+
+    db = MemoryDatabase(write_delay=0, journal=False)
+    try:
+        assert db.get_user(1)['username'] == 'alice'
+        db.add_money(1, 10)
+        db._flush_file(config.USERS_FILE)
+    finally:
+        db.close()
+
+    written = json.loads((data_dir / "users.json").read_text())
+    assert {'id': 1, 'username': 'alice', 'balance': 15, 'banned': False} in written
+    for row in (duplicate, "not a user", no_id, null_id):
+        assert row in written
+    assert len(written) == 5
+
+
+def test_load_records_unique_rejects_duplicate_and_missing_ids():
+    records, invalid = load_records(User, [{'id': 1}, {'id': 1, 'username': 'b'}, {'id': None}], 'user',
+                                    unique=True)
+    assert [user.id for user in records] == [1]
+    assert invalid == [{'id': 1, 'username': 'b'}, {'id': None}]
@@ -0,0 +1,61 @@
+import datetime
+import json
+
+import pytest
+
+from rollups import RevenueRollup
+from stats import StatsAggregate
+
+
+def _purchases(now):
+    return [
+        {'product_id': 1, 'price': 10, 'timestamp': (now - datetime.timedelta(hours=1)).isoformat()},
+        {'product_id': 1, 'price': 20, 'timestamp': (now - datetime.timedelta(days=2)).isoformat()},
+        {'product_id': 2, 'price': 5, 'timestamp': (now - datetime.timedelta(days=40)).isoformat()},
+        {'product_id': 2, 'price': 7, 'timestamp': 'not a date'}
+    ]
+
+
+def test_rollup_round_trips_through_dict():
+    rollup = RevenueRollup()
+    now = datetime.datetime.now()
+    for purchase_id, purchase in enumerate(_purchases(now), 1):
+        rollup.add_purchase(dict(purchase, id=purchase_id))
+
+    restored = RevenueRollup.from_dict(json.loads(json.dumps(rollup.to_dict())))
+    assert restored.last_purchase_id == 4
+    for granularity in ('hour', 'day', 'month'):
+        assert restored.by_product(granularity, 60) == rollup.by_product(granularity, 60)
+        assert restored.series(1, granularity, 60) == rollup.series(1, granularity, 60)
+
+
+def test_revenue_rollup_is_fed_by_each_purchase(open_db):
+    now = datetime.datetime.now()
+    db = open_db()
+    for purchase in _purchases(now):
+        db.add_purchase(1, purchase)
+
+    assert db.get_revenue_by_product('day', 30) == {1: {'orders': 2, 'revenue': 30}}
+    assert db.get_revenue_by_product('day', 60)[2] == {'orders': 1, 'revenue': 5}
+    series = db.get_revenue_series(1, 'hour', 3)
+    assert [point['orders'] for point in series] == [0, 1, 0]
+
+
+@pytest.mark.parametrize('backend', ['json', 'memory'])
+def test_revenue_rollup_is_persisted_with_stats(data_dir, open_db, monkeypatch):
+    now = datetime.datetime.now()
+    db = open_db()
+    for purchase in _purchases(now):
+        db.add_purchase(1, purchase)
+    if hasattr(db, 'close'):
+        db.close()
+
+    stats = StatsAggregate(json.loads((data_dir / "stats.json").read_text()))
+    assert stats.rollup.last_purchase_id == 4
+
+    # Khởi động lại không được tính lại từ lịch sử mua hàng
+    def fail(*args, **kwargs):
+        raise AssertionError("rollup rebuilt from purchase history")
+    monkeypatch.setattr(StatsAggregate, 'rebuild', classmethod(fail))
+    db = open_db()
+    assert db.get_revenue_by_product('day', 30) == {1: {'orders': 2, 'revenue': 30}}
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from router import CallbackRouter, admin_only
+
+ADMIN_ID = 1
+USER_ID = 2
+
+
+def _handler(calls, name):
+    def handler(bot, call, ctx, *args):
+        calls.append((name,) + args)
+    return handler
+
+
+def _router(calls):
+    router = CallbackRouter(lambda user_id: user_id == ADMIN_ID)
+    router.add('products', _handler(calls, 'products'))
+    router.add('product_list', _handler(calls, 'product_list'))
+    router.add_prefix('product_', _handler(calls, 'product'))
+    router.add_prefix('product_page_', _handler(calls, 'product_page'))
+    router.add_prefix('search_', _handler(calls, 'search'), int_arg=False)
+    router.add_prefix('ban_user_', admin_only(_handler(calls, 'ban_user')))
+    return router
+
+
+def _call(data, user_id=USER_ID):
+    return SimpleNamespace(data=data, from_user=SimpleNamespace(id=user_id))
+
+
+def test_resolve_prefers_exact_name_over_prefix():
+    router = _router([])
+    route, arg = router.resolve('product_list')
+    assert route.name == 'product_list' and arg is None
+    assert router.resolve('products')[0].name == 'products'
+
+
+def test_resolve_picks_longest_prefix_and_converts_argument():
+    router = _router([])
+    route, arg = router.resolve('product_page_3')
+    assert (route.name, arg) == ('product_page_', 3)
+    route, arg = router.resolve('product_12')
+    assert (route.name, arg) == ('product_', 12)
+    route, arg = router.resolve('search_abc_1')
+    assert (route.name, arg) == ('search_', 'abc_1')
+
+
+def test_resolve_rejects_unknown_and_non_integer_arguments():
+    router = _router([])
+    assert router.resolve('unknown') is None
+    assert router.resolve('product') is None
+    assert router.resolve('product_page_x') is None
+    assert router.resolve('') is None
+
+
+def test_dispatch_checks_admin_only_routes():
+    calls = []
+    router = _router(calls)
+    assert router.resolve('ban_user_5')[0].admin_only
+    assert not router.resolve('product_5')[0].admin_only
+
+    assert router.dispatch(None, _call('ban_user_5'), None) is False
+    assert calls == []
+    assert router.dispatch(None, _call('ban_user_5', ADMIN_ID), None) is True
+    assert router.dispatch(None, _call('products'), None) is True
+    assert router.dispatch(None, _call('nothing'), None) is False
+    assert calls == [('ban_user', 5), ('products',)]
@@ -0,0 +1,30 @@
+from user_index import NgramIndex, UserIndex
+
+
+def test_ngram_search_after_rename():
+    index = NgramIndex()
+    index.add(1, 'alice', '1')
+    index.add(2, 'alicia', '2')
+    index.add(1, 'bob', '1')
+
+    assert index.search('ali') == {2}
+    assert index.search('alice') == set()
+    assert index.search('bo') == {1}
+    assert index.search('bob') == {1}
+    assert index.search('1') == {1}
+    # Không còn n-gram nào trỏ tới khóa cũ
+    assert not any(1 in postings for gram, postings in index._postings.items() if gram in ('e', 'ce', 'ice'))
+
+
+def test_user_index_search_and_page_after_rename():
+    index = UserIndex([
+        {'id': 10, 'username': 'Zed'},
+        {'id': 11, 'username': 'amy'},
+        {'id': 12}
+    ])
+    index.add({'id': 10, 'username': 'Bella'})
+
+    assert index.page(0, 10) == [12, 11, 10]
+    assert index.search('zed') == ([], 0)
+    assert index.search('ELL') == ([10], 1)
+    assert index.search('1', 0, 2) == ([12, 11], 3)
@@ -0,0 +1,87 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import webhook
+
+SECRET = 's3cret'
+PATH = '/telegram'
+
+
+class _Bot:
+    def __init__(self):
+        self.updates = []
+
+    def process_new_updates(self, updates):
+        self.updates.extend(updates)
+
+
+@pytest.fixture
+def server():
+    server = webhook.WebhookServer(_Bot(), '127.0.0.1', 0, PATH, SECRET)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join(timeout=5)
+
+
+def _post(server, body, path=PATH, secret=SECRET, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+    try:
+        all_headers = {'Content-Type': 'application/json'}
+        if secret is not None:
+            all_headers[webhook.SECRET_HEADER] = secret
+        all_headers.update(headers or {})
+        conn.request('POST', path, body=body, headers=all_headers)
+        return conn.getresponse().status
+    finally:
+        conn.close()
+
+
+def _update(update_id=1):
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': 10,
+            'date': 0,
+            'chat': {'id': 5, 'type': 'private'},
+            'from': {'id': 5, 'is_bot': False, 'first_name': 'Alice'},
+            'text': '/start'
+        }
+    }).encode()
+
+
+def test_valid_update_reaches_bot(server):
+    assert _post(server, _update(42)) == 200
+    assert [update.update_id for update in server.bot.updates] == [42]
+    assert server.bot.updates[0].message.text == '/start'
+
+
+@pytest.mark.parametrize('secret', [None, 'wrong'])
+def test_wrong_or_missing_secret_is_forbidden(server, secret):
+    assert _post(server, _update(), secret=secret) == 403
+    assert server.bot.updates == []
+
+
+def test_unknown_path_is_not_found(server):
+    assert _post(server, _update(), path='/other') == 404
+    assert server.bot.updates == []
+
+
+def test_oversized_body_is_rejected(server):
+    # Chỉ khai báo Content-Length lớn: máy chủ phải từ chối trước khi đọc phần thân
+    status = _post(server, b'{}', headers={'Content-Length': str(webhook.MAX_BODY_SIZE + 1)})
+    assert status == 413
+    assert server.bot.updates == []
+
+
+@pytest.mark.parametrize('body', [b'{not json', b'[1, 2]'])
+def test_malformed_payload_is_bad_request(server, body):
+    assert _post(server, body) == 400
+    assert server.bot.updates == []
@@ -0,0 +1,110 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Any, Iterable, Set, Tuple
+
+# Độ dài tối đa của các đoạn ký tự (n-gram) được lập chỉ mục
+NGRAM_SIZE = 3
+
+
+def username_key(user: Dict) -> str:
+    """Khóa sắp xếp người dùng: username chữ thường ('' nếu không có)"""
+    username = user.get('username')
+    return str(username).lower() if username is not None else ''
+
+
+def ngrams(text: str) -> Set[str]:
+    """Các đoạn con độ dài 1..NGRAM_SIZE của chuỗi"""
+    return {text[i:i + n] for n in range(1, NGRAM_SIZE + 1) for i in range(len(text) - n + 1)}
+
+
+class NgramIndex:
+    """Chỉ mục đảo ngược n-gram (1 đến 3 ký tự) cho tìm kiếm chuỗi con.
+
+    Truy vấn dài tối đa 3 ký tự được trả lời trực tiếp bằng tập của n-gram đó; truy
+    vấn dài hơn lấy giao các tập trigram rồi kiểm tra lại từng ứng viên.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Set[Any]] = {}
+        self._texts: Dict[Any, Tuple[str, ...]] = {}
+
+    def add(self, key: Any, *texts: str) -> None:
+        """Lập chỉ mục (hoặc lập lại) các chuỗi của ``key``"""
+        old_texts = self._texts.get(key)
+        if old_texts == texts:
+            return
+        old_grams = set().union(*(ngrams(text) for text in old_texts)) if old_texts is not None else set()
+        new_grams = set().union(*(ngrams(text) for text in texts))
+
+        # Bỏ khóa khỏi các n-gram của chuỗi cũ không còn xuất hiện
+        for gram in old_grams - new_grams:
+            postings = self._postings[gram]
+            postings.discard(key)
+            if not postings:
+                del self._postings[gram]
+        self._texts[key] = texts
+        for gram in new_grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def search(self, query: str) -> Set[Any]:
+        """Các khóa có ít nhất một chuỗi chứa ``query``"""
+        if not query:
+            return set(self._texts)
+        if len(query) <= NGRAM_SIZE:
+            return set(self._postings.get(query, ()))
+
+        # Giao các tập trigram, bắt đầu từ tập nhỏ nhất
+        postings = [self._postings.get(query[i:i + NGRAM_SIZE], set()) for i in range(len(query) - NGRAM_SIZE + 1)]
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            if not candidates:
+                break
+            candidates &= other
+        return {key for key in candidates if any(query in text for text in self._texts[key])}
+
+
+class UserIndex:
+    """Chỉ mục người dùng sắp xếp theo username (chữ thường) kèm tra cứu theo ID.
+
+    Phân trang chỉ cắt một đoạn của danh sách đã sắp xếp; tìm kiếm chuỗi con trong
+    username hoặc ID dùng chỉ mục n-gram.
+    """
+
+    def __init__(self, users: Iterable[Dict] = ()):
+        self._by_id: Dict[Any, str] = {}
+        for user in users:
+            self._by_id[user.get('id')] = username_key(user)
+        # (username chữ thường, id) đã sắp xếp
+        self._keys: List[Tuple[str, Any]] = sorted((name, user_id) for user_id, name in self._by_id.items())
+        self._ngrams = NgramIndex()
+        for user_id, name in self._by_id.items():
+            self._ngrams.add(user_id, name, str(user_id))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, user_id: Any) -> bool:
+        return user_id in self._by_id
+
+    def add(self, user: Dict) -> None:
+        """Thêm hoặc cập nhật vị trí của người dùng trong chỉ mục"""
+        user_id = user.get('id')
+        name = username_key(user)
+        old_name = self._by_id.get(user_id)
+        if old_name == name:
+            return
+        if old_name is not None:
+            self._keys.pop(bisect_left(self._keys, (old_name, user_id)))
+        self._by_id[user_id] = name
+        insort(self._keys, (name, user_id))
+        self._ngrams.add(user_id, name, str(user_id))
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[Any]:
+        """ID người dùng của một trang theo thứ tự username"""
+        return [user_id for _, user_id in self._keys[offset:offset + limit]]
+
+    def search(self, query: str, offset: int = 0, limit: int = 10) -> Tuple[List[Any], int]:
+        """Tìm người dùng có username hoặc ID chứa ``query``, trả về (ID của trang, tổng số)"""
+        matched = self._ngrams.search(query.lower())
+        ordered = sorted((self._by_id[user_id], user_id) for user_id in matched)
+        return [user_id for _, user_id in ordered[offset:offset + limit]], len(ordered)
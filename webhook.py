@@ -0,0 +1,123 @@
+"""Nhận update của Telegram qua webhook bằng một máy chủ HTTP nhúng.
+
+Telegram POST mỗi update (JSON) tới ``config.WEBHOOK_PATH``; máy chủ kiểm tra
+header ``X-Telegram-Bot-Api-Secret-Token`` rồi chuyển update cho
+``bot.process_new_updates``, tức là cho các handler hoặc UpdateDispatcher nếu
+đã cài (dispatcher.install). Có thể thử trên máy bằng replay_updates.py.
+"""
+import hmac
+import logging
+import ssl
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from telebot import types
+import config
+import jsoncodec
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Kích thước tối đa của một update (byte)
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServer(HTTPServer):
+    """Máy chủ HTTP nhận update cho một TeleBot.
+
+    Request được xử lý lần lượt trên một luồng nên update vào bot đúng thứ tự
+    nhận; việc xử lý chậm nằm ở handler (hoặc các luồng của UpdateDispatcher).
+    """
+
+    def __init__(self, bot, host: str, port: int, path: str, secret_token: str = ''):
+        super().__init__((host, port), WebhookRequestHandler)
+        self.bot = bot
+        self.webhook_path = path
+        self.secret_token = secret_token
+
+    def check_secret(self, value: Optional[str]) -> bool:
+        """Kiểm tra chuỗi bí mật trong header của request"""
+        if not self.secret_token:
+            return True
+        return value is not None and hmac.compare_digest(value.encode(), self.secret_token.encode())
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    server: WebhookServer
+
+    def do_POST(self) -> None:
+        if self.path.split('?', 1)[0] != self.server.webhook_path:
+            self._reply(404)
+            return
+        if not self.server.check_secret(self.headers.get(SECRET_HEADER)):
+            logger.warning(f"Rejected webhook request from {self.client_address[0]}: invalid secret token")
+            self._reply(403)
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_SIZE:
+            self._reply(413)
+            return
+
+        try:
+            data = jsoncodec.decode(self.rfile.read(length))
+            if not isinstance(data, dict):
+                raise ValueError("update must be a JSON object")
+            update = types.Update.de_json(data)
+        except Exception as e:
+            logger.warning(f"Invalid webhook payload: {e}")
+            self._reply(400)
+            return
+
+        # Lỗi trong handler không được để Telegram gửi lại update nhiều lần
+        try:
+            self.server.bot.process_new_updates([update])
+        except Exception as e:
+            logger.error(f"Error while processing webhook update {update.update_id}: {e}", exc_info=True)
+        self._reply(200)
+
+    def do_GET(self) -> None:
+        self._reply(405)
+
+    def _reply(self, status: int) -> None:
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.client_address[0]} - {format % args}")
+
+
+def create_server(bot) -> WebhookServer:
+    """Tạo máy chủ webhook theo cấu hình"""
+    server = WebhookServer(bot, config.WEBHOOK_HOST, config.WEBHOOK_PORT, config.WEBHOOK_PATH,
+                           config.WEBHOOK_SECRET_TOKEN)
+    if config.WEBHOOK_SSL_CERT:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(config.WEBHOOK_SSL_CERT, config.WEBHOOK_SSL_KEY or None)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def run(bot) -> None:
+    """Đăng ký webhook với Telegram (nếu có WEBHOOK_URL) và phục vụ cho tới khi dừng"""
+    server = create_server(bot)
+    if config.WEBHOOK_URL:
+        certificate = None
+        if config.WEBHOOK_SSL_CERT:
+            # Chứng chỉ tự ký phải được gửi kèm để Telegram tin cậy
+            certificate = open(config.WEBHOOK_SSL_CERT, 'rb')
+        try:
+            bot.set_webhook(url=config.WEBHOOK_URL, certificate=certificate,
+                            secret_token=config.WEBHOOK_SECRET_TOKEN or None)
+        finally:
+            if certificate is not None:
+                certificate.close()
+    logger.info(f"Webhook đang lắng nghe tại {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()